@@ -0,0 +1,166 @@
+"""
+Compact binary WebSocket control protocol.
+
+Clients opt in on connect by offering the `anima.bin.v1` subprotocol
+(`new WebSocket(url, ["anima.bin.v1"])`); the server echoes it when accepted.
+Binary frames then carry batches of fixed-size little-endian records that are
+decoded with one np.frombuffer call and validated as arrays, without building
+a pydantic model per update. JSON text frames stay supported on every
+connection for debugging.
+
+Frame:   header  <BBH   kind, reserved (0), record count
+         records count * record size bytes
+
+PARAMS (kind 1), 20 bytes per record: <BBHfdf
+    part    u8   index into PART_IDS
+    param   u8   index into PARAM_CODES
+    flags   u16  FLAG_TIME | FLAG_RAMP: which optional fields are set
+    value   f32
+    time    f64  stream time in seconds (FLAG_TIME), see SetParamMessage.time
+    ramp    f32  ramp duration in seconds (FLAG_RAMP)
+
+ELEMENTS (kind 2), 5 bytes per record: <Bf
+    element u8   index into ELEMENT_CODES
+    value   f32  normalised 0-1
+
+ANALYSIS (kind 3, server -> client), header count = number of sources:
+    time    f64             stream time in seconds
+    bands   u16             number of spectrum bands
+    meters  f32[count, 4]   per source (master, then each part): peak L, peak R, RMS L, RMS R
+    spectrum u8[bands]      master spectrum, 0-255 over -96..0 dBFS
+
+Code tables are append-only and served by GET /api/v1/protocol.
+"""
+
+import struct
+from typing import Iterable, Optional, Tuple
+
+import numpy as np
+
+from ..engines.part import MAX_PARTS, part_ids
+from .schemas import ElementType
+
+SUBPROTOCOL = "anima.bin.v1"
+
+PART_IDS = tuple(part_ids(MAX_PARTS)) # A..Z, AA..AF; index order never changes
+PARAM_CODES = (
+    "frequency", "amplitude",                                               # All engines
+    "volume", "pan", "mute",                                                # Part mixer
+    "density", "position", "grain_size", "spray", "stereo_spread",          # Granular
+    "center_freq", "bandwidth", "freeze", "blur",                           # Spectral
+)
+ELEMENT_CODES = tuple(element.value for element in ElementType)
+
+FRAME_PARAMS = 1
+FRAME_ELEMENTS = 2
+FRAME_ANALYSIS = 3
+
+FLAG_TIME = 1
+FLAG_RAMP = 2
+
+HEADER = struct.Struct("<BBH")
+PARAM_RECORD = np.dtype([
+    ("part", "u1"), ("param", "u1"), ("flags", "<u2"),
+    ("value", "<f4"), ("time", "<f8"), ("ramp", "<f4"),
+])
+ELEMENT_RECORD = np.dtype([("element", "u1"), ("value", "<f4")])
+ANALYSIS_HEADER = struct.Struct("<dH")
+
+_RECORDS = {FRAME_PARAMS: PARAM_RECORD, FRAME_ELEMENTS: ELEMENT_RECORD}
+
+
+class ProtocolError(ValueError):
+    """A binary frame that does not match the protocol; the whole frame is rejected."""
+
+
+def decode_frame(data: bytes) -> Tuple[int, np.ndarray]:
+    """Returns (kind, records) for a binary frame, validating every record."""
+    if len(data) < HEADER.size:
+        raise ProtocolError("Frame shorter than header")
+    kind, _, count = HEADER.unpack_from(data)
+    record = _RECORDS.get(kind)
+    if record is None:
+        raise ProtocolError(f"Unknown frame kind {kind}")
+    if len(data) != HEADER.size + count * record.itemsize:
+        raise ProtocolError(f"Frame size {len(data)} does not match {count} record(s)")
+    records = np.frombuffer(data, dtype=record, count=count, offset=HEADER.size)
+
+    if kind == FRAME_PARAMS:
+        flags = records["flags"]
+        bad = (records["part"] >= len(PART_IDS)) | (records["param"] >= len(PARAM_CODES))
+        bad |= ~np.isfinite(records["value"])
+        bad |= ((flags & FLAG_TIME) != 0) & ~(records["time"] >= 0.0)
+        bad |= ((flags & FLAG_RAMP) != 0) & ~(records["ramp"] >= 0.0)
+    else:
+        values = records["value"]
+        bad = (records["element"] >= len(ELEMENT_CODES)) | ~((values >= 0.0) & (values <= 1.0))
+    if np.any(bad):
+        raise ProtocolError(f"Invalid record at index {int(np.argmax(bad))}")
+    return kind, records
+
+
+def iter_params(records: np.ndarray) -> Iterable[Tuple[str, str, float, Optional[float], Optional[float]]]:
+    """(part_id, param, value, time, ramp) for each decoded PARAMS record."""
+    for part, param, flags, value, time, ramp in records.tolist():
+        yield (
+            PART_IDS[part], PARAM_CODES[param], value,
+            time if flags & FLAG_TIME else None,
+            ramp if flags & FLAG_RAMP else None,
+        )
+
+
+def encode_params(updates: Iterable[tuple]) -> bytes:
+    """
+    Builds a PARAMS frame from (part_id, param, value[, time[, ramp]]) tuples;
+    time/ramp may be None. Used by tests, tools and Python clients.
+    """
+    updates = list(updates)
+    records = np.zeros(len(updates), dtype=PARAM_RECORD)
+    for i, update in enumerate(updates):
+        part_id, param, value = update[:3]
+        time = update[3] if len(update) > 3 else None
+        ramp = update[4] if len(update) > 4 else None
+        flags = 0
+        if time is not None:
+            flags |= FLAG_TIME
+            records["time"][i] = time
+        if ramp is not None:
+            flags |= FLAG_RAMP
+            records["ramp"][i] = ramp
+        records["part"][i] = PART_IDS.index(part_id)
+        records["param"][i] = PARAM_CODES.index(param)
+        records["flags"][i] = flags
+        records["value"][i] = value
+    return HEADER.pack(FRAME_PARAMS, 0, len(updates)) + records.tobytes()
+
+
+def encode_elements(values: Iterable[Tuple[str, float]]) -> bytes:
+    """Builds an ELEMENTS frame from (element, value) pairs."""
+    values = list(values)
+    records = np.zeros(len(values), dtype=ELEMENT_RECORD)
+    for i, (element, value) in enumerate(values):
+        records["element"][i] = ELEMENT_CODES.index(element)
+        records["value"][i] = value
+    return HEADER.pack(FRAME_ELEMENTS, 0, len(values)) + records.tobytes()
+
+
+def encode_analysis(time: float, meters: np.ndarray, spectrum: np.ndarray) -> bytes:
+    """Builds an ANALYSIS frame from [sources, 4] meters and u8 spectrum bands."""
+    return b"".join((
+        HEADER.pack(FRAME_ANALYSIS, 0, meters.shape[0]),
+        ANALYSIS_HEADER.pack(time, spectrum.size),
+        meters.astype("<f4", copy=False).tobytes(),
+        spectrum.astype("u1", copy=False).tobytes(),
+    ))
+
+
+def describe() -> dict:
+    """Code tables for clients (GET /api/v1/protocol)."""
+    return {
+        "subprotocol": SUBPROTOCOL,
+        "parts": list(PART_IDS),
+        "params": list(PARAM_CODES),
+        "elements": list(ELEMENT_CODES),
+        "frames": {"params": FRAME_PARAMS, "elements": FRAME_ELEMENTS, "analysis": FRAME_ANALYSIS},
+        "flags": {"time": FLAG_TIME, "ramp": FLAG_RAMP},
+    }
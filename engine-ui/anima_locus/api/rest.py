@@ -1,41 +1,276 @@
-from fastapi import APIRouter, HTTPException
+import asyncio
+
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from fastapi.responses import PlainTextResponse
 from typing import List, Dict
-from .schemas import Preset, Scene
+from .schemas import EffectSpec, EngineSwap, MorphRequest, Preset, Scene
+from . import binary
+from .websocket import manager as connection_manager
+from ..engines.samples import sample_cache
+from ..engines.snapshot import PresetSnapshot
+from ..state import audio_metrics, audio_analysis, audio_stream, engine_manager, link_ingest, preset_store
 
 router = APIRouter()
 
-# In-memory storage for prototype
-presets_db: Dict[str, Preset] = {}
-scenes_db: Dict[str, Scene] = {}
+MAX_PAGE = 500
+
+# Presets compiled against the current parts, by id (filled on save / first use)
+compiled_presets: Dict[str, PresetSnapshot] = {}
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match", "")
+    return header.strip() == "*" or etag in (tag.strip() for tag in header.split(","))
+
+
+def _page(table: str, request: Request, response: Response, offset: int, limit: int):
+    etag = preset_store.list_etag(table, offset, limit)
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    items, total = preset_store.list(table, offset, limit)
+    response.headers["ETag"] = etag
+    response.headers["X-Total-Count"] = str(total)
+    return items
+
+
+def _item(table: str, item_id: str, request: Request, response: Response):
+    found = preset_store.get(table, item_id)
+    if found is None:
+        raise HTTPException(status_code=404, detail=f"{table[:-1].capitalize()} not found")
+    body, etag = found
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    return body
+
+
+def compile_preset(preset: Preset) -> PresetSnapshot:
+    """Flattens and validates a preset against the current parts and caches the result."""
+    body = preset.model_dump(mode="json")
+    snapshot = engine_manager.compile_preset(preset.id, body["engines"], body["mappings"])
+    compiled_presets[preset.id] = snapshot
+    return snapshot
+
+
+def precompile_presets():
+    """Compiles every stored preset (startup), so the first switch is as cheap as the rest."""
+    for preset_id in preset_store.ids("presets"):
+        compile_preset(Preset(**preset_store.get("presets", preset_id)[0]))
+
+
+def preset_snapshot(preset_id: str) -> PresetSnapshot:
+    snapshot = compiled_presets.get(preset_id)
+    if snapshot is None or snapshot.layout != engine_manager.layout_version:
+        found = preset_store.get("presets", preset_id)
+        if found is None:
+            raise HTTPException(status_code=404, detail="Preset not found")
+        snapshot = compile_preset(Preset(**found[0]))
+    return snapshot
 
 # --- Presets ---
 
 @router.get("/presets", response_model=List[Preset])
-async def list_presets():
-    return list(presets_db.values())
+async def list_presets(request: Request, response: Response,
+                       offset: int = Query(0, ge=0), limit: int = Query(50, ge=1, le=MAX_PAGE)):
+    """One page of presets ordered by name; total in X-Total-Count, ETag for conditional GET."""
+    return _page("presets", request, response, offset, limit)
 
 @router.post("/presets", response_model=Preset)
 async def create_preset(preset: Preset):
-    if preset.id in presets_db:
+    if not preset_store.save("presets", preset.model_dump(mode="json"), create=True):
         raise HTTPException(status_code=400, detail="Preset ID already exists")
-    presets_db[preset.id] = preset
+    compile_preset(preset)
     return preset
 
 @router.get("/presets/{preset_id}", response_model=Preset)
-async def get_preset(preset_id: str):
-    if preset_id not in presets_db:
+async def get_preset(preset_id: str, request: Request, response: Response):
+    return _item("presets", preset_id, request, response)
+
+@router.put("/presets/{preset_id}", response_model=Preset)
+async def update_preset(preset_id: str, preset: Preset):
+    if preset.id != preset_id:
+        raise HTTPException(status_code=400, detail="Preset ID does not match the URL")
+    preset_store.save("presets", preset.model_dump(mode="json"))
+    compile_preset(preset)
+    return preset
+
+@router.delete("/presets/{preset_id}")
+async def delete_preset(preset_id: str):
+    if not preset_store.delete("presets", preset_id):
         raise HTTPException(status_code=404, detail="Preset not found")
-    return presets_db[preset_id]
+    compiled_presets.pop(preset_id, None)
+    return {"deleted": preset_id}
+
+@router.get("/presets/{preset_id}/snapshot")
+async def get_preset_snapshot(preset_id: str):
+    """The compiled form: flat parameter list, skipped entries and modulation routes."""
+    return preset_snapshot(preset_id).describe()
+
+@router.post("/presets/{preset_id}/apply")
+async def apply_preset(preset_id: str):
+    """Switches to a preset: its parameters and mappings take effect at the next audio block."""
+    snapshot = preset_snapshot(preset_id)
+    engine_manager.load_snapshot(snapshot)
+    return snapshot.describe()
 
 # --- Scenes ---
 
 @router.get("/scenes", response_model=List[Scene])
-async def list_scenes():
-    return list(scenes_db.values())
+async def list_scenes(request: Request, response: Response,
+                      offset: int = Query(0, ge=0), limit: int = Query(50, ge=1, le=MAX_PAGE)):
+    return _page("scenes", request, response, offset, limit)
 
 @router.post("/scenes", response_model=Scene)
 async def create_scene(scene: Scene):
-    if scene.id in scenes_db:
+    if not preset_store.save("scenes", scene.model_dump(mode="json"), create=True):
         raise HTTPException(status_code=400, detail="Scene ID already exists")
-    scenes_db[scene.id] = scene
     return scene
+
+@router.get("/scenes/{scene_id}", response_model=Scene)
+async def get_scene(scene_id: str, request: Request, response: Response):
+    return _item("scenes", scene_id, request, response)
+
+@router.put("/scenes/{scene_id}", response_model=Scene)
+async def update_scene(scene_id: str, scene: Scene):
+    if scene.id != scene_id:
+        raise HTTPException(status_code=400, detail="Scene ID does not match the URL")
+    preset_store.save("scenes", scene.model_dump(mode="json"))
+    return scene
+
+@router.post("/scenes/{scene_id}/load")
+async def load_scene(scene_id: str):
+    """
+    Applies the scene's first preset; with two or more, also sets up a morph
+    from the first to the second (position 0, move it with set_morph).
+    """
+    found = preset_store.get("scenes", scene_id)
+    if found is None:
+        raise HTTPException(status_code=404, detail="Scene not found")
+    preset_ids = found[0]["presets"]
+    if not preset_ids:
+        raise HTTPException(status_code=400, detail="Scene has no presets")
+    first = preset_snapshot(preset_ids[0])
+    engine_manager.load_snapshot(first)
+    morph = None
+    if len(preset_ids) > 1:
+        morph = engine_manager.set_morph(first, preset_snapshot(preset_ids[1])).describe()
+    return {"scene": scene_id, "preset": first.describe(), "morph": morph}
+
+@router.delete("/scenes/{scene_id}")
+async def delete_scene(scene_id: str):
+    if not preset_store.delete("scenes", scene_id):
+        raise HTTPException(status_code=404, detail="Scene not found")
+    return {"deleted": scene_id}
+
+# --- Morph ---
+
+@router.get("/morph")
+async def get_morph():
+    morph = engine_manager.morph
+    return None if morph is None else morph.describe()
+
+@router.post("/morph")
+async def set_morph(request: MorphRequest):
+    """Morphs between two presets' parameters; the position follows set_morph WebSocket messages."""
+    morph = engine_manager.set_morph(preset_snapshot(request.from_preset), preset_snapshot(request.to_preset),
+                                     request.position)
+    return morph.describe()
+
+# --- Parts ---
+
+@router.post("/parts/{part_id}/engine")
+async def swap_engine(part_id: str, swap: EngineSwap):
+    """Builds and warms a new engine in a worker thread, then crossfades the part over to it."""
+    if audio_stream.parallel is not None:
+        raise HTTPException(status_code=409, detail="Engine swaps are not supported in process execution mode")
+    try:
+        engine_manager.get_part(part_id)
+        samples = [{**zone.model_dump(), "path": sample_cache.resolve(zone.path)} for zone in swap.samples]
+        engine = await asyncio.to_thread(engine_manager.build_engine, swap.type.value, samples, **swap.params)
+        engine_manager.assign_engine_to_part(part_id, engine, crossfade=swap.crossfade)
+    except (ValueError, KeyError, OSError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"part": part_id.upper(), "engine": swap.type.value, "crossfade": swap.crossfade}
+
+@router.get("/fx")
+async def effects():
+    """Master bus and per-part insert chains."""
+    chains = {"master": engine_manager.master_fx}
+    chains.update((part_id, part.inserts) for part_id, part in engine_manager.parts.items())
+    return {target: chain.describe() for target, chain in chains.items() if chain is not None}
+
+@router.put("/fx/{target}")
+async def set_effects(target: str, specs: List[EffectSpec]):
+    """Builds an effect chain off the audio thread and installs it on "master" or a part; [] clears it."""
+    master = target.lower() == "master"
+    if not master and audio_stream.parallel is not None:
+        raise HTTPException(status_code=409, detail="Part inserts are not supported in process execution mode")
+    try:
+        if not master:
+            engine_manager.get_part(target)
+        specs = [{**spec.model_dump(), "type": spec.type.value,
+                  "ir": sample_cache.resolve(spec.ir) if spec.ir else None} for spec in specs]
+        chain = await asyncio.to_thread(engine_manager.build_effects, specs)
+        engine_manager.set_effects(target, chain)
+    except (ValueError, KeyError, OSError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"target": "master" if master else target.upper(), "effects": chain.describe() if chain else []}
+
+@router.get("/samples")
+async def samples():
+    """Sample cache contents: mapped files, references, bytes vs. budget, prefetch counters."""
+    return sample_cache.stats()
+
+# --- Metrics ---
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Audio callback metrics in Prometheus text format."""
+    audio_metrics.collect()
+    return PlainTextResponse(audio_metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+# --- Protocol ---
+
+@router.get("/protocol")
+async def protocol():
+    """Code tables for the binary WebSocket control protocol."""
+    return binary.describe()
+
+# --- Clients ---
+
+@router.get("/clients")
+async def clients():
+    """Per-client WebSocket outbound queue depth and drop counters."""
+    return connection_manager.stats()
+
+# --- Analysis ---
+
+@router.get("/analysis")
+async def analysis():
+    """Layout of the analysis stream: sources, rate and spectrum band edges."""
+    return {
+        "rate": audio_analysis.rate,
+        "fft_size": audio_analysis.fft_size,
+        "sources": audio_analysis.tap.sources,
+        "band_edges": audio_analysis.band_edges.tolist(),
+    }
+
+# --- Modulation ---
+
+@router.get("/modulation")
+async def modulation():
+    """The compiled modulation matrix: targets, per-route depths and last values."""
+    return engine_manager.modulation.describe()
+
+# --- Elements ---
+
+@router.get("/elements")
+async def elements():
+    """Current element bus values, who set them, and MCU link status."""
+    snapshot = engine_manager.elements.snapshot
+    return {
+        "seq": snapshot.seq,
+        "values": snapshot.as_dict(),
+        "sources": dict(zip(snapshot.as_dict(), snapshot.sources)),
+        "link": link_ingest.stats() if link_ingest is not None else None,
+    }
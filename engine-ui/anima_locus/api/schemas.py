@@ -1,5 +1,5 @@
 from enum import Enum
-from typing import Dict, Any, Optional, List, Union
+from typing import Dict, Any, Optional, List, Tuple, Union
 from pydantic import BaseModel, Field
 
 # --- Enums ---
@@ -7,8 +7,10 @@ from pydantic import BaseModel, Field
 class MessageType(str, Enum):
     SET_PARAM = "set_param"
     SET_ELEMENT = "set_element"
+    SET_MORPH = "set_morph"
     TELEMETRY = "telemetry"
     ELEMENTS = "elements"
+    ANALYSIS = "analysis"
 
 class EngineType(str, Enum):
     GRANULAR = "granular"
@@ -17,6 +19,11 @@ class EngineType(str, Enum):
     EFFECTS = "effects"
     OSCILLATOR = "oscillator"
 
+class EffectType(str, Enum):
+    REVERB = "reverb"
+    DELAY = "delay"
+    FILTER = "filter"
+
 class ElementType(str, Enum):
     EARTH = "earth"
     AIR = "air"
@@ -30,16 +37,22 @@ class WSMessage(BaseModel):
 
 class SetParamMessage(WSMessage):
     type: MessageType = MessageType.SET_PARAM
-    part_id: str = Field(..., pattern="^[ABCD]$", description="Part ID (A, B, C, D)")
+    part_id: str = Field(..., pattern="^[A-Z]{1,2}$", description="Part ID (A, B, C, ... as configured)")
     engine: EngineType
     param: str
     value: float
+    time: Optional[float] = Field(None, ge=0.0, description="Stream time in seconds to apply at (omit = next block)")
+    ramp: Optional[float] = Field(None, ge=0.0, description="Ramp duration in seconds (omit = step)")
 
 class SetElementMessage(WSMessage):
     type: MessageType = MessageType.SET_ELEMENT
     element: ElementType
     value: float = Field(..., ge=0.0, le=1.0, description="Normalized value 0-1")
 
+class SetMorphMessage(WSMessage):
+    type: MessageType = MessageType.SET_MORPH
+    value: float = Field(..., ge=0.0, le=1.0, description="Morph position between the two presets (POST /morph)")
+
 # --- WebSocket Messages (Server -> Client) ---
 
 class ElementBusFrame(WSMessage):
@@ -51,13 +64,57 @@ class TelemetryMessage(WSMessage):
     sensors: Dict[str, Any]
     audio: Dict[str, Any]
 
+class AnalysisMessage(WSMessage):
+    type: MessageType = MessageType.ANALYSIS
+    time: float = Field(..., description="Stream time in seconds at the end of the analysed audio")
+    meters: Dict[str, List[float]] = Field(..., description="Per source (master, then each part): peak L, peak R, RMS L, RMS R")
+    spectrum: List[int] = Field(..., description="Master spectrum bands, 0-255 over -96..0 dBFS (edges: GET /analysis)")
+
 # --- REST Resources ---
 
+class ModulationCurve(str, Enum):
+    LINEAR = "linear"
+    EXP = "exp"
+    LOG = "log"
+    SMOOTH = "smooth"
+    INVERSE = "inverse"
+
+class ModulationRoute(BaseModel):
+    target: str = Field(..., description='"<part>.<param>" (e.g. "C.frequency") or "<engine>.<param>" (every part running that engine)')
+    depth: float = Field(1.0, ge=-1.0, le=1.0)
+    curve: ModulationCurve = ModulationCurve.LINEAR
+    range: Optional[Tuple[float, float]] = Field(None, description="Destination range (omit = parameter default)")
+    source_range: Tuple[float, float] = Field((0.0, 1.0), description="Source values mapped onto 0-1")
+
 class Preset(BaseModel):
     id: str
     name: str
     engines: Dict[str, Any]
-    mappings: Dict[str, str]
+    # source (element) -> target string, route, or a list of them
+    mappings: Dict[str, Union[str, ModulationRoute, List[Union[str, ModulationRoute]]]]
+
+class SampleZone(BaseModel):
+    path: str = Field(..., description="Sample file (WAV / .raw), relative to ANIMA_SAMPLES")
+    root: float = Field(261.63, gt=0.0, description="Frequency the sample plays at its own rate")
+    low: float = Field(0.0, ge=0.0, description="Lowest frequency this zone answers")
+    high: float = Field(float("inf"), description="Frequency above this zone's range")
+
+class EngineSwap(BaseModel):
+    type: EngineType
+    crossfade: float = Field(0.05, ge=0.0, le=30.0, description="Equal-power crossfade in seconds")
+    params: Dict[str, float] = Field(default_factory=dict, description="Initial parameter values")
+    samples: List[SampleZone] = Field(default_factory=list, description="Sampler zones; granular uses the first")
+
+class EffectSpec(BaseModel):
+    type: EffectType
+    params: Dict[str, float] = Field(default_factory=dict, description="Parameter values (mix, time, cutoff, ...)")
+    mode: Optional[str] = Field(None, description="Filter mode: lowpass, highpass or bandpass")
+    ir: Optional[str] = Field(None, description="Reverb impulse response file, relative to ANIMA_SAMPLES")
+
+class MorphRequest(BaseModel):
+    from_preset: str
+    to_preset: str
+    position: float = Field(0.0, ge=0.0, le=1.0)
 
 class Scene(BaseModel):
     id: str
@@ -1,72 +1,279 @@
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
-from typing import List
+from collections import deque
+from typing import Deque, Dict, List, Optional, Union
+import asyncio
 import json
 import logging
-from .schemas import SetParamMessage, SetElementMessage, MessageType
+from .schemas import SetParamMessage, SetElementMessage, SetMorphMessage, MessageType, TelemetryMessage, AnalysisMessage, ElementBusFrame
+from . import binary
 
-from ..state import engine_manager
-from ..engines.oscillator import OscillatorEngine
+from ..state import engine_manager, audio_metrics, audio_stream, audio_analysis
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+class ClientConnection:
+    """
+    One WebSocket client's outbound side: a bounded FIFO for ordered messages
+    plus latest-value slots for coalesced channels (telemetry, elements), both
+    drained by the client's own writer task. A slow client only delays itself;
+    frames it has not taken yet are replaced or dropped, never buffered.
+    """
+
+    def __init__(self, websocket: WebSocket, protocol: str = "json", max_queue: int = 64):
+        self.websocket = websocket
+        self.protocol = protocol
+        self.max_queue = max_queue
+        self._queue: Deque = deque()
+        self._latest: Dict[str, Union[str, bytes]] = {}
+        self._wake = asyncio.Event()
+        self.closed = False
+        self.sent = 0
+        self.dropped = 0    # Queued messages refused because the queue was full
+        self.coalesced = 0  # Channel frames replaced before they were sent
+        self.task = asyncio.create_task(self._writer())
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._queue) + len(self._latest)
+
+    def send(self, frame: Union[str, bytes], channel: Optional[str] = None):
+        """Queues a serialized frame; `channel` frames keep only the newest value."""
+        if self.closed:
+            return
+        if channel is not None:
+            if channel in self._latest:
+                self.coalesced += 1
+            self._latest[channel] = frame
+        elif len(self._queue) >= self.max_queue:
+            self.dropped += 1
+            return
+        else:
+            self._queue.append(frame)
+        self._wake.set()
+
+    async def _writer(self):
+        ws = self.websocket
+        try:
+            while True:
+                await self._wake.wait()
+                self._wake.clear()
+                while self._queue or self._latest:
+                    if self._queue:
+                        frame = self._queue.popleft()
+                    else:
+                        # Oldest channel first; a fresh value re-enters at the end
+                        channel = next(iter(self._latest))
+                        frame = self._latest.pop(channel)
+                    if isinstance(frame, bytes):
+                        await ws.send_bytes(frame)
+                    else:
+                        await ws.send_text(frame)
+                    self.sent += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # The reader side sees the disconnect and unregisters the client
+            logger.info(f"Send to client failed, closing writer: {e!r}")
+        finally:
+            self.closed = True
+            self._queue.clear()
+            self._latest.clear()
+
+    def stats(self) -> dict:
+        client = self.websocket.client
+        return {
+            "client": f"{client.host}:{client.port}" if client else None,
+            "protocol": self.protocol,
+            "queue_depth": self.queue_depth,
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+            "closed": self.closed,
+        }
+
+
 class ConnectionManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
+    def __init__(self, max_queue: int = 64):
+        self.max_queue = max_queue
+        self.clients: Dict[WebSocket, ClientConnection] = {}
+
+    @property
+    def active_connections(self) -> List[WebSocket]:
+        return list(self.clients)
 
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
-        logger.info("Client connected")
+    async def connect(self, websocket: WebSocket, subprotocol: Optional[str] = None) -> ClientConnection:
+        await websocket.accept(subprotocol=subprotocol)
+        client = ClientConnection(websocket, subprotocol or "json", self.max_queue)
+        self.clients[websocket] = client
+        logger.info(f"Client connected ({client.protocol})")
+        return client
 
     def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
+        client = self.clients.pop(websocket, None)
+        if client is None:
+            return
+        client.task.cancel()
         logger.info("Client disconnected")
 
-    async def broadcast(self, message: dict):
-        for connection in self.active_connections:
-            await connection.send_json(message)
+    def broadcast(self, message: dict, channel: Optional[str] = None, binary_frame: Optional[bytes] = None):
+        """
+        Serializes `message` once and queues it for every client without
+        waiting on any socket. Messages on a `channel` are latest-value only.
+        Clients on the binary subprotocol get `binary_frame` instead, if given.
+        """
+        if not self.clients:
+            return
+        frame = json.dumps(message, separators=(",", ":"))
+        for client in self.clients.values():
+            if binary_frame is not None and client.protocol == binary.SUBPROTOCOL:
+                client.send(binary_frame, channel)
+            else:
+                client.send(frame, channel)
+
+    def stats(self) -> List[dict]:
+        """Per-client outbound queue depth, send and drop counters."""
+        return [client.stats() for client in self.clients.values()]
 
 manager = ConnectionManager()
 
+async def telemetry_loop(interval: float = 1.0 / 30.0):
+    """Aggregates audio callback metrics and broadcasts them as telemetry."""
+    while True:
+        await asyncio.sleep(interval)
+        audio_metrics.collect()
+        if not manager.active_connections:
+            continue
+        audio = audio_metrics.snapshot()
+        audio["stream_time"] = audio_stream.frame_time / audio_stream.sample_rate
+        msg = TelemetryMessage(sensors={}, audio=audio)
+        try:
+            manager.broadcast(msg.model_dump(mode="json"), channel=MessageType.TELEMETRY.value)
+        except Exception as e:
+            logger.error(f"Telemetry broadcast failed: {e}")
+
+async def analysis_loop():
+    """Streams the analysis worker's meters and spectrum at its UI rate."""
+    interval = 1.0 / audio_analysis.rate
+    last_seq = 0
+    while True:
+        await asyncio.sleep(interval)
+        frame = audio_analysis.latest
+        if frame is None or frame.seq == last_seq or not manager.active_connections:
+            continue
+        last_seq = frame.seq
+        time = frame.frame_time / audio_stream.sample_rate
+        sources = audio_stream.tap.sources
+        msg = AnalysisMessage(
+            time=time,
+            meters={source: frame.meters[i].tolist() for i, source in enumerate(sources)},
+            spectrum=frame.spectrum.tolist(),
+        )
+        try:
+            manager.broadcast(msg.model_dump(mode="json"), channel=MessageType.ANALYSIS.value,
+                              binary_frame=binary.encode_analysis(time, frame.meters, frame.spectrum))
+        except Exception as e:
+            logger.error(f"Analysis broadcast failed: {e}")
+
+async def elements_loop(interval: float = 1.0 / 60.0):
+    """Broadcasts the element bus whenever it changes (MCU or UI), latest value only."""
+    bus = engine_manager.elements
+    last_seq = bus.snapshot.seq
+    while True:
+        await asyncio.sleep(interval)
+        snapshot = bus.snapshot
+        if snapshot.seq == last_seq or not manager.active_connections:
+            continue
+        last_seq = snapshot.seq
+        values = snapshot.as_dict()
+        msg = ElementBusFrame(values=values)
+        try:
+            manager.broadcast(msg.model_dump(mode="json"), channel=MessageType.ELEMENTS.value,
+                              binary_frame=binary.encode_elements(values.items()))
+        except Exception as e:
+            logger.error(f"Element broadcast failed: {e}")
+
+def _handle_binary(data: bytes):
+    """Fast path: one frame, many updates, no per-update pydantic models."""
+    try:
+        kind, records = binary.decode_frame(data)
+    except binary.ProtocolError as e:
+        logger.warning(f"Invalid binary frame: {e}")
+        return
+
+    if kind == binary.FRAME_PARAMS:
+        dropped = 0
+        for part_id, param, value, time, ramp in binary.iter_params(records):
+            try:
+                if not engine_manager.queue_param(part_id, param, value, time=time, ramp=ramp):
+                    dropped += 1
+            except ValueError as e:
+                logger.debug(f"Rejected binary param update: {e}")
+                dropped += 1
+        if dropped:
+            logger.warning(f"{dropped} of {records.size} binary param update(s) dropped")
+    elif kind == binary.FRAME_ELEMENTS:
+        engine_manager.elements.publish(
+            {binary.ELEMENT_CODES[code]: value for code, value in records.tolist()}, source="ui"
+        )
+
+def _handle_json(data: dict):
+    # Basic dispatching
+    msg_type = data.get("type")
+    
+    if msg_type == MessageType.SET_PARAM:
+        try:
+            msg = SetParamMessage(**data)
+            logger.debug(f"Param Update: {msg.engine}.{msg.param} = {msg.value}")
+            
+            # Queue for the audio thread; applied (coalesced) at the next block
+            if not engine_manager.queue_param(msg.part_id, msg.param, msg.value,
+                                              time=msg.time, ramp=msg.ramp):
+                logger.warning("Param queue full, update dropped")
+            
+        except Exception as e:
+            logger.error(f"Invalid param message: {e}")
+            
+    elif msg_type == MessageType.SET_ELEMENT:
+        try:
+            msg = SetElementMessage(**data)
+            logger.debug(f"Element Update: {msg.element} = {msg.value}")
+            engine_manager.elements.publish({msg.element.value: msg.value}, source="ui")
+        except Exception as e:
+            logger.error(f"Invalid element message: {e}")
+
+    elif msg_type == MessageType.SET_MORPH:
+        try:
+            msg = SetMorphMessage(**data)
+            # A float store; the audio thread interpolates at the next block
+            engine_manager.morph_position = msg.value
+        except Exception as e:
+            logger.error(f"Invalid morph message: {e}")
+
 @router.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
-    await manager.connect(websocket)
+    # Binary control frames are opt-in via the subprotocol; JSON always works
+    use_binary = binary.SUBPROTOCOL in websocket.scope.get("subprotocols", [])
+    await manager.connect(websocket, binary.SUBPROTOCOL if use_binary else None)
     try:
         while True:
-            data = await websocket.receive_json()
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
             
-            # Basic dispatching
-            msg_type = data.get("type")
-            
-            if msg_type == MessageType.SET_PARAM:
-                try:
-                    msg = SetParamMessage(**data)
-                    logger.info(f"Param Update: {msg.engine}.{msg.param} = {msg.value}")
-                    
-                    # Forward to Audio Engine
-                    part = engine_manager.get_part(msg.part_id)
-                    if part.engine:
-                        # Attempt to set parameter generically via set_frequency / set_amplitude
-                        # Or generic set_param if available
-                        if msg.param == 'frequency':
-                            if hasattr(part.engine, 'set_frequency'):
-                                part.engine.set_frequency(msg.value)
-                        elif msg.param == 'amplitude':
-                             if hasattr(part.engine, 'set_amplitude'):
-                                part.engine.set_amplitude(msg.value)
-                        # TODO: Add specific params like grain_size, density, etc. map to X/Y
-                    
-                except Exception as e:
-                    logger.error(f"Invalid param message: {e}")
-                    
-            elif msg_type == MessageType.SET_ELEMENT:
+            if message.get("bytes") is not None:
+                if use_binary:
+                    _handle_binary(message["bytes"])
+                else:
+                    logger.warning(f"Binary frame without the {binary.SUBPROTOCOL} subprotocol ignored")
+            elif message.get("text") is not None:
                 try:
-                    msg = SetElementMessage(**data)
-                    logger.info(f"Element Update: {msg.element} = {msg.value}")
-                    # TODO: Forward to Fusion Layer
-                except Exception as e:
-                    logger.error(f"Invalid element message: {e}")
+                    data = json.loads(message["text"])
+                except ValueError as e:
+                    logger.error(f"Invalid JSON message: {e}")
+                    continue
+                if isinstance(data, dict):
+                    _handle_json(data)
             
     except WebSocketDisconnect:
         manager.disconnect(websocket)
@@ -0,0 +1,190 @@
+"""
+Analysis tap: meters and spectrum of what the engine is producing.
+
+`AnalysisTap` is a ring of recent audio for the master bus and every part
+(source 0 = master, then parts in callback order). The audio callback only
+copies each bus into the ring and then bumps `written`, which publishes the
+frames; nothing else happens on the audio thread.
+
+`AnalysisWorker` runs in a thread at the UI rate. Every tick it copies the
+newest frames out of the ring, computes per-source peak/RMS meters over the
+frames since the previous tick and a log-binned spectrum of the master, and
+publishes the result by swapping `latest`. Window, bin map and scratch
+buffers are built once per FFT size.
+"""
+
+import logging
+import threading
+from dataclasses import dataclass
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Spectrum bands are quantized to u8 over this range (dBFS)
+SPECTRUM_FLOOR_DB = -96.0
+
+# Frames the callback may write past `written` before it commits (one block)
+_WRITE_AHEAD = 4096
+
+
+class AnalysisTap:
+    """Ring of recent stereo audio per source (single writer: the audio callback)."""
+
+    def __init__(self, sources: Sequence[str], capacity: int = 16384):
+        self.sources: List[str] = list(sources)
+        self.capacity = capacity
+        self.ring = np.zeros((len(self.sources), capacity, 2), dtype=np.float32)
+        self.written = 0 # Total frames published
+
+    def write(self, source: int, data: np.ndarray, offset: int = 0, gains: Optional[np.ndarray] = None):
+        """
+        Copies `data` ([frames, 2], or [frames, 1] for mono) to the frames
+        starting `offset` after the publish point, scaled by per-channel `gains` if given.
+        """
+        cap = self.capacity
+        n = data.shape[0]
+        start = (self.written + offset) % cap
+        first = min(n, cap - start)
+        if gains is None:
+            self.ring[source, start:start + first] = data[:first]
+            if first < n:
+                self.ring[source, :n - first] = data[first:]
+            return
+        np.multiply(data[:first], gains, out=self.ring[source, start:start + first])
+        if first < n:
+            np.multiply(data[first:], gains, out=self.ring[source, :n - first])
+
+    def commit(self, frames: int):
+        self.written += frames
+
+    def read(self, start: int, out: np.ndarray) -> bool:
+        """
+        Copies frames [start, start + len) of every source into `out`
+        ([sources, frames, 2]). Returns False if the writer overwrote them meanwhile.
+        """
+        cap = self.capacity
+        n = out.shape[1]
+        begin = start % cap
+        first = min(n, cap - begin)
+        out[:, :first] = self.ring[:, begin:begin + first]
+        if first < n:
+            out[:, first:] = self.ring[:, :n - first]
+        # The writer may have lapped us during the copy
+        return self.written + _WRITE_AHEAD - start <= cap
+
+
+@dataclass
+class AnalysisFrame:
+    seq: int
+    frame_time: int         # Stream sample at the end of the analysed audio
+    meters: np.ndarray      # [sources, 4]: peak L, peak R, RMS L, RMS R
+    spectrum: np.ndarray    # [bands] u8, 0 = SPECTRUM_FLOOR_DB, 255 = 0 dBFS; edges in AnalysisWorker.band_edges
+
+
+class AnalysisWorker:
+    """Computes meters and a master spectrum from an AnalysisTap off the audio thread."""
+
+    def __init__(self, tap: AnalysisTap, sample_rate: int = 48000, rate: float = 30.0,
+                 fft_size: int = 2048, bands: int = 48, min_freq: float = 20.0):
+        self.tap = tap
+        self.sample_rate = sample_rate
+        self.rate = rate
+        self.bands = bands
+        self.min_freq = min_freq
+        self.latest: Optional[AnalysisFrame] = None
+        self.late_reads = 0 # Ticks discarded because the tap overwrote the frames being read
+        self._cursor = 0
+        self._seq = 0
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.set_fft_size(fft_size)
+
+    def set_fft_size(self, fft_size: int):
+        """Rebuilds the window, bin map and scratch buffers."""
+        self.fft_size = fft_size
+        window = 0.5 - 0.5 * np.cos(2.0 * np.pi * np.arange(fft_size) / fft_size)
+        self._window = window.astype(np.float32)
+        # Normalise so a full-scale sine reads 0 dBFS in its band
+        self._power_scale = 1.0 / (np.sum(window) / 2.0) ** 2
+
+        freqs = np.fft.rfftfreq(fft_size, 1.0 / self.sample_rate)
+        edges = np.geomspace(self.min_freq, self.sample_rate / 2.0, self.bands + 1)
+        idx = np.searchsorted(freqs, edges)
+        # Every band covers at least one bin
+        idx = np.maximum(idx, idx[0] + np.arange(idx.size))
+        idx = np.minimum(idx, freqs.size)
+        self._band_start = idx[:-1]
+        self._band_stop = idx[-1]
+        self.band_edges = edges
+        # Meters cover at most half the ring per tick
+        frames = max(fft_size, self.tap.capacity // 2)
+        self._scratch = np.zeros((len(self.tap.sources), frames, 2), dtype=np.float32)
+        self._mono = np.zeros(fft_size, dtype=np.float32)
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="anima-analysis", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    def _run(self):
+        interval = 1.0 / self.rate
+        while not self._stop.wait(interval):
+            try:
+                frame = self.analyze()
+            except Exception as e:
+                logger.error(f"Analysis failed: {e!r}")
+                continue
+            if frame is not None:
+                self.latest = frame
+
+    def analyze(self) -> Optional[AnalysisFrame]:
+        """One tick: returns a new frame, or None if no audio arrived since the last one."""
+        tap = self.tap
+        end = tap.written
+        if end == self._cursor or end < self.fft_size:
+            return None
+        fresh = min(end - self._cursor, self._scratch.shape[1])
+        frames = max(fresh, self.fft_size)
+        start = end - frames
+        block = self._scratch[:, :frames]
+        self._cursor = end
+        if not tap.read(start, block):
+            self.late_reads += 1
+            return None
+
+        # Meters over the frames since the previous tick
+        recent = block[:, frames - fresh:]
+        meters = np.empty((block.shape[0], 4), dtype=np.float32)
+        np.max(np.abs(recent), axis=1, out=meters[:, :2])
+        meters[:, 2:] = np.sqrt(np.mean(np.square(recent), axis=1))
+
+        # Log-binned spectrum of the newest fft_size master frames (mono sum)
+        mono = self._mono
+        np.add(block[0, -self.fft_size:, 0], block[0, -self.fft_size:, 1], out=mono)
+        mono *= 0.5
+        mono *= self._window
+        power = np.abs(np.fft.rfft(mono)) ** 2
+        power *= self._power_scale
+        # Peak bin per band, so a sine reads the same level whatever the band width
+        bands = np.maximum.reduceat(power[:self._band_stop], self._band_start)
+        db = 10.0 * np.log10(np.maximum(bands, 1e-12))
+        level = np.clip((db - SPECTRUM_FLOOR_DB) * (255.0 / -SPECTRUM_FLOOR_DB), 0.0, 255.0)
+
+        self._seq += 1
+        return AnalysisFrame(
+            seq=self._seq,
+            frame_time=end,
+            meters=meters,
+            spectrum=level.astype(np.uint8),
+        )
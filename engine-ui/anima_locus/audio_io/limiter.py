@@ -0,0 +1,147 @@
+"""
+Look-ahead brickwall limiter for the master bus.
+
+The output is delayed by `lookahead` (L samples) so the gain can come down
+before a peak arrives. Per block, with whole-block NumPy operations only:
+
+1. Required gain, in log2 units: min(0, log2(ceiling / peak)) per frame,
+   peak being the louder channel.
+2. Hold: the minimum of the required gain over the trailing L + 1 frames, a
+   sliding-window minimum computed with the van Herk / Gil-Werman block
+   reduction (prefix and suffix `minimum.accumulate` over blocks of L + 1).
+3. Release: the gain rises at most r per frame (20 dB per `release`),
+   g[k] = min(h[k], g[k - 1] + r). Unrolled, this is
+   g[k] = r * k + min(g[-1] + r, cummin(h[j] - r * j)), one accumulate.
+4. Attack: a moving average of g over L + 1 frames (a cumulative sum), so
+   the gain ramps down across the look-ahead instead of stepping.
+
+Every gain value averaged in step 4 for the frame leaving the delay line
+was held at or below that frame's required gain, so the delayed output never
+exceeds the ceiling (a final clip only catches float32 rounding). Histories for steps 2 to 4 and the delay line carry
+over between blocks, so the result does not depend on the block size.
+"""
+
+import math
+
+import numpy as np
+
+# log2 gain to decibels
+DB_PER_LOG2 = 20.0 * math.log10(2.0)
+
+
+class LookaheadLimiter:
+    def __init__(self, sample_rate: int = 48000, ceiling: float = 0.95, lookahead: float = 0.0015,
+                 release: float = 0.1, max_block_size: int = 4096):
+        self.sample_rate = sample_rate
+        self.ceiling = ceiling
+        self.lookahead = max(1, int(round(lookahead * sample_rate))) # L, in frames
+        L = self.lookahead
+        self.set_release(release)
+        # State carried across blocks
+        self._delay = np.zeros((L, 2), dtype=np.float32) # Last L input frames
+        self._required = np.zeros(L, dtype=np.float64)   # Required gain of the last L frames
+        self._released = np.zeros(L, dtype=np.float64)   # Released gain of the last L frames
+        self._gain = 0.0                                 # Last released gain (log2)
+        self.reduction_db = 0.0                          # Deepest gain reduction of the last block
+        self._allocate(max_block_size)
+
+    @property
+    def latency(self) -> int:
+        """Frames the limiter delays the master bus by."""
+        return self.lookahead
+
+    def set_release(self, release: float):
+        """Release time (seconds) to recover from 20 dB of gain reduction."""
+        self.release = max(1e-3, float(release))
+        self._rate = 20.0 / DB_PER_LOG2 / (self.release * self.sample_rate)
+
+    def _allocate(self, frames: int):
+        L = self.lookahead
+        W = L + 1
+        self.max_block_size = frames
+        span = -(-(L + frames) // W) * W # Window blocks for the sliding minimum
+        self._audio = np.zeros((L + frames, 2), dtype=np.float32)
+        self._peak = np.zeros(frames, dtype=np.float32)
+        self._abs = np.zeros(frames, dtype=np.float32)
+        self._seq = np.zeros(span, dtype=np.float64)
+        self._prefix = np.zeros(span, dtype=np.float64)
+        self._suffix = np.zeros(span, dtype=np.float64)
+        self._held = np.zeros(frames, dtype=np.float64)
+        self._ramp = np.arange(frames, dtype=np.float64)
+        self._rise = np.zeros(frames, dtype=np.float64)
+        self._sum = np.zeros(L + frames + 1, dtype=np.float64)
+        self._gains = np.zeros(frames, dtype=np.float32)
+
+    def reset(self):
+        self._delay.fill(0.0)
+        self._required.fill(0.0)
+        self._released.fill(0.0)
+        self._gain = 0.0
+        self.reduction_db = 0.0
+
+    def process_into(self, buf: np.ndarray) -> None:
+        """Limits a float32 [frames, 2] block in place (delayed by `latency` frames)."""
+        n = buf.shape[0]
+        if n == 0:
+            return
+        if n > self.max_block_size:
+            self._allocate(n)
+        L = self.lookahead
+        W = L + 1
+
+        # 1. Required gain per frame, after the last L frames of the previous block
+        peak = self._peak[:n]
+        np.abs(buf[:, 0], out=peak)
+        np.abs(buf[:, 1], out=self._abs[:n])
+        np.maximum(peak, self._abs[:n], out=peak)
+        np.maximum(peak, np.float32(self.ceiling), out=peak)
+        span = -(-(L + n) // W) * W
+        seq = self._seq[:span]
+        seq[:L] = self._required
+        required = seq[L:L + n]
+        np.log2(peak, out=required)
+        np.subtract(math.log2(self.ceiling), required, out=required)
+        seq[L + n:] = 0.0
+        self._required[:] = seq[n:n + L]
+
+        # 2. Minimum over each trailing window of W frames (van Herk / Gil-Werman)
+        blocks = seq.reshape(-1, W)
+        prefix = self._prefix[:span].reshape(-1, W)
+        suffix = self._suffix[:span].reshape(-1, W)
+        np.minimum.accumulate(blocks, axis=1, out=prefix)
+        np.minimum.accumulate(blocks[:, ::-1], axis=1, out=suffix[:, ::-1])
+        held = self._held[:n]
+        np.minimum(self._suffix[:n], self._prefix[L:L + n], out=held)
+
+        # 3. Release: g[k] = min(held[k], g[k - 1] + r) as a cumulative minimum
+        r = self._rate
+        rise = self._rise[:n]
+        np.multiply(self._ramp[:n], r, out=rise)
+        released = held
+        released -= rise
+        np.minimum.accumulate(released, out=released)
+        np.minimum(released, self._gain + r, out=released)
+        released += rise
+        self._gain = float(released[-1])
+
+        # 4. Attack: moving average over W frames of the released gain
+        total = self._sum[:L + n + 1]
+        total[0] = 0.0
+        total[1:L + 1] = self._released
+        total[L + 1:] = released
+        self._released[:] = total[n + 1:]
+        np.cumsum(total, out=total)
+        smoothed = self._held[:n] # Consumed above: reuse as the smoothed gain
+        np.subtract(total[W:W + n], total[:n], out=smoothed)
+        smoothed *= 1.0 / W
+        self.reduction_db = max(0.0, -float(smoothed.min()) * DB_PER_LOG2)
+        gains = self._gains[:n]
+        np.exp2(smoothed, out=gains, casting="same_kind")
+
+        # Delay line: emit the frames L behind, scaled by their gain
+        audio = self._audio[:L + n]
+        audio[:L] = self._delay
+        audio[L:] = buf
+        np.multiply(audio[:n], gains[:, None], out=buf)
+        self._delay[:] = audio[n:]
+        np.clip(buf, -self.ceiling, self.ceiling, out=buf)
@@ -0,0 +1,283 @@
+"""
+Audio callback instrumentation.
+
+`CallbackMetrics` is written only by the audio thread: every block fills one
+row of preallocated arrays and then bumps `blocks_written`, which publishes the
+row. There are no locks and no allocations beyond NumPy scalars, and nothing is
+logged from the callback.
+
+`MetricsAggregator` runs off the audio thread (REST handler, telemetry task).
+It drains the rows written since its last visit into histograms and counters,
+logs part errors that the callback recorded, and renders Prometheus text or a
+telemetry dict.
+"""
+
+import logging
+import math
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Callback time as a fraction of the block deadline
+LOAD_BUCKETS = (0.1, 0.25, 0.5, 0.75, 0.9, 1.0, 1.5, 2.0)
+# Per-part process() time in seconds (also used for the master limiter)
+PART_TIME_BUCKETS = (50e-6, 100e-6, 250e-6, 500e-6, 1e-3, 2.5e-3, 5e-3, 10e-3, 25e-3)
+# Gain reduction (dB) above which a block counts as limited
+LIMITED_DB = 0.1
+
+
+class CallbackMetrics:
+    """Per-block measurements recorded by the audio callback (single writer)."""
+
+    def __init__(self, part_ids: Sequence[str], capacity: int = 1024):
+        self.part_ids: List[str] = list(part_ids)
+        self.capacity = capacity
+        n = len(self.part_ids)
+
+        self.callback_time = np.zeros(capacity, dtype=np.float64)
+        self.deadline = np.zeros(capacity, dtype=np.float64)
+        self.part_time = np.zeros((capacity, n), dtype=np.float64)
+        self.part_peak = np.zeros((capacity, n), dtype=np.float32)
+        self.part_rms = np.zeros((capacity, n), dtype=np.float32)
+        self.limiter_time = np.zeros(capacity, dtype=np.float64)
+        self.gain_reduction = np.zeros(capacity, dtype=np.float32) # Deepest limiter reduction per block, dB
+
+        # Monotonic counters
+        self.part_errors = np.zeros(n, dtype=np.int64)
+        self.part_starved = np.zeros(n, dtype=np.int64) # Blocks a part worker had not rendered in time
+        self.last_error: List[Optional[BaseException]] = [None] * n
+        self.xruns = 0
+        self.underflows = 0
+        self.blocks_written = 0
+
+    def record_status(self, status):
+        """Counts a non-empty PortAudio status (called only when status is set)."""
+        self.xruns += 1
+        if getattr(status, "output_underflow", False):
+            self.underflows += 1
+
+    def record_part(self, index: int, elapsed: float, output: np.ndarray, gains=None):
+        """
+        `output` is the part's stereo output, or its unity-gain rows plus the
+        (left, right) `gains` the mixer applies (exact for mono parts).
+        """
+        row = self.blocks_written % self.capacity
+        self.part_time[row, index] = elapsed
+        flat = output.reshape(-1)
+        if flat.size:
+            peak_gain = rms_gain = 1.0
+            if gains is not None:
+                left, right = float(gains[0]), float(gains[1])
+                peak_gain, rms_gain = max(left, right), math.sqrt(0.5 * (left * left + right * right))
+            self.part_peak[row, index] = peak_gain * max(flat.max(), -flat.min())
+            self.part_rms[row, index] = rms_gain * math.sqrt(float(np.vdot(flat, flat)) / flat.size)
+        else:
+            self.part_peak[row, index] = 0.0
+            self.part_rms[row, index] = 0.0
+
+    def record_error(self, index: int, error: BaseException):
+        row = self.blocks_written % self.capacity
+        self.part_time[row, index] = 0.0
+        self.part_peak[row, index] = 0.0
+        self.part_rms[row, index] = 0.0
+        self.last_error[index] = error
+        self.part_errors[index] += 1
+
+    def record_starved(self, index: int):
+        self.part_starved[index] += 1
+
+    def record_limiter(self, elapsed: float, reduction_db: float):
+        row = self.blocks_written % self.capacity
+        self.limiter_time[row] = elapsed
+        self.gain_reduction[row] = reduction_db
+
+    def end_block(self, elapsed: float, deadline: float):
+        row = self.blocks_written % self.capacity
+        self.callback_time[row] = elapsed
+        self.deadline[row] = deadline
+        # Publish the row
+        self.blocks_written += 1
+
+
+class _Histogram:
+    def __init__(self, buckets: Sequence[float], shape=()):
+        self.edges = np.asarray(buckets, dtype=np.float64)
+        # One extra bucket for +Inf
+        self.counts = np.zeros(tuple(shape) + (len(buckets) + 1,), dtype=np.int64)
+        self.sums = np.zeros(shape, dtype=np.float64)
+
+    def observe(self, values: np.ndarray):
+        """values: [n] for a scalar histogram or [n, k] for k labelled series."""
+        idx = np.searchsorted(self.edges, values, side="left")
+        nb = self.counts.shape[-1]
+        if values.ndim == 1:
+            self.counts += np.bincount(idx, minlength=nb)
+        else:
+            for k in range(values.shape[1]):
+                self.counts[k] += np.bincount(idx[:, k], minlength=nb)
+        self.sums += values.sum(axis=0)
+
+
+class MetricsAggregator:
+    """Drains CallbackMetrics off the audio thread (single reader)."""
+
+    def __init__(self, metrics: CallbackMetrics):
+        self.metrics = metrics
+        n = len(metrics.part_ids)
+        self.load = _Histogram(LOAD_BUCKETS)
+        self.part_time = _Histogram(PART_TIME_BUCKETS, shape=(n,))
+        self.limiter_time = _Histogram(PART_TIME_BUCKETS)
+        self.blocks = 0
+        self.late_blocks = 0
+        self.limited_blocks = 0
+        self.dropped_blocks = 0
+
+        self._cursor = 0
+        self._seen_errors = np.zeros(n, dtype=np.int64)
+        self._seen_xruns = 0
+        self._interval_load = 0.0
+        self._interval_peak_load = 0.0
+        self._peak = np.zeros(n, dtype=np.float32)
+        self._rms = np.zeros(n, dtype=np.float32)
+        self._last_time = np.zeros(n, dtype=np.float64)
+        self._gain_reduction = 0.0
+        self._limiter_time = 0.0
+
+    def collect(self):
+        """Folds every block published since the last call into the aggregates."""
+        m = self.metrics
+        end = m.blocks_written
+        start = self._cursor
+        if end - start > m.capacity:
+            # The reader fell behind; the oldest rows have been overwritten.
+            self.dropped_blocks += end - start - m.capacity
+            start = end - m.capacity
+        self._cursor = end
+
+        if end > start:
+            rows = np.arange(start, end) % m.capacity
+            deadline = m.deadline[rows]
+            load = np.divide(m.callback_time[rows], deadline, out=np.zeros(rows.size), where=deadline > 0)
+            self.load.observe(load)
+            self.part_time.observe(m.part_time[rows])
+            self.blocks += rows.size
+            self.late_blocks += int(np.count_nonzero(load >= 1.0))
+            self._interval_load = float(load.mean())
+            self._interval_peak_load = float(load.max())
+            self._peak = m.part_peak[rows].max(axis=0)
+            self._rms = m.part_rms[rows[-1]].copy()
+            self._last_time = m.part_time[rows[-1]].copy()
+            self.limiter_time.observe(m.limiter_time[rows])
+            reduction = m.gain_reduction[rows]
+            self.limited_blocks += int(np.count_nonzero(reduction > LIMITED_DB))
+            self._gain_reduction = float(reduction.max())
+            self._limiter_time = float(m.limiter_time[rows].mean())
+
+        # Report what the callback could not log itself
+        errors = m.part_errors.copy()
+        for i in np.flatnonzero(errors > self._seen_errors):
+            logger.error(
+                f"Error processing Part {m.part_ids[i]} "
+                f"({errors[i] - self._seen_errors[i]} block(s)): {m.last_error[i]!r}"
+            )
+        self._seen_errors = errors
+        if m.xruns > self._seen_xruns:
+            logger.warning(f"Audio callback reported {m.xruns - self._seen_xruns} xrun(s)")
+            self._seen_xruns = m.xruns
+
+    def snapshot(self) -> Dict:
+        """Telemetry view; used as `TelemetryMessage.audio`."""
+        m = self.metrics
+        return {
+            "cpu": round(self._interval_load * 100.0, 1),
+            "cpu_peak": round(self._interval_peak_load * 100.0, 1),
+            "xruns": m.xruns,
+            "underflows": m.underflows,
+            "late_blocks": self.late_blocks,
+            "limiter": {
+                "gain_reduction_db": round(self._gain_reduction, 2),
+                "limited_blocks": self.limited_blocks,
+                "time_us": round(self._limiter_time * 1e6, 1),
+            },
+            "parts": {
+                part_id: {
+                    "time_us": round(float(self._last_time[i]) * 1e6, 1),
+                    "peak": round(float(self._peak[i]), 4),
+                    "rms": round(float(self._rms[i]), 4),
+                    "errors": int(m.part_errors[i]),
+                    "starved": int(m.part_starved[i]),
+                }
+                for i, part_id in enumerate(m.part_ids)
+            },
+        }
+
+    def render_prometheus(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        m = self.metrics
+        lines: List[str] = []
+
+        def histogram(name, edges, counts, total, labels=""):
+            cumulative = np.cumsum(counts)
+            for edge, c in zip(list(edges) + [math.inf], cumulative):
+                le = "+Inf" if math.isinf(edge) else repr(float(edge))
+                sep = "," if labels else ""
+                lines.append(f'{name}_bucket{{{labels}{sep}le="{le}"}} {int(c)}')
+            wrapped = f"{{{labels}}}" if labels else ""
+            lines.append(f"{name}_sum{wrapped} {float(total)!r}")
+            lines.append(f"{name}_count{wrapped} {int(cumulative[-1])}")
+
+        lines.append("# HELP anima_audio_callback_load Callback time as a fraction of the block deadline.")
+        lines.append("# TYPE anima_audio_callback_load histogram")
+        histogram("anima_audio_callback_load", self.load.edges, self.load.counts, self.load.sums)
+
+        lines.append("# HELP anima_audio_part_process_seconds Time spent in each part's process().")
+        lines.append("# TYPE anima_audio_part_process_seconds histogram")
+        for i, part_id in enumerate(m.part_ids):
+            histogram("anima_audio_part_process_seconds", self.part_time.edges,
+                      self.part_time.counts[i], self.part_time.sums[i], labels=f'part="{part_id}"')
+
+        lines.append("# HELP anima_audio_limiter_seconds Time spent in the master limiter per block.")
+        lines.append("# TYPE anima_audio_limiter_seconds histogram")
+        histogram("anima_audio_limiter_seconds", self.limiter_time.edges,
+                  self.limiter_time.counts, self.limiter_time.sums)
+
+        counters = (
+            ("anima_audio_blocks_total", "Audio blocks rendered.", self.blocks),
+            ("anima_audio_late_blocks_total", "Blocks whose callback overran the deadline.", self.late_blocks),
+            ("anima_audio_xruns_total", "Callbacks reporting a PortAudio status flag.", m.xruns),
+            ("anima_audio_underflows_total", "Output underflows reported by PortAudio.", m.underflows),
+            ("anima_audio_metrics_dropped_blocks_total", "Blocks overwritten before aggregation.", self.dropped_blocks),
+            ("anima_audio_limiter_limited_blocks_total",
+             f"Blocks the master limiter reduced by more than {LIMITED_DB} dB.", self.limited_blocks),
+        )
+        for name, help_text, value in counters:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            lines.append(f"{name} {int(value)}")
+
+        lines.append("# HELP anima_audio_part_errors_total Exceptions raised by a part's process().")
+        lines.append("# TYPE anima_audio_part_errors_total counter")
+        for i, part_id in enumerate(m.part_ids):
+            lines.append(f'anima_audio_part_errors_total{{part="{part_id}"}} {int(m.part_errors[i])}')
+
+        lines.append("# HELP anima_audio_part_starved_total Blocks a part worker process had not rendered in time.")
+        lines.append("# TYPE anima_audio_part_starved_total counter")
+        for i, part_id in enumerate(m.part_ids):
+            lines.append(f'anima_audio_part_starved_total{{part="{part_id}"}} {int(m.part_starved[i])}')
+
+        for name, help_text, values in (
+            ("anima_audio_part_peak", "Peak absolute sample per part since the last scrape.", self._peak),
+            ("anima_audio_part_rms", "RMS of the last block per part.", self._rms),
+        ):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            for i, part_id in enumerate(m.part_ids):
+                lines.append(f'{name}{{part="{part_id}"}} {float(values[i])!r}')
+
+        lines.append("# HELP anima_audio_limiter_gain_reduction_db Deepest master limiter gain reduction since the last scrape.")
+        lines.append("# TYPE anima_audio_limiter_gain_reduction_db gauge")
+        lines.append(f"anima_audio_limiter_gain_reduction_db {self._gain_reduction!r}")
+
+        return "\n".join(lines) + "\n"
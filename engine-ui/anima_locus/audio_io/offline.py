@@ -0,0 +1,233 @@
+"""
+Headless rendering of the part mix.
+
+Drives `AudioStream._callback` block-by-block without opening a sound device,
+as fast as the CPU allows. Output can be written to WAV / .npy, kept in memory,
+or discarded. The achieved realtime factor tells how much headroom the part
+mix has at a given block size and part count.
+
+Usage:
+    python -m anima_locus.audio_io.offline --duration 10 --block-size 256
+    python -m anima_locus.audio_io.offline --duration 30 --output mix.wav
+    python -m anima_locus.audio_io.offline --duration 10 --execution process --lookahead 4
+    python -m anima_locus.audio_io.offline --duration 10 --parts 32
+    python -m anima_locus.audio_io.offline --duration 10 --master-fx reverb,delay
+    python -m anima_locus.audio_io.offline --duration 600 --capture session.bin --capture-start 120
+"""
+
+import argparse
+import json
+import logging
+import time
+import wave
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+import numpy as np
+
+from ..engines.manager import create_default_manager
+from ..fusion.capture import CaptureReader
+from ..fusion.elements import ELEMENTS
+from ..fusion.filters import FusionPipeline
+from ..fusion.ingest import LinkIngest
+from .stream import EXECUTION_MODES, AudioStream
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class RenderResult:
+    """Timing summary (and optionally the audio) of an offline render."""
+    sample_rate: int
+    block_size: int
+    frames: int
+    wall_time: float
+    block_times: np.ndarray = field(repr=False)
+    audio: Optional[np.ndarray] = field(default=None, repr=False)
+    limiter_times: Optional[np.ndarray] = field(default=None, repr=False)
+    gain_reduction: Optional[np.ndarray] = field(default=None, repr=False) # dB per block
+
+    @property
+    def duration(self) -> float:
+        return self.frames / self.sample_rate
+
+    @property
+    def deadline(self) -> float:
+        """Real-time budget for one block, in seconds."""
+        return self.block_size / self.sample_rate
+
+    @property
+    def realtime_factor(self) -> float:
+        """Seconds of audio rendered per second of wall time (>1 means faster than realtime)."""
+        if self.wall_time <= 0.0:
+            return float("inf")
+        return self.duration / self.wall_time
+
+    def summary(self) -> dict:
+        times = self.block_times
+        limiter = self.limiter_times if self.limiter_times is not None else np.zeros(0)
+        reduction = self.gain_reduction if self.gain_reduction is not None else np.zeros(0)
+        return {
+            "sample_rate": self.sample_rate,
+            "block_size": self.block_size,
+            "blocks": int(times.size),
+            "duration_s": round(self.duration, 3),
+            "wall_time_s": round(self.wall_time, 3),
+            "realtime_factor": round(self.realtime_factor, 2),
+            "deadline_ms": round(self.deadline * 1000.0, 3),
+            "block_mean_ms": round(float(times.mean()) * 1000.0, 3) if times.size else 0.0,
+            "block_max_ms": round(float(times.max()) * 1000.0, 3) if times.size else 0.0,
+            "late_blocks": int(np.count_nonzero(times > self.deadline)),
+            "limiter_mean_us": round(float(limiter.mean()) * 1e6, 1) if limiter.size else 0.0,
+            "limiter_load": round(float(limiter.mean()) / self.deadline, 4) if limiter.size else 0.0,
+            "gain_reduction_max_db": round(float(reduction.max()), 2) if reduction.size else 0.0,
+        }
+
+
+class OfflineRenderer:
+    """Runs an AudioStream's callback without a device."""
+
+    def __init__(self, stream: AudioStream):
+        self.stream = stream
+
+    def render(self, duration: float, output: Optional[str] = None, keep: bool = False,
+               before_block: Optional[Callable[[float], object]] = None) -> RenderResult:
+        """
+        Render `duration` seconds of the mix.
+
+        Args:
+            duration: Seconds of audio to render.
+            output: Optional path; `.wav` is streamed as 16-bit PCM, `.npy` saves float32 frames.
+            keep: Return the rendered audio in `RenderResult.audio`.
+            before_block: Called with the render time (seconds) before each block,
+                e.g. a capture cursor feeding recorded sensor frames.
+        """
+        sample_rate = self.stream.sample_rate
+        block_size = self.stream.block_size
+        total_frames = int(round(duration * sample_rate))
+        num_blocks = -(-total_frames // block_size)
+
+        keep = keep or (output is not None and output.endswith(".npy"))
+        audio = np.zeros((total_frames, 2), dtype=np.float32) if keep else None
+        block_times = np.zeros(num_blocks, dtype=np.float64)
+        limiter_times = np.zeros(num_blocks, dtype=np.float64)
+        gain_reduction = np.zeros(num_blocks, dtype=np.float32)
+        metrics = self.stream.metrics
+        outdata = np.zeros((block_size, 2), dtype=np.float32)
+
+        wav = None
+        if output is not None and output.endswith(".wav"):
+            wav = wave.open(output, "wb")
+            wav.setnchannels(2)
+            wav.setsampwidth(2)
+            wav.setframerate(sample_rate)
+
+        # Process execution: the callback waits for workers instead of starving them
+        parallel = self.stream.parallel
+        owns_workers = parallel is not None and not parallel.running
+        if parallel is not None:
+            parallel.blocking = True
+
+        try:
+            if owns_workers:
+                parallel.start(self.stream.frame_time)
+            pos = 0
+            start = time.perf_counter()
+            for i in range(num_blocks):
+                frames = min(block_size, total_frames - pos)
+                block = outdata[:frames]
+
+                if before_block is not None:
+                    before_block(pos / sample_rate)
+                t0 = time.perf_counter()
+                self.stream._callback(block, frames, None, None)
+                block_times[i] = time.perf_counter() - t0
+                row = (metrics.blocks_written - 1) % metrics.capacity
+                limiter_times[i] = metrics.limiter_time[row]
+                gain_reduction[i] = metrics.gain_reduction[row]
+
+                if audio is not None:
+                    audio[pos:pos + frames] = block
+                if wav is not None:
+                    pcm = np.clip(block, -1.0, 1.0) * 32767.0
+                    wav.writeframes(pcm.astype("<i2").tobytes())
+                pos += frames
+            wall_time = time.perf_counter() - start
+        finally:
+            if wav is not None:
+                wav.close()
+            if parallel is not None:
+                parallel.blocking = False
+                if owns_workers:
+                    parallel.stop()
+
+        if output is not None and output.endswith(".npy"):
+            np.save(output, audio)
+
+        return RenderResult(
+            sample_rate=sample_rate,
+            block_size=block_size,
+            frames=total_frames,
+            wall_time=wall_time,
+            block_times=block_times,
+            audio=audio,
+            limiter_times=limiter_times,
+            gain_reduction=gain_reduction,
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render the Anima Locus part mix without a sound device")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds of audio to render")
+    parser.add_argument("--sample-rate", type=int, default=48000)
+    parser.add_argument("--block-size", type=int, default=1024)
+    parser.add_argument("--output", help="Write the mix to a .wav or .npy file (default: discard)")
+    parser.add_argument("--execution", choices=EXECUTION_MODES, default="serial",
+                        help="Render parts in the callback or in worker processes")
+    parser.add_argument("--lookahead", type=int, default=4, help="Worker look-ahead in blocks (process mode)")
+    parser.add_argument("--parts", type=int, default=4, help="Part count; parts past D get an oscillator each")
+    parser.add_argument("--master-fx", help="Comma-separated master effects with default settings (reverb,delay,filter)")
+    parser.add_argument("--capture", help="Replay a link capture into the element bus, in render time")
+    parser.add_argument("--capture-start", type=float, default=0.0, help="Seconds into the capture")
+    parser.add_argument("--json", action="store_true", help="Print the summary as JSON")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    manager = create_default_manager(args.sample_rate, args.parts)
+    for i, part in enumerate(list(manager.parts.values())[4:]):
+        part.assign_engine(manager.build_engine("oscillator", frequency=110.0 * (i + 2), amplitude=0.05))
+        part.pan = (i % 5) / 2.0 - 1.0
+    if args.master_fx:
+        manager.set_effects("master", manager.build_effects([{"type": kind} for kind in args.master_fx.split(",")]))
+    stream = AudioStream(manager, sample_rate=args.sample_rate, block_size=args.block_size,
+                         execution=args.execution, lookahead=args.lookahead)
+    feed = reader = None
+    if args.capture:
+        reader = CaptureReader(args.capture)
+        ingest = LinkIngest(manager.elements, f"capture://{args.capture}",
+                            pipeline=FusionPipeline(ELEMENTS, grid_period=args.block_size / args.sample_rate))
+        feed = reader.cursor(ingest.handle, start=args.capture_start)
+    try:
+        result = OfflineRenderer(stream).render(args.duration, output=args.output, before_block=feed)
+    finally:
+        if reader is not None:
+            reader.close()
+
+    summary = result.summary()
+    if args.json:
+        print(json.dumps(summary))
+    else:
+        print("Rendered %.1fs in %.2fs at %d Hz / %d frames: %.1fx realtime" % (
+            result.duration, result.wall_time, args.sample_rate, args.block_size, result.realtime_factor
+        ))
+        print("Block time mean %.3fms max %.3fms (deadline %.3fms, %d late)" % (
+            summary["block_mean_ms"], summary["block_max_ms"], summary["deadline_ms"], summary["late_blocks"]
+        ))
+        print("Limiter mean %.1fus (%.2f%% of deadline), max gain reduction %.2f dB" % (
+            summary["limiter_mean_us"], summary["limiter_load"] * 100.0, summary["gain_reduction_max_db"]
+        ))
+
+
+if __name__ == "__main__":
+    main()
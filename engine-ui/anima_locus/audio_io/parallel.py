@@ -0,0 +1,345 @@
+"""
+Multi-process part rendering over shared-memory ring buffers.
+
+In "process" execution mode each group of parts renders in its own worker
+process, running ahead of the device. A worker writes finished blocks into a
+`multiprocessing.shared_memory` ring and the audio callback only mixes blocks
+that are ready, so a heavy granular part no longer holds the GIL while the
+other parts wait.
+
+Workers render each part at unity gain (AudioPart.render_rows) and publish
+the (left, right) gains of its volume, pan and mute next to it. The callback
+copies the rows into the stream's PartMixer stack and mixes with the same gain
+matrix as serial execution, so output routing and layout do not depend on the
+execution mode. Gain changes take effect from the device block in which their
+slot is read.
+
+Shared layout per group (one segment):
+
+  counters  int64   [2]                              written (worker), read (callback)
+  times     float64 [lookahead, parts]               worker render time, -1 = part raised
+  gains     float32 [lookahead, parts, 2]            (left, right) mixer gains of the slot
+  ring      float32 [lookahead, parts, 2, block_size] unity-gain rows (mono parts fill both)
+
+Each counter has a single writer; the worker publishes a slot by bumping
+`written` after filling it, the callback frees it by bumping `read`.
+
+Preset snapshots, morph steps, parameter commands and element modulation are
+drained by a forwarder thread on the control plane, once per block period,
+and sent to the owning worker over a queue; the audio callback never touches
+the queues (their put() locks, allocates and wakes a feeder thread). Offline
+renders, which run faster than real time, forward from the callback instead
+(`blocking`), so changes land on the same stream blocks as in a live run. Workers run
+their own AutomationScheduler on the stream timeline, so timed events remain
+sample accurate if they arrive before the worker reaches them. Immediate
+changes are heard up to `lookahead` blocks later than in serial mode: that is
+the latency traded for rendering on several cores.
+
+Engines are copied into the workers when rendering starts; swap engines while
+stopped.
+"""
+
+import logging
+import multiprocessing as mp
+import queue
+import threading
+import time
+from multiprocessing import shared_memory
+from time import perf_counter
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from ..engines.automation import AutomationScheduler
+from ..engines.manager import EngineManager, silence_parts
+from ..engines.mixer import PartMixer
+from ..engines.part import pan_gains
+
+logger = logging.getLogger(__name__)
+
+_WRITTEN = 0
+_READ = 1
+
+# Recorded against a part when its worker reports a failed render
+_WORKER_ERROR = RuntimeError("part render raised in worker process (see worker log)")
+
+
+def _ring_views(buf, lookahead: int, parts: int, block_size: int):
+    counters = np.ndarray((2,), dtype=np.int64, buffer=buf)
+    times = np.ndarray((lookahead, parts), dtype=np.float64, buffer=buf, offset=counters.nbytes)
+    gains = np.ndarray((lookahead, parts, 2), dtype=np.float32, buffer=buf,
+                       offset=counters.nbytes + times.nbytes)
+    ring = np.ndarray((lookahead, parts, 2, block_size), dtype=np.float32, buffer=buf,
+                      offset=counters.nbytes + times.nbytes + gains.nbytes)
+    return counters, times, gains, ring
+
+
+def _ring_nbytes(lookahead: int, parts: int, block_size: int) -> int:
+    return 2 * 8 + lookahead * parts * 8 + lookahead * parts * 2 * 4 + lookahead * parts * 2 * block_size * 4
+
+
+def _worker_main(parts, sample_rate: int, block_size: int, lookahead: int, shm_name: str,
+                 commands, stop, stream_time: int):
+    """Render loop of one worker process: keep the ring full, apply forwarded commands."""
+    logging.basicConfig(level=logging.INFO)
+    shm = shared_memory.SharedMemory(name=shm_name)
+    counters, times, gains, ring = _ring_views(shm.buf, lookahead, len(parts), block_size)
+    part_map = {part.part_id: part for part in parts}
+    automation = AutomationScheduler(block_size)
+    idle = block_size / sample_rate / 4.0
+    failures = 0
+
+    try:
+        while not stop.is_set():
+            # Commands scheduled "now" land on the next block this worker renders
+            while True:
+                try:
+                    cmd = commands.get_nowait()
+                except queue.Empty:
+                    break
+                if cmd[0] == "panic":
+                    silence_parts(part_map.values(), automation)
+                    continue
+                part_id, param, value, at, ramp = cmd
+                try:
+                    automation.schedule(part_map, part_id, param, value, at, ramp, stream_time)
+                except Exception as e:
+                    logger.warning(f"Worker dropped {param}={value} for Part {part_id}: {e!r}")
+
+            written = int(counters[_WRITTEN])
+            if written - int(counters[_READ]) >= lookahead:
+                time.sleep(idle)
+                continue
+
+            slot = written % lookahead
+            automation.process_block(part_map, stream_time, block_size)
+            for i, part in enumerate(parts):
+                t0 = perf_counter()
+                try:
+                    rows = part.render_rows(ring[slot, i], block_size)
+                    if rows.shape[0] == 1:
+                        ring[slot, i, 1] = rows[0]
+                    gains[slot, i] = (0.0, 0.0) if part.mute else pan_gains(part.volume, part.pan)
+                    times[slot, i] = perf_counter() - t0
+                except Exception as e:
+                    ring[slot, i] = 0.0
+                    gains[slot, i] = 0.0
+                    times[slot, i] = -1.0
+                    failures += 1
+                    if failures == 1 or failures % 1000 == 0:
+                        logger.error(f"Error processing Part {part.part_id} ({failures} block(s)): {e!r}")
+            # Publish the slot
+            counters[_WRITTEN] = written + 1
+            stream_time += block_size
+    finally:
+        del counters, times, gains, ring
+        shm.close()
+
+
+class _WorkerGroup:
+    def __init__(self, part_ids: List[str], metric_index: List[int], lookahead: int, block_size: int):
+        self.part_ids = part_ids
+        self.metric_index = metric_index
+        self.shm = shared_memory.SharedMemory(create=True, size=_ring_nbytes(lookahead, len(part_ids), block_size))
+        self.counters, self.times, self.gains, self.ring = _ring_views(self.shm.buf, lookahead, len(part_ids), block_size)
+        self.counters[:] = 0
+        self.offset = 0 # Frames of the current read slot already consumed (callback only)
+        self.commands = None
+        self.process = None
+
+    def release(self):
+        del self.counters, self.times, self.gains, self.ring
+        self.shm.close()
+        self.shm.unlink()
+
+
+class ParallelRenderer:
+    """
+    Renders part groups in worker processes and mixes their rings in the callback.
+
+    Args:
+        lookahead: Blocks each worker renders ahead of the device (latency vs. CPU slack).
+        part_groups: Parts rendered together by one worker; default one worker per part.
+    """
+
+    def __init__(self, engine_manager: EngineManager, sample_rate: int = 48000, block_size: int = 1024,
+                 lookahead: int = 4, part_groups: Optional[Sequence[Sequence[str]]] = None,
+                 part_ids: Optional[Sequence[str]] = None):
+        if lookahead < 1:
+            raise ValueError("lookahead must be at least one block")
+        self.manager = engine_manager
+        self.sample_rate = sample_rate
+        self.block_size = block_size
+        self.lookahead = lookahead
+        self.part_ids = list(engine_manager.parts if part_ids is None else part_ids)
+        if part_groups is None:
+            part_groups = [[part_id] for part_id in self.part_ids]
+        self.part_groups = [[part_id.upper() for part_id in group] for group in part_groups]
+        grouped = sorted(p for group in self.part_groups for p in group)
+        if grouped != sorted(self.part_ids):
+            raise ValueError(f"part_groups must cover each of {self.part_ids} exactly once")
+
+        self.blocking = False # Offline rendering waits for workers (and forwards from the callback)
+        self.groups: List[_WorkerGroup] = []
+        self._group_of: Dict[str, _WorkerGroup] = {}
+        self._context = mp.get_context("spawn")
+        self._forwarder: Optional[threading.Thread] = None
+        self._forward_lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return bool(self.groups)
+
+    @property
+    def latency(self) -> float:
+        """Control latency added by the look-ahead, in seconds."""
+        return self.lookahead * self.block_size / self.sample_rate
+
+    def start(self, stream_time: int = 0, timeout: float = 10.0):
+        """Spawns the workers and waits (up to `timeout`) until their rings are full."""
+        if self.running:
+            return
+        self._stop = self._context.Event()
+        try:
+            for group_ids in self.part_groups:
+                group = _WorkerGroup(group_ids, [self.part_ids.index(p) for p in group_ids],
+                                     self.lookahead, self.block_size)
+                self.groups.append(group)
+                for part_id in group_ids:
+                    self._group_of[part_id] = group
+                group.commands = self._context.Queue()
+                group.process = self._context.Process(
+                    target=_worker_main,
+                    args=([self.manager.parts[p] for p in group_ids], self.sample_rate, self.block_size,
+                          self.lookahead, group.shm.name, group.commands, self._stop, stream_time),
+                    name=f"anima-parts-{''.join(group_ids)}",
+                    daemon=True,
+                )
+                group.process.start()
+
+            self._forwarder = threading.Thread(target=self._forward_loop, name="anima-parts-forward", daemon=True)
+            self._forwarder.start()
+            deadline = time.monotonic() + timeout
+            while any(g.counters[_WRITTEN] < self.lookahead for g in self.groups):
+                if time.monotonic() > deadline:
+                    logger.warning("Part workers did not fill their look-ahead in time")
+                    break
+                self._check_workers()
+                time.sleep(0.01)
+        except Exception:
+            self.stop()
+            raise
+        logger.info(f"Started {len(self.groups)} part worker(s), look-ahead {self.latency * 1000:.1f} ms")
+
+    def stop(self):
+        if not self.groups:
+            return
+        self._stop.set()
+        if self._forwarder is not None:
+            self._forwarder.join(timeout=2.0)
+            self._forwarder = None
+        for group in self.groups:
+            if group.process is not None:
+                group.process.join(timeout=2.0)
+                if group.process.is_alive():
+                    group.process.terminate()
+                    group.process.join()
+            if group.commands is not None:
+                group.commands.close()
+                group.commands.cancel_join_thread()
+            group.release()
+        self.groups = []
+        self._group_of = {}
+
+    def _check_workers(self):
+        for group in self.groups:
+            if not group.process.is_alive():
+                raise RuntimeError(f"Part worker {group.process.name} exited ({group.process.exitcode})")
+
+    def _forward_loop(self):
+        period = self.block_size / self.sample_rate
+        while not self._stop.wait(period):
+            if not self.blocking:
+                try:
+                    self.forward_pending()
+                except Exception as e:
+                    logger.error(f"Forwarding to part workers failed: {e!r}")
+
+    def forward_pending(self):
+        """
+        Forwards preset snapshots, queued parameter changes and modulation to the
+        workers. Called by the forwarder thread, or by the callback when `blocking`.
+        """
+        with self._forward_lock:
+            self._forward()
+
+    def _forward(self):
+        manager = self.manager
+        if manager.automation.reset_requested:
+            # panic() from the control plane: the workers own the engines now
+            manager.automation.reset_requested = False
+            for group in self.groups:
+                group.commands.put_nowait(("panic",))
+        snapshot = manager.take_snapshot()
+        if snapshot is not None:
+            for part_id, param, value in zip(snapshot.part_ids, snapshot.params, snapshot.values):
+                self._group_of[part_id].commands.put_nowait((part_id, param, float(value), -1, 0))
+        morph = manager.morph
+        if morph is not None:
+            for part_id, param, value in morph.changes(manager.morph_position):
+                self._group_of[part_id].commands.put_nowait((part_id, param, value, -1, 0))
+        for cmd in manager.commands.drain():
+            self._group_of[cmd[0]].commands.put_nowait(cmd)
+        # Element modulation is evaluated here and sent as immediate changes
+        for part_id, param, value in manager.modulation.changes(manager.elements.snapshot):
+            self._group_of[part_id].commands.put_nowait((part_id, param, value, -1, 0))
+
+    def mix_into(self, out: np.ndarray, metrics, mixer: PartMixer, tap=None) -> None:
+        """
+        Gathers the next `len(out)` frames of every group into the mixer's stack
+        and mixes them into `out` (callback side), copying each part into the
+        analysis tap (post-fader) if one is given.
+        """
+        frames = out.shape[0]
+        block_size = self.block_size
+        mixer.reserve(frames)
+        stack = mixer.stack
+        for group in self.groups:
+            counters, times, gains, ring = group.counters, group.times, group.gains, group.ring
+            pos = 0
+            while pos < frames:
+                read = int(counters[_READ])
+                if read == int(counters[_WRITTEN]):
+                    if not self.blocking:
+                        # Worker fell behind: this group is silent for the rest of the block
+                        for i in group.metric_index:
+                            metrics.record_starved(i)
+                            stack[2 * i:2 * i + 2, pos:frames] = 0.0
+                        break
+                    self._check_workers()
+                    time.sleep(0.0001)
+                    continue
+
+                slot = read % self.lookahead
+                offset = group.offset
+                n = min(frames - pos, block_size - offset)
+                for i, index in enumerate(group.metric_index):
+                    rows = ring[slot, i]
+                    stack[2 * index:2 * index + 2, pos:pos + n] = rows[:, offset:offset + n]
+                    mixer.set_part(index, 2, gains[slot, i, 0], gains[slot, i, 1])
+                    part_gains = mixer.part_gains[index]
+                    if tap is not None:
+                        tap.write(index + 1, rows[:, offset:offset + n].T, pos, gains=part_gains)
+                    if offset == 0:
+                        if times[slot, i] < 0.0:
+                            metrics.record_error(index, _WORKER_ERROR)
+                        else:
+                            metrics.record_part(index, times[slot, i], rows, part_gains)
+                pos += n
+                if offset + n == block_size:
+                    group.offset = 0
+                    # Hand the slot back to the worker
+                    counters[_READ] = read + 1
+                else:
+                    group.offset = offset + n
+        mixer.mix_into(out)
@@ -1,45 +1,112 @@
-import sounddevice as sd
 import numpy as np
 import logging
+from time import perf_counter
 from typing import Optional
 from ..engines.manager import EngineManager
+from ..engines.mixer import PartMixer
+from .metrics import CallbackMetrics
+from .parallel import ParallelRenderer
+from .analysis import AnalysisTap
+from .limiter import LookaheadLimiter
+
+try:
+    import sounddevice as sd
+except (ImportError, OSError):
+    # No PortAudio on headless racks / CI; offline rendering still works.
+    sd = None
 
 logger = logging.getLogger(__name__)
 
+# "serial": every part renders inside the callback.
+# "process": parts render ahead in worker processes (see parallel.py).
+EXECUTION_MODES = ("serial", "process")
+
 class AudioStream:
-    def __init__(self, engine_manager: EngineManager, sample_rate: int = 48000, block_size: int = 1024):
+    def __init__(self, engine_manager: EngineManager, sample_rate: int = 48000, block_size: int = 1024,
+                 execution: str = "serial", lookahead: int = 4, part_groups=None):
+        if execution not in EXECUTION_MODES:
+            raise ValueError(f"Unknown execution mode: {execution}")
         self.sample_rate = sample_rate
         self.block_size = block_size
         self.manager = engine_manager
         self.stream = None
+        self.frame_time = 0 # Stream time in samples (start of the next block)
+        self.metrics = CallbackMetrics(list(engine_manager.parts))
+        # Source 0 = master, then the parts; read by the analysis worker
+        self.tap = AnalysisTap(["master"] + self.metrics.part_ids)
+        # Preallocated master bus; parts render into the mixer's stacked buffer
+        self._master = np.zeros((block_size, 2), dtype=np.float32)
+        self.mixer = PartMixer(list(engine_manager.parts.values()), max_block_size=block_size)
+        # Brickwall at -0.45 dBFS; delays the output by limiter.latency frames
+        self.limiter = LookaheadLimiter(sample_rate, ceiling=0.95, max_block_size=block_size)
+        self.execution = execution
+        self.parallel: Optional[ParallelRenderer] = None
+        if execution == "process":
+            self.parallel = ParallelRenderer(engine_manager, sample_rate, block_size, lookahead,
+                                             part_groups, self.metrics.part_ids)
         
     def _callback(self, outdata, frames, time, status):
+        # Nothing in here may log or lock; MetricsAggregator reports off-thread.
+        metrics = self.metrics
+        t_start = perf_counter()
         if status:
-            logger.warning(f"Audio callback status: {status}")
+            metrics.record_status(status)
         
-        # Initialize mix accumulator
-        final_mix = np.zeros((frames, 2), dtype=np.float32)
+        # Reset the master bus (grown only if the device hands us a larger block)
+        if frames > self._master.shape[0]:
+            self._master = np.zeros((frames, 2), dtype=np.float32)
+        final_mix = self._master[:frames]
+        final_mix.fill(0.0)
         
-        # Process and Sum all 4 Parts
-        for part_id in ["A", "B", "C", "D"]:
-            part = self.manager.parts[part_id]
-            try:
-                part_output = part.process(frames)
-                final_mix += part_output
-            except Exception as e:
-                logger.error(f"Error processing Part {part_id}: {e}")
+        if self.parallel is not None:
+            # Workers own the engines and a control-plane thread forwards their
+            # parameter changes; offline renders forward here, in stream time
+            if self.parallel.blocking:
+                self.parallel.forward_pending()
+            self.parallel.mix_into(final_mix, metrics, self.mixer, self.tap)
+        else:
+            # Apply control-plane parameter changes and automation once per block
+            self.manager.apply_pending(self.frame_time, frames)
+            
+            # Render every part at unity into the stack, then mix with one gain-matrix multiply
+            mixer = self.mixer
+            for i in range(len(mixer.parts)):
+                t0 = perf_counter()
+                try:
+                    rows = mixer.render_part(i, frames)
+                    # Meters and tap are post-fader: the part's gains are applied on the way
+                    gains = mixer.part_gains[i]
+                    metrics.record_part(i, perf_counter() - t0, rows, gains)
+                    self.tap.write(i + 1, rows.T, gains=gains)
+                except Exception as e:
+                    mixer.silence_part(i, frames)
+                    metrics.record_error(i, e)
+            mixer.mix_into(final_mix)
                 
-        # --- Global FX placeholder ---
-        # final_mix = global_fx.process(final_mix)
+        # --- Master FX ---
+        master_fx = self.manager.master_fx
+        if master_fx is not None:
+            master_fx.process_into(final_mix)
         
         # --- Master Limiter ---
-        np.clip(final_mix, -0.95, 0.95, out=final_mix)
+        t0 = perf_counter()
+        self.limiter.process_into(final_mix)
+        metrics.record_limiter(perf_counter() - t0, self.limiter.reduction_db)
         
-        outdata[:] = final_mix
+        np.copyto(outdata, final_mix)
+        self.tap.write(0, final_mix)
+        self.tap.commit(frames)
+        self.frame_time += frames
+        metrics.end_block(perf_counter() - t_start, frames / self.sample_rate)
 
     def start(self):
         if self.stream is None:
+            if sd is None:
+                raise RuntimeError("sounddevice/PortAudio unavailable; use OfflineRenderer for headless rendering")
             try:
+                if self.parallel is not None:
+                    # Fill the workers' look-ahead before the device starts pulling
+                    self.parallel.start(self.frame_time)
                 self.stream = sd.OutputStream(
                     samplerate=self.sample_rate,
                     blocksize=self.block_size,
@@ -51,6 +118,8 @@ class AudioStream:
                 logger.info(f"Audio stream started at {self.sample_rate}Hz")
             except Exception as e:
                 logger.error(f"Failed to start audio stream: {e}")
+                if self.parallel is not None:
+                    self.parallel.stop()
                 raise
 
     def stop(self):
@@ -59,6 +128,8 @@ class AudioStream:
             self.stream.close()
             self.stream = None
             logger.info("Audio stream stopped")
+        if self.parallel is not None:
+            self.parallel.stop()
 
 # Note: We no longer create a global instance here, 
 # it will be created in server.py with the manager.
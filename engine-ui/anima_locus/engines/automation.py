@@ -0,0 +1,142 @@
+"""
+Sample-accurate parameter automation.
+
+Set-param events carry a target stream time (in samples; "as soon as possible"
+means the start of the next block) and an optional ramp length. Each
+(part, param) with pending or running events gets an AutomationLane holding
+breakpoints on the stream timeline. Once per block the scheduler renders every
+running lane into a per-sample curve with a single np.interp call:
+
+  - engines that list the param in `curve_params` receive the curve through
+    set_param_curve() and apply it per sample (e.g. zipper-free amplitude);
+  - every lane also sets the scalar param to the value at the end of the block,
+    so block-rate side effects (bandwidth, grain size, mip level) follow along.
+
+Runs on the audio thread; lanes and their curve buffers are reused.
+"""
+
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+
+class AutomationLane:
+    def __init__(self, part_id: str, param: str, value: float, max_block_size: int = 4096):
+        self.part_id = part_id
+        self.param = param
+        self.value = value # Value before the first breakpoint
+        self.xp: List[float] = []
+        self.fp: List[float] = []
+        self.curve = np.zeros(max_block_size, dtype=np.float32)
+        self.active = False
+        self.finished = False
+
+    def value_at(self, t: float) -> float:
+        if not self.xp:
+            return self.value
+        return float(np.interp(t, self.xp, self.fp))
+
+    def add_event(self, at: int, ramp: int, target: float):
+        """A new event replaces any automation from its start time onwards."""
+        # Steps take effect exactly at `at`: hold the previous value up to at - 0.5
+        start = float(at) if ramp > 0 else at - 0.5
+        start_value = self.value_at(start)
+        while self.xp and self.xp[-1] >= start:
+            self.xp.pop()
+            self.fp.pop()
+        self.xp += [start, float(at + ramp)]
+        self.fp += [start_value, target]
+        self.active = True
+        self.finished = False
+
+    def is_pending(self, block_end: int) -> bool:
+        """True while nothing changes before block_end (first breakpoint is later)."""
+        return self.xp[0] > block_end - 1
+
+    def render(self, t0: int, offsets: np.ndarray) -> np.ndarray:
+        n = offsets.shape[0]
+        if n > self.curve.shape[0]:
+            self.curve = np.zeros(n, dtype=np.float32)
+        curve = self.curve[:n]
+        curve[:] = np.interp(offsets + t0, self.xp, self.fp)
+        return curve
+
+    def advance(self, block_end: int):
+        """Drops segments that ended before block_end; marks the lane finished when none remain."""
+        last = block_end - 1
+        if self.xp[-1] <= last:
+            self.value = self.fp[-1]
+            self.xp.clear()
+            self.fp.clear()
+            self.finished = True
+            return
+        while len(self.xp) > 1 and self.xp[1] <= last:
+            self.xp.pop(0)
+            self.fp.pop(0)
+        self.value = self.fp[0]
+
+
+class AutomationScheduler:
+    def __init__(self, max_block_size: int = 4096):
+        self.max_block_size = max_block_size
+        self.lanes: Dict[Tuple[str, str], AutomationLane] = {}
+        self._running: List[AutomationLane] = []
+        self._offsets = np.arange(max_block_size, dtype=np.float64)
+        self.reset_requested = False
+
+    def schedule(self, parts, part_id: str, param: str, value: float, at: int, ramp: int, now: int):
+        """Adds an event; `at` < now (or -1) means the start of the current block."""
+        at = max(at, now)
+        lane = self.lanes.get((part_id, param))
+        if ramp <= 0 and at == now and (lane is None or not lane.active):
+            # Plain step at the block boundary: no lane needed
+            parts[part_id].set_param(param, value)
+            return
+        if lane is None:
+            lane = AutomationLane(part_id, param, 0.0, self.max_block_size)
+            self.lanes[(part_id, param)] = lane
+        if not lane.active:
+            lane.value = float(parts[part_id].get_param(param))
+            self._running.append(lane)
+        lane.add_event(at, ramp, value)
+
+    def process_block(self, parts, t0: int, frames: int):
+        """Renders running lanes for the block [t0, t0 + frames) and hands curves to engines."""
+        if self.reset_requested:
+            self.reset_requested = False
+            for lane in self._running:
+                self._release(parts, lane)
+            self._running.clear()
+
+        if not self._running:
+            return
+        if frames > self._offsets.shape[0]:
+            self._offsets = np.arange(frames, dtype=np.float64)
+        offsets = self._offsets[:frames]
+        block_end = t0 + frames
+
+        for lane in list(self._running):
+            part = parts[lane.part_id]
+            if lane.finished:
+                # Finished during the previous block: back to the scalar value
+                self._release(parts, lane)
+                self._running.remove(lane)
+                continue
+            if lane.is_pending(block_end):
+                continue
+
+            curve = lane.render(t0, offsets)
+            part.set_param(lane.param, float(curve[-1]))
+            engine = part.engine
+            if engine is not None and lane.param in engine.curve_params:
+                engine.set_param_curve(lane.param, curve)
+            lane.advance(block_end)
+
+    def _release(self, parts, lane: AutomationLane):
+        lane.active = False
+        lane.finished = False
+        lane.xp.clear()
+        lane.fp.clear()
+        engine = parts[lane.part_id].engine
+        if engine is not None:
+            engine.set_param_curve(lane.param, None)
@@ -2,18 +2,75 @@ from abc import ABC, abstractmethod
 import numpy as np
 
 class AudioEngine(ABC):
+    # 1 = mono output [frames], 2 = stereo output [frames, 2]
+    channels = 1
+    # Parameters settable through set_param() (and so from the control plane)
+    params = ("frequency", "amplitude")
+    # Parameters the engine can apply per sample from an automation curve
+    curve_params = ()
+
     def __init__(self, sample_rate: int = 48000):
         self.sample_rate = sample_rate
+        # name -> float32 per-sample curve for the current block (see automation.py)
+        self.param_curves = {}
+
+    def has_param(self, name: str) -> bool:
+        return name in self.params
+
+    def get_param(self, name: str) -> float:
+        return float(getattr(self, name))
+
+    def set_param_curve(self, name: str, curve):
+        """Installs (or clears, with None) a per-sample curve for the next process_into()."""
+        if curve is None:
+            self.param_curves.pop(name, None)
+        else:
+            self.param_curves[name] = curve
+
+    def set_param(self, name: str, value: float):
+        """
+        Generic parameter entry point: calls set_<name>() if the engine has
+        one, otherwise assigns the attribute directly.
+        """
+        setter = getattr(self, f"set_{name}", None)
+        if callable(setter):
+            setter(value)
+        elif self.has_param(name):
+            setattr(self, name, value)
+        else:
+            raise KeyError(f"{self.__class__.__name__} has no parameter '{name}'")
+
+    def close(self):
+        """
+        Releases shared resources (cached samples) once the engine is replaced.
+        It may still render afterwards while a crossfade plays it out.
+        """
 
     @abstractmethod
+    def process_into(self, out: np.ndarray) -> None:
+        """
+        Render audio into a caller-supplied buffer, overwriting it.
+        
+        Args:
+            out: float32 buffer of shape [frames] (mono engines) or
+                 [frames, 2] (stereo engines). Must not be reallocated.
+        """
+        pass
+
     def process(self, num_frames: int) -> np.ndarray:
         """
-        Generate audio samples.
+        Generate audio samples into a newly allocated buffer.
+        
+        Compatibility wrapper around process_into(); the audio callback
+        renders into preallocated buses instead.
         
         Args:
             num_frames: Number of frames to generate.
             
         Returns:
-            numpy.ndarray: Audio data. Can be 1D (mono) or 2D (stereo, shape=[frames, channels]).
+            numpy.ndarray: Audio data. 1D (mono) or 2D (stereo, shape=[frames, channels]).
         """
-        pass
+        shape = (num_frames,) if self.channels == 1 else (num_frames, self.channels)
+        out = np.zeros(shape, dtype=np.float32)
+        self.process_into(out)
+        return out
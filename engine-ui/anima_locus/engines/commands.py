@@ -0,0 +1,100 @@
+"""
+Parameter command queue between the control plane and the audio thread.
+
+Single producer (the event loop: WebSocket and REST handlers), single consumer
+(the audio callback). Commands are written into preallocated ring arrays and
+published by advancing `_head`; the consumer advances `_tail`. Each index is
+written by one side only, so no lock is needed.
+
+The consumer drains once per block and coalesces immediate commands: only the
+newest value for each (part, param) is returned, so a flood of XY-pad messages
+costs one engine write per block. Timed commands (`time` >= 0, in stream
+samples) are all returned, in order, for the automation scheduler.
+"""
+
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+# Key stride for (part, param) coalescing
+_PARAM_STRIDE = 1 << 16
+
+
+class ParamCommandQueue:
+    def __init__(self, part_ids: Iterable[str], capacity: int = 1024):
+        self.part_ids: List[str] = list(part_ids)
+        self._part_index: Dict[str, int] = {pid: i for i, pid in enumerate(self.part_ids)}
+        # Parameter names are interned to small ints on the producer side
+        self.param_names: List[str] = []
+        self._param_index: Dict[str, int] = {}
+
+        self.capacity = capacity
+        self._part = np.zeros(capacity, dtype=np.int64)
+        self._param = np.zeros(capacity, dtype=np.int64)
+        self._value = np.zeros(capacity, dtype=np.float64)
+        self._time = np.zeros(capacity, dtype=np.int64)  # Stream sample, -1 = as soon as possible
+        self._ramp = np.zeros(capacity, dtype=np.int64)  # Ramp length in samples
+        self._head = 0 # Total commands published (producer only)
+        self._tail = 0 # Total commands consumed (consumer only)
+        self.dropped = 0
+
+    def __len__(self) -> int:
+        return self._head - self._tail
+
+    def push(self, part_id: str, param: str, value: float, time: int = -1, ramp: int = 0) -> bool:
+        """
+        Enqueues a parameter change. `time` is the stream sample it takes effect
+        at (-1 = next block) and `ramp` the ramp length in samples.
+        Returns False (and counts a drop) if the ring is full.
+        """
+        head = self._head
+        if head - self._tail >= self.capacity:
+            self.dropped += 1
+            return False
+
+        param_idx = self._param_index.get(param)
+        if param_idx is None:
+            param_idx = len(self.param_names)
+            self.param_names.append(param)
+            self._param_index[param] = param_idx
+
+        slot = head % self.capacity
+        self._part[slot] = self._part_index[part_id]
+        self._param[slot] = param_idx
+        self._value[slot] = value
+        self._time[slot] = time
+        self._ramp[slot] = ramp
+        # Publish only after the slot is fully written
+        self._head = head + 1
+        return True
+
+    def drain(self) -> List[Tuple[str, str, float, int, int]]:
+        """
+        Consumes everything published so far. Returns (part_id, param, value,
+        time, ramp) tuples: the newest immediate command per (part, param),
+        followed by every timed command in publish order.
+        """
+        head = self._head
+        tail = self._tail
+        if head == tail:
+            return []
+
+        slots = np.arange(tail, head) % self.capacity
+        timed = self._time[slots] >= 0
+        immediate = slots[~timed]
+        if immediate.size:
+            keys = self._part[immediate] * _PARAM_STRIDE + self._param[immediate]
+            # np.unique on the reversed keys finds the last write of every key
+            _, first_in_reversed = np.unique(keys[::-1], return_index=True)
+            immediate = immediate[::-1][first_in_reversed]
+        selected = np.concatenate((immediate, slots[timed]))
+
+        commands = [
+            (self.part_ids[p], self.param_names[k], float(v), int(t), int(r))
+            for p, k, v, t, r in zip(
+                self._part[selected], self._param[selected], self._value[selected],
+                self._time[selected], self._ramp[selected],
+            )
+        ]
+        self._tail = head
+        return commands
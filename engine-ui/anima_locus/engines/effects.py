@@ -0,0 +1,315 @@
+"""
+Block effects for part inserts and the master bus.
+
+Every effect transforms a stereo block ([frames, 2], possibly a strided view)
+in place with whole-block NumPy / SciPy operations, and mixes wet against dry
+with `mix`. An EffectChain runs them in order; chains are built off the audio
+thread (build_chain) and swapped in by reference (AudioPart.set_inserts,
+EngineManager.master_fx).
+
+ConvolutionReverb is a uniformly partitioned overlap-save convolver: the
+impulse response is cut into K partitions of P samples whose spectra are
+computed once. Each P input samples cost one real FFT, one K-deep
+multiply-accumulate against a frequency-domain delay line of past input
+spectra, and one inverse FFT, however long the IR is. The wet signal lags
+the dry one by one partition (P samples of pre-delay).
+"""
+
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Mapping, Optional, Sequence
+
+import numpy as np
+
+from .samples import sample_cache
+
+
+class Effect(ABC):
+    kind = "effect"
+    # Parameters settable through set_param()
+    params = ("mix",)
+
+    def __init__(self, sample_rate: int = 48000, mix: float = 1.0):
+        self.sample_rate = sample_rate
+        self.mix = mix
+
+    def has_param(self, name: str) -> bool:
+        return name in self.params
+
+    def get_param(self, name: str) -> float:
+        return float(getattr(self, name))
+
+    def set_param(self, name: str, value: float):
+        """Calls set_<name>() if the effect has one, otherwise assigns the attribute."""
+        setter = getattr(self, f"set_{name}", None)
+        if callable(setter):
+            setter(value)
+        elif self.has_param(name):
+            setattr(self, name, value)
+        else:
+            raise KeyError(f"{self.__class__.__name__} has no parameter '{name}'")
+
+    def set_mix(self, mix: float):
+        self.mix = min(1.0, max(0.0, float(mix)))
+
+    @abstractmethod
+    def process_into(self, buf: np.ndarray) -> None:
+        """Processes a float32 [frames, 2] block in place."""
+
+    def describe(self) -> Dict[str, Any]:
+        return {"type": self.kind, "params": {name: self.get_param(name) for name in self.params}}
+
+
+def synthetic_ir(sample_rate: int, decay: float, seed: int = 7) -> np.ndarray:
+    """Decorrelated stereo noise with an exponential (-60 dB over `decay` s) envelope, [n, 2]."""
+    n = max(1, int(sample_rate * decay))
+    rng = np.random.default_rng(seed)
+    envelope = np.exp(np.arange(n) * (-6.9 / n))
+    ir = rng.normal(0.0, 1.0, (n, 2)) * envelope[:, None]
+    ir /= np.sqrt(np.sum(ir * ir, axis=0)) # Unit energy per channel
+    return ir.astype(np.float32)
+
+
+class ConvolutionReverb(Effect):
+    kind = "reverb"
+    params = ("mix", "decay")
+
+    def __init__(self, sample_rate: int = 48000, ir: Optional[np.ndarray] = None, partition: int = 256,
+                 decay: float = 1.5, mix: float = 0.25):
+        super().__init__(sample_rate, mix)
+        self.partition = partition
+        self.decay = decay
+        P = partition
+        self._input = np.zeros((2 * P, 2), dtype=np.float32) # Previous partition | current one
+        self._wet = np.zeros((P, 2), dtype=np.float32)       # Output of the last full partition
+        self._tmp = np.zeros((P, 2), dtype=np.float32)
+        self._fill = 0
+        self.set_ir(synthetic_ir(sample_rate, decay) if ir is None else ir)
+
+    def set_decay(self, decay: float):
+        """Regenerates the synthetic IR; as slow as set_ir (build time, not per block)."""
+        self.decay = max(0.01, float(decay))
+        self.set_ir(synthetic_ir(self.sample_rate, self.decay))
+
+    def set_ir(self, ir: np.ndarray):
+        """Precomputes the partition spectra of a [n] or [n, 2] impulse response."""
+        P = self.partition
+        ir = np.asarray(ir, dtype=np.float64)
+        if ir.ndim == 1:
+            ir = np.stack([ir, ir], axis=1)
+        K = -(-ir.shape[0] // P)
+        blocks = np.zeros((K * P, 2))
+        blocks[:ir.shape[0]] = ir[:, :2]
+        padded = np.zeros((K, 2 * P, 2))
+        padded[:, :P] = blocks.reshape(K, P, 2)
+        spectra = np.fft.rfft(padded, axis=1).astype(np.complex64)   # [K, P + 1, 2]
+        # Delay line of input spectra, stored twice so fdl[w:w + K] is newest-first
+        fdl = np.zeros((2 * K, P + 1, 2), dtype=np.complex64)
+        self._prod = np.zeros_like(spectra)
+        self._acc = np.zeros((P + 1, 2), dtype=np.complex64)
+        self._write = 0
+        self._kernel = (spectra, fdl)
+        self.ir_length = ir.shape[0]
+
+    @property
+    def partitions(self) -> int:
+        return self._kernel[0].shape[0]
+
+    def _convolve_partition(self):
+        spectra, fdl = self._kernel
+        K = spectra.shape[0]
+        w = self._write = (self._write - 1) % K
+        fdl[w] = fdl[w + K] = np.fft.rfft(self._input, axis=0)
+        np.multiply(fdl[w:w + K], spectra, out=self._prod)
+        np.sum(self._prod, axis=0, out=self._acc)
+        # Overlap-save: the second half of the circular result is the linear convolution
+        self._wet[:] = np.fft.irfft(self._acc, n=2 * self.partition, axis=0)[self.partition:]
+        self._input[:self.partition] = self._input[self.partition:]
+
+    def process_into(self, buf: np.ndarray) -> None:
+        P = self.partition
+        n = buf.shape[0]
+        pos = 0
+        while pos < n:
+            fill = self._fill
+            take = min(P - fill, n - pos)
+            chunk = buf[pos:pos + take]
+            self._input[P + fill:P + fill + take] = chunk
+            # Emit the wet signal of the previous partition while this one fills
+            wet = self._tmp[:take]
+            np.multiply(self._wet[fill:fill + take], self.mix, out=wet)
+            chunk *= 1.0 - self.mix
+            chunk += wet
+            self._fill = fill + take
+            pos += take
+            if self._fill == P:
+                self._convolve_partition()
+                self._fill = 0
+
+
+class Delay(Effect):
+    """Feedback delay on a stereo ring buffer; `ping_pong` crosses the feedback between channels."""
+    kind = "delay"
+    params = ("mix", "time", "feedback", "ping_pong")
+
+    def __init__(self, sample_rate: int = 48000, time: float = 0.35, feedback: float = 0.35, mix: float = 0.3,
+                 max_time: float = 2.0, ping_pong: bool = False):
+        super().__init__(sample_rate, mix)
+        self._ring = np.zeros((int(max_time * sample_rate) + 1, 2), dtype=np.float32)
+        self._write = 0
+        self.max_time = max_time
+        self.ping_pong = bool(ping_pong)
+        self.set_time(time)
+        self.set_feedback(feedback)
+        self._allocate(4096)
+
+    def _allocate(self, frames: int):
+        self._fb = np.zeros((frames, 2), dtype=np.float32)
+        self._tmp = np.zeros((frames, 2), dtype=np.float32)
+
+    def set_time(self, time: float):
+        self.time = min(self.max_time, max(1.0 / self.sample_rate, float(time)))
+
+    def set_feedback(self, feedback: float):
+        self.feedback = min(0.98, max(0.0, float(feedback)))
+
+    def set_ping_pong(self, value: float):
+        self.ping_pong = bool(value)
+
+    def process_into(self, buf: np.ndarray) -> None:
+        n = buf.shape[0]
+        if n > self._fb.shape[0]:
+            self._allocate(n)
+        ring = self._ring
+        size = ring.shape[0]
+        d = max(1, int(round(self.time * self.sample_rate)))
+        pos = 0
+        # Chunks no longer than the delay: every sample read was written in an earlier chunk
+        while pos < n:
+            w = self._write
+            r = (w - d) % size
+            take = min(d, n - pos, size - w, size - r)
+            x = buf[pos:pos + take]
+            delayed = ring[r:r + take]
+            fb, wet = self._fb[:take], self._tmp[:take]
+            np.multiply(delayed[:, ::-1] if self.ping_pong else delayed, self.feedback, out=fb)
+            fb += x
+            np.multiply(delayed, self.mix, out=wet)
+            x *= 1.0 - self.mix
+            x += wet
+            ring[w:w + take] = fb
+            self._write = (w + take) % size
+            pos += take
+
+
+FILTER_MODES = ("lowpass", "highpass", "bandpass")
+
+
+class Filter(Effect):
+    """RBJ biquad, run over whole blocks by scipy.signal.lfilter with its state carried across blocks."""
+    kind = "filter"
+    params = ("mix", "cutoff", "q")
+
+    def __init__(self, sample_rate: int = 48000, mode: str = "lowpass", cutoff: float = 1000.0, q: float = 0.707,
+                 mix: float = 1.0):
+        super().__init__(sample_rate, mix)
+        if mode not in FILTER_MODES:
+            raise ValueError(f"Unknown filter mode: {mode}")
+        self.mode = mode
+        self.cutoff = cutoff
+        self.q = q
+        self._zi = np.zeros((2, 2)) # Direct form II transposed state, [order, channels]
+        self._design()
+        # scipy.signal takes most of a second to import (in every part worker too): only filters pay it
+        from scipy.signal import lfilter
+        self._lfilter = lfilter
+
+    def set_cutoff(self, cutoff: float):
+        self.cutoff = min(0.49 * self.sample_rate, max(10.0, float(cutoff)))
+        self._design()
+
+    def set_q(self, q: float):
+        self.q = max(0.1, float(q))
+        self._design()
+
+    def _design(self):
+        w0 = 2.0 * np.pi * self.cutoff / self.sample_rate
+        cos, alpha = np.cos(w0), np.sin(w0) / (2.0 * self.q)
+        if self.mode == "lowpass":
+            b = np.array([(1.0 - cos) / 2.0, 1.0 - cos, (1.0 - cos) / 2.0])
+        elif self.mode == "highpass":
+            b = np.array([(1.0 + cos) / 2.0, -(1.0 + cos), (1.0 + cos) / 2.0])
+        else: # Constant 0 dB peak gain
+            b = np.array([alpha, 0.0, -alpha])
+        a = np.array([1.0 + alpha, -2.0 * cos, 1.0 - alpha])
+        self._coeffs = (b / a[0], a / a[0]) # Swapped as one reference
+
+    def describe(self) -> Dict[str, Any]:
+        return {**super().describe(), "mode": self.mode}
+
+    def process_into(self, buf: np.ndarray) -> None:
+        b, a = self._coeffs
+        y, self._zi = self._lfilter(b, a, buf, axis=0, zi=self._zi)
+        if self.mix >= 1.0:
+            buf[:] = y
+        else:
+            buf *= 1.0 - self.mix
+            y *= self.mix
+            buf += y
+
+
+EFFECT_TYPES = {
+    "reverb": ConvolutionReverb,
+    "delay": Delay,
+    "filter": Filter,
+}
+
+
+class EffectChain:
+    """An ordered, immutable list of effects; replace the whole chain to change it."""
+
+    def __init__(self, effects: Sequence[Effect] = ()):
+        self.effects = tuple(effects)
+
+    def __len__(self) -> int:
+        return len(self.effects)
+
+    def process_into(self, buf: np.ndarray) -> None:
+        for effect in self.effects:
+            effect.process_into(buf)
+
+    def describe(self) -> List[Dict[str, Any]]:
+        return [effect.describe() for effect in self.effects]
+
+
+def build_effect(kind: str, sample_rate: int = 48000, mode: Optional[str] = None, ir: Optional[str] = None,
+                 **params) -> Effect:
+    """
+    Constructs an effect: `mode` for filters, `ir` (a sample file, via the
+    sample cache) for the reverb, then parameter values. Reverb IR spectra
+    are computed here, so call it off the audio thread.
+    """
+    if kind not in EFFECT_TYPES:
+        raise ValueError(f"Unknown effect type: {kind}")
+    if mode is not None and kind != "filter":
+        raise ValueError(f"{kind} effects have no mode")
+    if ir is not None and kind != "reverb":
+        raise ValueError(f"{kind} effects take no impulse response")
+    effect = EFFECT_TYPES[kind](sample_rate, mode=mode) if mode is not None else EFFECT_TYPES[kind](sample_rate)
+    if ir is not None:
+        sample = sample_cache.acquire(ir)
+        try:
+            effect.set_ir(sample.to_float()) # Spectra are computed from a copy; the file can go
+        finally:
+            sample_cache.release(sample)
+    for name, value in params.items():
+        effect.set_param(name, value)
+    return effect
+
+
+def build_chain(specs: Sequence[Mapping[str, Any]], sample_rate: int = 48000) -> Optional[EffectChain]:
+    """Builds a chain from [{"type", "params", "mode", "ir"}]; None for an empty list."""
+    effects = []
+    for spec in specs:
+        options = {key: spec[key] for key in ("mode", "ir") if spec.get(key) is not None}
+        effects.append(build_effect(spec["type"], sample_rate, **options, **spec.get("params", {})))
+    return EffectChain(effects) if effects else None
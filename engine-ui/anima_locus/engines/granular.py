@@ -1,133 +1,252 @@
 import numpy as np
+from typing import Optional
 from .base import AudioEngine
+from .samples import Sample, sample_cache
+
+# Grain pool record. One row per grain slot; `age` is the grain's sample
+# position at the start of the next block (negative = starts later in the block).
+GRAIN_DTYPE = np.dtype([
+    ("start", np.int64),    # Read position in the source buffer
+    ("age", np.int64),      # Samples since grain onset
+    ("length", np.int64),   # Grain length in samples
+    ("amp", np.float32),
+    ("gain_l", np.float32), # Constant-power pan gains
+    ("gain_r", np.float32),
+    ("active", np.bool_),
+])
+
+# Window lookup table resolution
+WINDOW_SIZE = 1024
 
 class GranularEngine(AudioEngine):
-    def __init__(self, sample_rate=48000, buffer_duration=5.0):
+    channels = 2
+    curve_params = ("amplitude",)
+    params = ("frequency", "amplitude", "density", "position", "grain_size", "spray", "stereo_spread")
+
+    def __init__(self, sample_rate=48000, buffer_duration=5.0, max_grains=256):
         super().__init__(sample_rate)
         self.buffer_duration = buffer_duration
         self.buffer_size = int(sample_rate * buffer_duration)
-        
+        self._rng = np.random.default_rng()
+
         # Generate synthetic source buffer (Pink Noise-ish)
         # Using cumulative sum of white noise for "brown" noise, close enough for texture
-        white = np.random.normal(0, 0.5, self.buffer_size)
-        self.audio_buffer = np.cumsum(white) 
+        white = self._rng.normal(0, 0.5, self.buffer_size)
+        self.audio_buffer = np.cumsum(white)
         # Normalize
         self.audio_buffer /= np.max(np.abs(self.audio_buffer))
         self.audio_buffer *= 0.5 # Headroom
-        
+        self.audio_buffer = self.audio_buffer.astype(np.float32)
+
+        # Or a cached sample (set_source): audio_buffer is then a view of its
+        # mapping, read at frame * _stride + _channel and scaled to float
+        self.source: Optional[Sample] = None
+        self._stride = 1
+        self._channel = 0
+        self._source_scale = 1.0
+
         # Parameters
         self.position = 0.5 # 0.0 to 1.0 (Location in buffer)
         self.density = 20.0 # Grains per second
         self.grain_size = 0.1 # Seconds
         self.spray = 0.01 # Random position offset
-        
-        self.grains = [] # Active grains [(start_index, current_index, length, amplitude, pan)]
+        self.stereo_spread = 0.5 # 0.0 (all centered) to 1.0 (random hard L/R)
+        self.amplitude = 0.25 # Output volume (matches the default grain_size mapping)
+
+        # Grain pool: fixed-capacity structured array plus a free-list stack of slot indices
+        self.max_grains = max_grains
+        self._grains = np.zeros(max_grains, dtype=GRAIN_DTYPE)
+        self._free = np.arange(max_grains - 1, -1, -1, dtype=np.int64)
+        self._free_count = max_grains
+        self.dropped_grains = 0 # Spawns refused because the pool was full
+
         self._samples_per_grain_spawn = int(self.sample_rate / self.density)
-        self._spawn_counter = 0
+        self._spawn_counter = 0 # Samples until the next grain onset
+
+        # Periodic Hann window with a trailing zero. Lookups use mode='clip', so any
+        # sample before onset (index <= 0) or after the grain ends (index >= WINDOW_SIZE)
+        # reads a zero.
+        n = np.arange(WINDOW_SIZE)
+        self._window = np.zeros(WINDOW_SIZE + 1, dtype=np.float32)
+        self._window[:WINDOW_SIZE] = 0.5 - 0.5 * np.cos(2.0 * np.pi * n / WINDOW_SIZE)
+
+        # Per-block scratch, [grains, frames]; rows grow with peak polyphony
+        self._ramp = np.arange(4096, dtype=np.int64)
+        self._allocate_scratch(16, 4096)
+
+    def _allocate_scratch(self, rows: int, frames: int):
+        self._t = np.zeros((rows, frames), dtype=np.int64)
+        self._idx = np.zeros((rows, frames), dtype=np.int64)
+        self._win = np.zeros((rows, frames), dtype=np.float32)
+        self._src = np.zeros((rows, frames), dtype=np.float32)
+        self._gains = np.zeros((rows, 2), dtype=np.float32)
+        # Gather buffer in the source's own dtype when it is not float32
+        dtype = self.audio_buffer.dtype
+        self._raw = None if dtype == np.float32 else np.zeros((rows, frames), dtype=dtype)
+
+    def set_source(self, sample: Sample, channel: int = 0):
+        """
+        Granulates a cached sample (taking over the caller's reference) instead
+        of the synthetic buffer. No copy: grains read the mapped file directly.
+        Call it before the engine goes live (EngineManager.build_engine).
+        """
+        previous = self.source
+        self.source = sample
+        self._stride = sample.channels
+        self._channel = min(max(0, channel), sample.channels - 1)
+        self._source_scale = sample.scale
+        self.buffer_size = sample.frames
+        self.buffer_duration = sample.duration
+        self.audio_buffer = sample.data
+        self._allocate_scratch(*self._t.shape)
+        # Grains land anywhere near `position`: read the whole sample ahead
+        sample_cache.prefetch(sample, 0, sample.frames)
+        if previous is not None:
+            sample_cache.release(previous)
+
+    def load_source(self, path: str, channel: int = 0):
+        self.set_source(sample_cache.acquire(path), channel)
+
+    def close(self):
+        if self.source is not None:
+            sample_cache.release(self.source)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        if self.source is not None:
+            # Pickled by path (Sample.__reduce__); the mapping is rebuilt on load
+            state["audio_buffer"] = state["_raw"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self.source is not None:
+            self.audio_buffer = self.source.data
+            self._allocate_scratch(*self._t.shape)
+
+    @property
+    def active_grains(self) -> int:
+        return self.max_grains - self._free_count
 
     def set_frequency(self, freq: float):
         # Map frequency to Position and Density for texture control
         # Low freq -> Low density, High freq -> High density
         # This allows the XY pad X-axis to control texture density
         norm = max(0.0, min(1.0, (freq - 50) / 2000))
-        self.density = 5.0 + (norm * 50.0) # 5 to 55 Hz
-        self._samples_per_grain_spawn = int(self.sample_rate / self.density)
-        
+        self.set_density(5.0 + (norm * 50.0)) # 5 to 55 Hz
+
         # Map freq to playback rate? Or just keep it as density/texture?
         # Let's map high freq to playback position movement
         self.position = (self.position + 0.0001 * norm) % 1.0
 
+    def set_density(self, density: float):
+        self.density = max(0.1, density)
+        self._samples_per_grain_spawn = max(1, int(self.sample_rate / self.density))
+
     def set_amplitude(self, amp: float):
         # Map amplitude to grain size (Y axis) and output volume
         self.amplitude = amp
         # Higher Y = Smaller, tighter grains? Or larger washes?
         # Let's say Higher Y (loud) = Larger grains
-        self.grain_size = 0.05 + (amp * 0.2) 
-
-    def process(self, num_frames: int) -> np.ndarray:
-        output = np.zeros(num_frames, dtype=np.float32)
-        
-        # Determine number of grains to spawn in this block
-        samples_remaining = num_frames
-        cursor = 0
-        
-        while cursor < num_frames:
-            # Check if it's time to spawn a grain
-            if self._spawn_counter <= 0:
-                self._spawn_grain()
-                self._spawn_counter = self._samples_per_grain_spawn
-            
-            # Advance to next spawn or end of block
-            step = min(samples_remaining, self._spawn_counter)
-            
-            # Mix active grains
-            # We process active grains sample by sample or in small chunks? 
-            # For Python speed, let's process the whole block at once for active grains if possible, 
-            # but grains start/end at arbitrary times. 
-            # Simpler: Iterate over grains and add their contribution to the output buffer
-            
-            cursor += step
-            samples_remaining -= step
-            self._spawn_counter -= step
-
-        # --- Vectorized mixing of grains ---
-        # This is an approximation: we treat grains as adding to the whole block 
-        # regardless of exact sub-sample spawn time for performance in Python.
-        
-        active_grains_next = []
-        
-        for grain in self.grains:
-            # Unwrap grain state
-            start_idx, current_grain_time, length, amp, pan = grain
-            
-            # How many samples can this grain provide?
-            samples_needed = num_frames
-            samples_available = length - current_grain_time
-            
-            count = min(samples_needed, samples_available)
-            
-            if count > 0:
-                # Extract chunk from source buffer
-                # Handle wrapping if needed, but buffer is large
-                read_ptr = (start_idx + current_grain_time) % self.buffer_size
-                
-                # If read extends beyond buffer end, we clip (simplified)
-                end_ptr = read_ptr + count
-                if end_ptr < self.buffer_size:
-                    chunk = self.audio_buffer[read_ptr:end_ptr]
-                else:
-                    # Wrap around
-                    chunk = np.concatenate((
-                        self.audio_buffer[read_ptr:], 
-                        self.audio_buffer[:end_ptr % self.buffer_size]
-                    ))
-                
-                # Apply Grain Envelope (Hanning window)
-                # Calculating individual window slice is expensive.
-                # Linear fade / Trapezoid is faster.
-                # Let's just create a quick window for the chunk
-                # Optimized: Pre-compute window lookup?
-                # Simple: Just copy raw for now, improve later. 
-                # Better: Apply a simple fade in/out based on grain ratio
-                
-                output[:count] += chunk * amp * self.amplitude
-                
-                # Update grain state
-                current_grain_time += count
-                
-                if current_grain_time < length:
-                    active_grains_next.append((start_idx, current_grain_time, length, amp, pan))
-        
-        self.grains = active_grains_next
-        
-        return output
-        
-    def _spawn_grain(self):
-        # Calculate random position based on self.position + spray
-        offset = (np.random.random() - 0.5) * self.spray
-        pos = (self.position + offset) % 1.0
-        start_idx = int(pos * self.buffer_size)
-        
-        length = int(self.grain_size * self.sample_rate)
-        
-        self.grains.append((start_idx, 0, length, 1.0, 0.0))
+        self.grain_size = 0.05 + (amp * 0.2)
+
+    def process_into(self, out: np.ndarray) -> None:
+        num_frames = out.shape[0]
+
+        # Sample-accurate onsets for every grain due within this block
+        interval = self._samples_per_grain_spawn
+        if self._spawn_counter < num_frames:
+            offsets = np.arange(self._spawn_counter, num_frames, interval, dtype=np.int64)
+            self._spawn_counter = int(offsets[-1]) + interval - num_frames
+            self._spawn_grains(offsets)
+        else:
+            self._spawn_counter -= num_frames
+
+        g = self._grains
+        active = np.flatnonzero(g["active"])
+        count = active.size
+        if count == 0:
+            out.fill(0.0)
+            return
+
+        if count > self._t.shape[0] or num_frames > self._t.shape[1]:
+            rows = max(count, self._t.shape[0])
+            rows = 1 << (rows - 1).bit_length()
+            self._allocate_scratch(min(rows, self.max_grains), max(num_frames, self._t.shape[1]))
+        if num_frames > self._ramp.shape[0]:
+            self._ramp = np.arange(num_frames, dtype=np.int64)
+
+        age = g["age"][active]
+        length = g["length"][active]
+        t = self._t[:count, :num_frames]
+        idx = self._idx[:count, :num_frames]
+        win = self._win[:count, :num_frames]
+        src = self._src[:count, :num_frames]
+
+        # t[i, j] = sample position of grain i at block frame j
+        np.add(age[:, None], self._ramp[:num_frames], out=t)
+
+        # Window lookup: index = t * WINDOW_SIZE // length (out of range -> zero)
+        np.multiply(t, WINDOW_SIZE, out=idx)
+        np.floor_divide(idx, length[:, None], out=idx)
+        np.take(self._window, idx, out=win, mode="clip")
+
+        # Gather source samples (wrapping around the buffer) and apply the window
+        np.add(t, g["start"][active][:, None], out=idx)
+        if self._stride > 1:
+            # Interleaved sample: wrap to frames, then step to the channel
+            np.remainder(idx, self.buffer_size, out=idx)
+            idx *= self._stride
+            idx += self._channel
+        raw = src if self._raw is None else self._raw[:count, :num_frames]
+        np.take(self.audio_buffer, idx, out=raw, mode="wrap")
+        if raw is not src:
+            np.multiply(raw, np.float32(self._source_scale), out=src)
+        src *= win
+
+        # Scatter: one matrix product mixes all grains into the stereo output
+        gains = self._gains[:count]
+        np.multiply(g["gain_l"][active], g["amp"][active], out=gains[:, 0])
+        np.multiply(g["gain_r"][active], g["amp"][active], out=gains[:, 1])
+        amp_curve = self.param_curves.get("amplitude")
+        if amp_curve is None:
+            gains *= self.amplitude
+        np.matmul(src.T, gains, out=out)
+        if amp_curve is not None:
+            out *= amp_curve[:num_frames, None]
+
+        # Advance and retire finished grains back to the free list
+        age += num_frames
+        g["age"][active] = age
+        done = active[age >= length]
+        if done.size:
+            g["active"][done] = False
+            self._free[self._free_count:self._free_count + done.size] = done
+            self._free_count += done.size
+
+    def _spawn_grains(self, offsets: np.ndarray):
+        n = min(offsets.size, self._free_count)
+        if n < offsets.size:
+            self.dropped_grains += offsets.size - n
+        if n == 0:
+            return
+
+        slots = self._free[self._free_count - n:self._free_count].copy()
+        self._free_count -= n
+
+        # Calculate random positions based on self.position + spray
+        rand = self._rng.random((2, n))
+        pos = (self.position + (rand[0] - 0.5) * self.spray) % 1.0
+
+        # Random pan per grain within the stereo spread, constant-power law
+        # (scaled so a centered grain keeps the previous mono level)
+        theta = (1.0 + (rand[1] * 2.0 - 1.0) * self.stereo_spread) * (np.pi / 4.0)
+
+        g = self._grains
+        g["start"][slots] = (pos * self.buffer_size).astype(np.int64)
+        g["age"][slots] = -offsets[:n]
+        g["length"][slots] = max(1, int(self.grain_size * self.sample_rate))
+        g["amp"][slots] = 1.0
+        g["gain_l"][slots] = np.cos(theta) * np.sqrt(2.0)
+        g["gain_r"][slots] = np.sin(theta) * np.sqrt(2.0)
+        g["active"][slots] = True
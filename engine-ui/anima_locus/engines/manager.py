@@ -1,21 +1,68 @@
-from typing import Dict
-from .part import AudioPart
+from typing import Any, Dict, Iterable, Mapping, Optional, Sequence
+from .part import AudioPart, part_ids
 from .base import AudioEngine
+from .commands import ParamCommandQueue
+from .effects import EffectChain, build_chain
+from .automation import AutomationScheduler
+from .modulation import ModulationMatrix, compile_mappings
+from .snapshot import PresetSnapshot, SnapshotMorph, compile_preset
+from .granular import GranularEngine
+from .spectral import SpectralEngine
+from .oscillator import OscillatorEngine
+from .sampler import SamplerEngine
+from ..fusion.elements import ELEMENTS, ElementBus
 import logging
 
 logger = logging.getLogger(__name__)
 
+ENGINE_TYPES = {
+    "granular": GranularEngine,
+    "spectral": SpectralEngine,
+    "oscillator": OscillatorEngine,
+    "sampler": SamplerEngine,
+}
+
+
+def silence_parts(parts: Iterable[AudioPart], automation: AutomationScheduler):
+    """Zeroes every engine's amplitude and drops running automation."""
+    # Running ramps would otherwise bring the level back
+    automation.reset_requested = True
+    for part in parts:
+        if part.engine:
+            part.engine.param_curves.clear()
+            if hasattr(part.engine, 'set_amplitude'):
+                part.engine.set_amplitude(0.0)
+            # Force reset amplitude in engine if property exists
+            part.engine.amplitude = 0.0
+
+
 class EngineManager:
-    """Manages the 4 multitimbral parts (A, B, C, D)."""
+    """Manages the multitimbral parts (A, B, C, D by default; up to MAX_PARTS)."""
     
-    def __init__(self, sample_rate: int = 48000):
+    def __init__(self, sample_rate: int = 48000, num_parts: int = 4):
         self.sample_rate = sample_rate
         self.parts: Dict[str, AudioPart] = {
-            "A": AudioPart("A", sample_rate),
-            "B": AudioPart("B", sample_rate),
-            "C": AudioPart("C", sample_rate),
-            "D": AudioPart("D", sample_rate),
+            part_id: AudioPart(part_id, sample_rate) for part_id in part_ids(num_parts)
         }
+        # Control plane -> audio thread parameter changes
+        self.commands = ParamCommandQueue(self.parts)
+        self.automation = AutomationScheduler()
+        self.command_errors = 0
+        # Latest element values (MCU + UI); read by reference on the audio side
+        self.elements = ElementBus()
+        # Preset mappings compiled against the current parts; swapped by reference
+        self.mappings: Dict[str, Any] = {}
+        self.modulation = compile_mappings(self.mappings, self.parts, ELEMENTS)
+        # Bumped whenever engines change; compiled snapshots record it
+        self.layout_version = 0
+        # Last loaded preset snapshot (control plane writes, audio thread applies once)
+        self.snapshot: Optional[PresetSnapshot] = None
+        self._applied_snapshot: Optional[PresetSnapshot] = None
+        # Scene morph between two snapshots; the position is a plain float the audio thread polls
+        self.morph: Optional[SnapshotMorph] = None
+        self.morph_position = 0.0
+        # Master bus effects, run by the audio callback after the part mix; swapped by reference
+        self.master_fx: Optional[EffectChain] = None
         
     def get_part(self, part_id: str) -> AudioPart:
         part = self.parts.get(part_id.upper())
@@ -23,17 +70,178 @@ class EngineManager:
             raise ValueError(f"Invalid part ID: {part_id}")
         return part
         
-    def assign_engine_to_part(self, part_id: str, engine: AudioEngine):
+    def build_engine(self, engine_type: str, samples: Sequence[Mapping[str, Any]] = (), **params) -> AudioEngine:
+        """
+        Constructs an engine and renders one throwaway block so buffers, tables
+        and caches exist before it goes live. Slow (GranularEngine builds its
+        source buffer, samples are mapped): call it off the audio thread and
+        off the event loop.
+
+        `samples` are zones ({"path", "root", "low", "high"}) for a sampler;
+        a granular engine granulates the first one.
+        """
+        if engine_type not in ENGINE_TYPES:
+            raise ValueError(f"Unknown engine type: {engine_type}")
+        engine = ENGINE_TYPES[engine_type](self.sample_rate)
+        if samples and not isinstance(engine, (SamplerEngine, GranularEngine)):
+            raise ValueError(f"{engine_type} engines do not take samples")
+        for zone in samples:
+            if isinstance(engine, GranularEngine):
+                engine.load_source(zone["path"])
+                break
+            engine.add_sample(**zone)
+        for name, value in params.items():
+            engine.set_param(name, value)
+        engine.process(1024)
+        return engine
+
+    def build_effects(self, specs: Sequence[Mapping[str, Any]]) -> Optional[EffectChain]:
+        """
+        Builds an effect chain from [{"type", "params", "mode", "ir"}]. Slow
+        (reverb IR spectra): call it off the audio thread, like build_engine.
+        """
+        return build_chain(specs, self.sample_rate)
+
+    def set_effects(self, target: str, chain: Optional[EffectChain]):
+        """Installs a chain as a part's inserts ("C") or on the master bus ("master"); None clears it."""
+        if target.lower() == "master":
+            self.master_fx = chain
+        else:
+            self.get_part(target).set_inserts(chain)
+
+    def assign_engine_to_part(self, part_id: str, engine: AudioEngine, crossfade: float = 0.0):
         part = self.get_part(part_id)
-        part.assign_engine(engine)
+        previous = part.engine
+        part.assign_engine(engine, crossfade)
+        if previous is not None and previous is not engine:
+            # Drops its cache references; a crossfade may still be playing it
+            previous.close()
         logger.info(f"Assigned {engine.__class__.__name__} to Part {part_id}")
+        self.layout_version += 1
+        if self.mappings:
+            # Engine-type routes ("granular.density") may now resolve differently
+            self.set_mappings(self.mappings)
+
+    def set_mappings(self, mappings: Mapping[str, Any]) -> ModulationMatrix:
+        """Compiles preset mappings (control plane side) and swaps in the new matrix."""
+        matrix = compile_mappings(mappings, self.parts, ELEMENTS)
+        self.mappings = dict(mappings)
+        self.modulation = matrix
+        if matrix.unresolved:
+            logger.warning(f"Unresolved mappings: {matrix.unresolved}")
+        return matrix
+
+    def compile_preset(self, preset_id: str, engines: Mapping[str, Any], mappings: Mapping[str, Any]) -> PresetSnapshot:
+        """Validates and flattens a preset against the current parts (control plane, off the audio path)."""
+        return compile_preset(preset_id, engines, mappings, self.parts, ELEMENTS, self.layout_version)
+
+    def load_snapshot(self, snapshot: PresetSnapshot):
+        """
+        Switches to a compiled preset: reference swaps only; values land at the
+        next block. Ends any morph, which would otherwise overwrite the preset's
+        values on the next position change (set one up again with set_morph).
+        """
+        snapshot.modulation.reset()
+        self.morph = None
+        self.mappings = snapshot.mappings
+        self.modulation = snapshot.modulation
+        self.snapshot = snapshot
+
+    def set_morph(self, a: PresetSnapshot, b: PresetSnapshot, position: float = 0.0) -> SnapshotMorph:
+        """Starts morphing between two compiled presets; move it with `morph_position`."""
+        morph = SnapshotMorph(a, b)
+        self.morph_position = position
+        self.morph = morph
+        return morph
+
+    def take_snapshot(self) -> Optional[PresetSnapshot]:
+        """Audio thread: the newly loaded snapshot, once; None if there is nothing new."""
+        snapshot = self.snapshot
+        if snapshot is self._applied_snapshot:
+            return None
+        self._applied_snapshot = snapshot
+        return snapshot
+
+    def queue_param(self, part_id: str, param: str, value: float,
+                    time: Optional[float] = None, ramp: Optional[float] = None) -> bool:
+        """
+        Schedules a parameter change (control plane side).
+
+        Args:
+            time: Stream time in seconds to apply it at; None = next audio block.
+            ramp: Optional ramp duration in seconds (linear, sample accurate).
+
+        Raises ValueError for unknown parts/params; returns False if the queue is full.
+        """
+        part = self.get_part(part_id)
+        if not part.has_param(param):
+            raise ValueError(f"Part {part.part_id} has no parameter '{param}'")
+        at = -1 if time is None else int(round(time * self.sample_rate))
+        ramp_samples = 0 if not ramp else int(round(ramp * self.sample_rate))
+        return self.commands.push(part.part_id, param, value, at, ramp_samples)
+
+    def apply_pending(self, block_start: int = 0, frames: int = 0):
+        """
+        Applies queued parameter changes, automation curves for the block
+        starting at stream sample `block_start`, and element modulation; called
+        by the audio thread once per block, before the parts render.
+        """
+        snapshot = self.take_snapshot()
+        if snapshot is not None:
+            for part_id, param, value in zip(snapshot.part_ids, snapshot.params, snapshot.values):
+                try:
+                    self.parts[part_id].set_param(param, value)
+                except Exception:
+                    self.command_errors += 1
+        morph = self.morph
+        if morph is not None:
+            for part_id, param, value in morph.changes(self.morph_position):
+                try:
+                    self.parts[part_id].set_param(param, value)
+                except Exception:
+                    self.command_errors += 1
+        for part_id, param, value, at, ramp in self.commands.drain():
+            try:
+                self.automation.schedule(self.parts, part_id, param, value, at, ramp, block_start)
+            except Exception:
+                # Engine may have been swapped since the command was validated
+                self.command_errors += 1
+        if frames:
+            try:
+                self.automation.process_block(self.parts, block_start, frames)
+            except Exception:
+                self.command_errors += 1
+        try:
+            self.modulation.apply(self.parts, self.elements.snapshot)
+        except Exception:
+            self.command_errors += 1
 
     def panic(self):
         """Silences all active engines immediately."""
         logger.warning("PANIC TRIGGERED: Silencing all parts.")
-        for part in self.parts.values():
-            if part.engine:
-                if hasattr(part.engine, 'set_amplitude'):
-                    part.engine.set_amplitude(0.0)
-                # Force reset amplitude in engine if property exists
-                part.engine.amplitude = 0.0
+        # In process execution mode the flag is also what tells the workers
+        silence_parts(self.parts.values(), self.automation)
+
+
+def create_default_manager(sample_rate: int = 48000, num_parts: int = 4) -> EngineManager:
+    """
+    Builds an EngineManager with the default A-D engines. Parts past D start
+    empty (silent) until an engine is assigned.
+    """
+    if num_parts < 4:
+        raise ValueError("The default layout needs at least 4 parts")
+    manager = EngineManager(sample_rate, num_parts)
+
+    # Part A: Granular (Texture)
+    manager.assign_engine_to_part("A", GranularEngine(sample_rate))
+
+    # Part B: Spectral (Pad)
+    manager.assign_engine_to_part("B", SpectralEngine(sample_rate))
+
+    # Part C: Oscillator (Bass)
+    manager.assign_engine_to_part("C", OscillatorEngine(sample_rate, frequency=110.0, amplitude=0.4))
+
+    # Part D: Oscillator (Lead)
+    manager.assign_engine_to_part("D", OscillatorEngine(sample_rate, frequency=660.0, amplitude=0.2))
+
+    return manager
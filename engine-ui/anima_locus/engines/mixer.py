@@ -0,0 +1,100 @@
+"""
+Matrix mixer for the part layout.
+
+Every part renders at unity gain into two rows of one stacked buffer
+[2 * parts, frames] (a mono engine fills only the first). The whole layout is
+then mixed to the outputs by a single matmul:
+
+    out[outputs, frames] = gains[outputs, 2 * parts] @ stack[2 * parts, frames]
+
+Volume, mute and the constant-power pan law live in `gains`. A part's two
+columns are rebuilt only when its mixer settings or channel layout change
+(AudioPart.mix_version), never per block. With more than two outputs, each
+part is routed to one stereo pair (`route`).
+
+In process execution the parts live in worker processes: the callback copies
+their unity rows into the stack and passes the gains each worker published
+to `set_part` instead of calling `render_part`.
+"""
+
+from typing import Sequence
+
+import numpy as np
+
+from .part import AudioPart, pan_gains
+
+
+class PartMixer:
+    def __init__(self, parts: Sequence[AudioPart], outputs: int = 2, max_block_size: int = 4096):
+        if outputs < 2 or outputs % 2:
+            raise ValueError("outputs must be a positive even number (stereo pairs)")
+        self.parts = list(parts)
+        self.outputs = outputs
+        count = len(self.parts)
+        self.gains = np.zeros((outputs, 2 * count), dtype=np.float32)
+        self.pairs = np.zeros(count, dtype=np.int64)   # Output pair per part
+        self.part_gains = np.zeros((count, 2), dtype=np.float32) # (left, right) per part, for post-fader taps
+        self._versions = [-1] * count                   # mix_version the columns were built from
+        self._layout = [0] * count                      # Rows each column pair was built for
+        self._allocate(max_block_size)
+
+    def reserve(self, num_frames: int):
+        """Grows the stack if a block larger than any seen so far arrives."""
+        if num_frames > self.max_block_size:
+            self._allocate(num_frames)
+
+    def _allocate(self, frames: int):
+        self.max_block_size = frames
+        self.stack = np.zeros((2 * len(self.parts), frames), dtype=np.float32)
+
+    def route(self, index: int, pair: int):
+        """Sends part `index` to outputs (2 * pair, 2 * pair + 1)."""
+        if not 0 <= pair < self.outputs // 2:
+            raise ValueError(f"Output pair {pair} out of range")
+        self.pairs[index] = pair
+        self._versions[index] = -1
+        self._layout[index] = 0
+
+    def _update(self, index: int, channels: int):
+        part = self.parts[index]
+        self._versions[index] = part.mix_version
+        left, right = (0.0, 0.0) if part.mute else pan_gains(part.volume, part.pan)
+        self._set_columns(index, channels, left, right)
+
+    def set_part(self, index: int, channels: int, left: float, right: float):
+        """Sets a part's layout and (left, right) gains directly; rebuilds its columns only if they changed."""
+        gains = self.part_gains[index]
+        if channels != self._layout[index] or gains[0] != np.float32(left) or gains[1] != np.float32(right):
+            self._set_columns(index, channels, left, right)
+
+    def _set_columns(self, index: int, channels: int, left: float, right: float):
+        self._layout[index] = channels
+        cols = self.gains[:, 2 * index:2 * index + 2]
+        cols.fill(0.0)
+        lo = 2 * int(self.pairs[index])
+        if channels == 1:
+            cols[lo, 0], cols[lo + 1, 0] = left, right
+        else:
+            cols[lo, 0], cols[lo + 1, 1] = left, right
+        self.part_gains[index] = left, right
+
+    def render_part(self, index: int, num_frames: int) -> np.ndarray:
+        """
+        Renders part `index` into its stack rows and refreshes its gain columns
+        if needed. Returns the rows written ([channels, frames]), valid until
+        the next block.
+        """
+        self.reserve(num_frames)
+        part = self.parts[index]
+        rows = part.render_rows(self.stack[2 * index:2 * index + 2], num_frames)
+        # Columns follow what was actually rendered (a crossfade may end mid-call)
+        if part.mix_version != self._versions[index] or rows.shape[0] != self._layout[index]:
+            self._update(index, rows.shape[0])
+        return rows
+
+    def silence_part(self, index: int, num_frames: int):
+        self.stack[2 * index:2 * index + 2, :num_frames] = 0.0
+
+    def mix_into(self, out: np.ndarray):
+        """Writes the mix of the rendered stack into `out` ([frames, outputs])."""
+        np.matmul(self.gains, self.stack[:, :out.shape[0]], out=out.T)
@@ -0,0 +1,237 @@
+"""
+Modulation matrix: preset mappings compiled into dense arrays.
+
+A preset's `mappings` route sources (element bus values) to destinations:
+
+    "earth": "C.frequency"                      part C's frequency, default range
+    "air":   {"target": "granular.density",     every part running a granular engine
+              "depth": 0.5, "curve": "exp", "range": [5, 60]}
+    "fire":  ["D.amplitude", {"target": "B.blur", "curve": "smooth"}]
+
+`compile_mappings()` resolves every route once (on preset load) into K routes
+and D destinations. Per block, `ModulationMatrix.evaluate()` does:
+
+    u   = clip((sources[src] - in_lo) * in_scale, 0, 1)     gather + normalise [K]
+    y   = lerp(CURVES[curve], u)                            table lookup       [K]
+    m   = clip(bias + depth @ y, 0, 1)                      one matmul         [D]
+    out = lo + span * m   (or lo * ratio ** m for log-scaled destinations)
+
+A negative depth inverts its route: it contributes |depth| * (1 - y), so
+`bias` is the summed |depth| of a destination's negative routes.
+
+Only destinations whose value changed are written, and nothing runs while the
+element snapshot is unchanged. Routes that cannot be resolved (unknown source,
+part, engine or parameter) are skipped and listed in `unresolved`.
+"""
+
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .part import AudioPart
+
+CURVE_SIZE = 257
+
+_u = np.linspace(0.0, 1.0, CURVE_SIZE)
+CURVES: Dict[str, np.ndarray] = {
+    "linear": _u,
+    "exp": np.expm1(4.0 * _u) / np.expm1(4.0),
+    "log": np.log1p(54.0 * _u) / np.log1p(54.0),
+    "smooth": _u * _u * (3.0 - 2.0 * _u),
+    "inverse": 1.0 - _u,
+}
+CURVE_NAMES = tuple(CURVES)
+_CURVE_TABLE = np.stack([CURVES[name] for name in CURVE_NAMES])
+del _u
+
+# Default destination ranges: (low, high, scale)
+PARAM_RANGES: Dict[str, Tuple[float, float, str]] = {
+    "frequency": (20.0, 2000.0, "log"),
+    "amplitude": (0.0, 1.0, "linear"),
+    "volume": (0.0, 1.0, "linear"),
+    "pan": (-1.0, 1.0, "linear"),
+    "mute": (0.0, 1.0, "linear"),
+    "density": (1.0, 100.0, "log"),
+    "position": (0.0, 1.0, "linear"),
+    "grain_size": (0.01, 0.5, "log"),
+    "spray": (0.0, 1.0, "linear"),
+    "stereo_spread": (0.0, 1.0, "linear"),
+    "center_freq": (20.0, 20000.0, "log"),
+    "bandwidth": (10.0, 2000.0, "log"),
+    "freeze": (0.0, 1.0, "linear"),
+    "blur": (0.0, 0.999, "linear"),
+}
+
+
+def engine_type(part: AudioPart) -> Optional[str]:
+    """"granular" for a GranularEngine etc.; None for an empty part."""
+    if part.engine is None:
+        return None
+    name = type(part.engine).__name__.lower()
+    return name[:-len("engine")] if name.endswith("engine") else name
+
+
+def _routes(spec: Any) -> List[Dict[str, Any]]:
+    """Normalises a mapping value (target string, route dict or a list of them)."""
+    if isinstance(spec, (list, tuple)):
+        return [route for item in spec for route in _routes(item)]
+    if isinstance(spec, str):
+        return [{"target": spec}]
+    if isinstance(spec, Mapping):
+        return [dict(spec)]
+    return [spec.model_dump()] # pydantic route model
+
+
+@dataclass
+class ModulationMatrix:
+    sources: Tuple[str, ...]
+    targets: List[Tuple[str, str]]          # [D] (part_id, param)
+    src_index: np.ndarray                   # [K] int
+    in_lo: np.ndarray                       # [K]
+    in_scale: np.ndarray                    # [K]
+    curve_index: np.ndarray                 # [K] int, rows of _CURVE_TABLE
+    depth: np.ndarray                       # [D, K]
+    bias: np.ndarray                        # [D] summed |depth| of negative routes
+    lo: np.ndarray                          # [D]
+    span: np.ndarray                        # [D] (log destinations: log(high / low))
+    log_scale: np.ndarray                   # [D] bool
+    unresolved: List[Dict[str, str]] = field(default_factory=list)
+
+    def __post_init__(self):
+        self.reset()
+
+    def reset(self):
+        """Forgets the last written values so the next block writes every destination."""
+        self.values = np.full(len(self.targets), np.nan) # Last written destination values
+        self._snapshot = None
+
+    @property
+    def routes(self) -> int:
+        return len(self.src_index)
+
+    def evaluate(self, sources: np.ndarray) -> np.ndarray:
+        """Destination values [D] for a vector of source values."""
+        u = np.clip((sources[self.src_index] - self.in_lo) * self.in_scale, 0.0, 1.0)
+        pos = u * (CURVE_SIZE - 1)
+        i0 = np.minimum(pos.astype(np.int64), CURVE_SIZE - 2)
+        frac = pos - i0
+        lo_row = _CURVE_TABLE[self.curve_index, i0]
+        y = lo_row + frac * (_CURVE_TABLE[self.curve_index, i0 + 1] - lo_row)
+        m = np.clip(self.bias + self.depth @ y, 0.0, 1.0)
+        out = self.span * m
+        log = self.log_scale
+        out[log] = self.lo[log] * np.exp(out[log])
+        out[~log] += self.lo[~log]
+        return out
+
+    def changes(self, snapshot) -> Sequence[Tuple[str, str, float]]:
+        """
+        (part_id, param, value) for destinations that moved since the last call;
+        empty while `snapshot` (an ElementSnapshot) is the one seen last time.
+        """
+        if snapshot is self._snapshot or not self.targets:
+            return ()
+        self._snapshot = snapshot
+        out = self.evaluate(snapshot.values)
+        moved = np.flatnonzero(out != self.values)
+        self.values[moved] = out[moved]
+        return [(*self.targets[d], float(out[d])) for d in moved]
+
+    def apply(self, parts: Mapping[str, AudioPart], snapshot) -> int:
+        """Writes changed destinations into the parts (audio thread); returns how many."""
+        changed = self.changes(snapshot)
+        for part_id, param, value in changed:
+            parts[part_id].set_param(param, value)
+        return len(changed)
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "sources": list(self.sources),
+            "targets": [f"{part_id}.{param}" for part_id, param in self.targets],
+            "routes": self.routes,
+            "depth": self.depth.tolist(),
+            "values": [None if np.isnan(v) else float(v) for v in self.values],
+            "unresolved": self.unresolved,
+        }
+
+
+def compile_mappings(mappings: Mapping[str, Any], parts: Mapping[str, AudioPart],
+                     sources: Sequence[str]) -> ModulationMatrix:
+    """Resolves preset mappings against the current part layout into a ModulationMatrix."""
+    targets: List[Tuple[str, str]] = []
+    target_index: Dict[Tuple[str, str], int] = {}
+    ranges: List[Tuple[float, float, str]] = []
+    routes = [] # (src, in_lo, in_scale, curve, depth, dest)
+    unresolved = []
+
+    for source, spec in mappings.items():
+        for route in _routes(spec):
+            target = str(route.get("target", ""))
+
+            def skip(reason: str):
+                unresolved.append({"source": source, "target": target, "reason": reason})
+
+            if source not in sources:
+                skip("unknown source")
+                continue
+            curve = route.get("curve") or "linear"
+            curve = getattr(curve, "value", curve)
+            if curve not in CURVES:
+                skip(f"unknown curve '{curve}'")
+                continue
+            scope, _, param = target.partition(".")
+            if scope.upper() in parts:
+                matched = [parts[scope.upper()]]
+            else:
+                matched = [part for part in parts.values() if engine_type(part) == scope.lower()]
+            matched = [part for part in matched if part.has_param(param)]
+            if not matched:
+                skip("no part has this parameter")
+                continue
+
+            default = PARAM_RANGES.get(param)
+            low_high = route.get("range")
+            if low_high is None and default is None:
+                skip("no default range for this parameter; give one")
+                continue
+            low, high = low_high if low_high is not None else default[:2]
+            scale = default[2] if default is not None else "linear"
+            if scale == "log" and (low <= 0.0 or high <= 0.0):
+                scale = "linear"
+            in_lo, in_hi = route.get("source_range") or (0.0, 1.0)
+
+            for part in matched:
+                key = (part.part_id, param)
+                if key not in target_index:
+                    target_index[key] = len(targets)
+                    targets.append(key)
+                    ranges.append((float(low), float(high), scale)) # First route to a destination sets its range
+                routes.append((
+                    sources.index(source), float(in_lo), 1.0 / max(float(in_hi) - float(in_lo), 1e-9),
+                    CURVE_NAMES.index(curve), float(route.get("depth", 1.0)), target_index[key],
+                ))
+
+    depth = np.zeros((len(targets), len(routes)))
+    for k, route in enumerate(routes):
+        depth[route[5], k] = route[4]
+    lo = np.array([r[0] for r in ranges])
+    high = np.array([r[1] for r in ranges])
+    log_scale = np.array([r[2] == "log" for r in ranges], dtype=bool)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        span = np.where(log_scale, np.log(high / np.where(log_scale, lo, 1.0)), high - lo)
+
+    return ModulationMatrix(
+        sources=tuple(sources),
+        targets=targets,
+        src_index=np.array([r[0] for r in routes], dtype=np.int64),
+        in_lo=np.array([r[1] for r in routes]),
+        in_scale=np.array([r[2] for r in routes]),
+        curve_index=np.array([r[3] for r in routes], dtype=np.int64),
+        depth=depth,
+        bias=-np.minimum(depth, 0.0).sum(axis=1),
+        lo=lo,
+        span=span,
+        log_scale=log_scale,
+        unresolved=unresolved,
+    )
@@ -1,37 +1,233 @@
 import numpy as np
+from typing import Dict, Optional, Tuple
 from .base import AudioEngine
 
+TABLE_SIZE = 2048
+WAVEFORMS = ("sine", "saw", "square", "triangle")
+
+# (waveform, table_size) -> [levels, table_size + 1] float32, shared by every engine
+_TABLE_CACHE: Dict[Tuple[str, int], np.ndarray] = {}
+
+
+def wavetable_mipmaps(waveform: str, table_size: int = TABLE_SIZE) -> np.ndarray:
+    """
+    Band-limited mip-mapped wavetables for a waveform, built once and cached.
+
+    Level k holds harmonics 1..table_size / 2**(k+1), so it plays alias-free
+    up to sample_rate * 2**k / table_size. Each row carries one guard sample
+    (a copy of sample 0) for linear interpolation.
+    """
+    key = (waveform, table_size)
+    tables = _TABLE_CACHE.get(key)
+    if tables is not None:
+        return tables
+    if waveform not in WAVEFORMS:
+        raise ValueError(f"Unknown waveform: {waveform}")
+
+    levels = int(np.log2(table_size // 2)) + 1
+    tables = np.zeros((levels, table_size + 1), dtype=np.float32)
+    for k in range(levels):
+        h = np.arange(1, table_size // 2 ** (k + 1) + 1)
+        if waveform == "sine":
+            amps = (h == 1).astype(np.float64)
+        elif waveform == "saw":
+            amps = ((-1.0) ** (h + 1)) / h
+        elif waveform == "square":
+            amps = np.where(h % 2 == 1, 1.0 / h, 0.0)
+        else: # triangle
+            amps = np.where(h % 2 == 1, ((-1.0) ** ((h - 1) // 2)) / h.astype(np.float64) ** 2, 0.0)
+
+        # Sum of sines via one inverse FFT: sin(2 pi h n / N) <-> -j N/2 at bin h
+        spectrum = np.zeros(table_size // 2 + 1, dtype=np.complex128)
+        spectrum[h] = -0.5j * table_size * amps
+        row = np.fft.irfft(spectrum, n=table_size)
+        row /= np.max(np.abs(row))
+        tables[k, :table_size] = row
+        tables[k, table_size] = row[0]
+
+    tables.setflags(write=False)
+    _TABLE_CACHE[key] = tables
+    return tables
+
+
 class OscillatorEngine(AudioEngine):
-    def __init__(self, sample_rate: int = 48000, frequency: float = 440.0, amplitude: float = 0.1):
+    """
+    Polyphonic wavetable oscillator bank.
+
+    All active voices are rendered together as one [voices, frames] table
+    lookup with linear interpolation. Voice 0 is the "pad" voice driven by
+    set_frequency() (the XY pad mapping); note_on()/note_off() allocate the
+    remaining voices, stealing the oldest when the bank is full. amplitude
+    is the master level of the bank. Automation curves: "amplitude" (master
+    level) and "frequency" (pad voice glide) are applied per sample.
+    """
+    curve_params = ("frequency", "amplitude")
+
+    def __init__(self, sample_rate: int = 48000, frequency: float = 440.0, amplitude: float = 0.1,
+                 waveform: str = "sine", max_voices: int = 64):
         super().__init__(sample_rate)
         self.frequency = frequency
         self.amplitude = amplitude
-        self.phase = 0.0
-        # 2 * pi * f / fs
-        self._phase_increment = 2 * np.pi * self.frequency / self.sample_rate
+        self.max_voices = max_voices
+        self.set_waveform(waveform)
+
+        # Voice state (index 0 = pad voice)
+        self._phase = np.zeros(max_voices, dtype=np.float64)      # Normalised 0..1
+        self._inc = np.zeros(max_voices, dtype=np.float64)        # Cycles per sample
+        self._level = np.zeros(max_voices, dtype=np.int64)        # Mip-map level
+        self._amp = np.zeros(max_voices, dtype=np.float32)        # Amplitude at block start
+        self._target = np.zeros(max_voices, dtype=np.float32)     # Amplitude at block end
+        self._active = np.zeros(max_voices, dtype=np.bool_)
+        self._gate = np.zeros(max_voices, dtype=np.bool_)
+        self._started = np.zeros(max_voices, dtype=np.int64)      # Allocation order, for stealing
+        self._note_counter = 0
+
+        self._active[0] = self._gate[0] = True
+        self._amp[0] = self._target[0] = 1.0
+        self.set_frequency(frequency)
+
+        self._ramp = np.arange(4096, dtype=np.float32)
+        self._allocate_scratch(8, 4096)
+
+    def _allocate_scratch(self, rows: int, frames: int):
+        self._pos = np.zeros((rows, frames), dtype=np.float64)
+        self._idx = np.zeros((rows, frames), dtype=np.int64)
+        self._frac = np.zeros((rows, frames), dtype=np.float32)
+        self._a = np.zeros((rows, frames), dtype=np.float32)
+        self._b = np.zeros((rows, frames), dtype=np.float32)
+        self._tmp = np.zeros(frames, dtype=np.float32)
+
+    def _mip_level(self, frequency):
+        # Smallest level whose highest harmonic stays below Nyquist
+        ratio = np.maximum(np.asarray(frequency, dtype=np.float64) * self.table_size / self.sample_rate, 1.0)
+        return np.clip(np.ceil(np.log2(ratio)), 0, self._tables.shape[0] - 1).astype(np.int64)
+
+    def set_waveform(self, waveform: str, table_size: int = TABLE_SIZE):
+        self._tables = wavetable_mipmaps(waveform, table_size)
+        self._flat_tables = self._tables.reshape(-1)
+        self.waveform = waveform
+        self.table_size = table_size
+        if hasattr(self, "_inc"):
+            self._level[:] = self._mip_level(self._inc * self.sample_rate)
 
     def set_frequency(self, frequency: float):
         self.frequency = frequency
-        self._phase_increment = 2 * np.pi * self.frequency / self.sample_rate
+        self._inc[0] = frequency / self.sample_rate
+        self._level[0] = self._mip_level(frequency)
 
     def set_amplitude(self, amplitude: float):
         self.amplitude = np.clip(amplitude, 0.0, 1.0)
 
-    def process(self, num_frames: int) -> np.ndarray:
-        if self.amplitude <= 0.001:
-            return np.zeros(num_frames, dtype=np.float32)
-
-        # Create phase array for this block
-        phases = self.phase + np.arange(num_frames) * self._phase_increment
-        
-        # Wrap phases to stay within reasonable bounds (optional but good for long running)
-        # Note: simplistic wrapping here; for perfect continuity usually utilize a persistent phase accumulator
-        # But this is "good enough" for a test oscillator
-        
-        # Generate sine wave
-        audio = self.amplitude * np.sin(phases)
-        
-        # Update phase for next block
-        self.phase = (self.phase + num_frames * self._phase_increment) % (2 * np.pi)
-        
-        return audio.astype(np.float32)
+    @property
+    def active_voices(self) -> int:
+        return int(np.count_nonzero(self._active))
+
+    def note_on(self, frequency: float, amplitude: float = 1.0) -> int:
+        """Starts a voice and returns its index, stealing the oldest voice if none is free."""
+        free = np.flatnonzero(~self._active[1:])
+        if free.size:
+            voice = int(free[0]) + 1
+            self._phase[voice] = 0.0
+            self._amp[voice] = 0.0
+        else:
+            voice = int(np.argmin(self._started[1:])) + 1
+        self._note_counter += 1
+        self._started[voice] = self._note_counter
+        self._active[voice] = self._gate[voice] = True
+        self.set_voice(voice, frequency, amplitude)
+        return voice
+
+    def set_voice(self, voice: int, frequency: Optional[float] = None, amplitude: Optional[float] = None):
+        if frequency is not None:
+            self._inc[voice] = frequency / self.sample_rate
+            self._level[voice] = self._mip_level(frequency)
+        if amplitude is not None:
+            self._target[voice] = amplitude
+
+    def note_off(self, voice: int):
+        """Releases a voice; it fades out over the next block and is freed."""
+        if voice == 0:
+            return
+        self._gate[voice] = False
+        self._target[voice] = 0.0
+
+    def all_notes_off(self):
+        self._gate[1:] = False
+        self._target[1:] = 0.0
+
+    def process_into(self, out: np.ndarray) -> None:
+        num_frames = out.shape[0]
+        amp_curve = self.param_curves.get("amplitude")
+        if amp_curve is None and self.amplitude <= 0.001:
+            out.fill(0.0)
+            return
+        freq_curve = self.param_curves.get("frequency")
+
+        voices = np.flatnonzero(self._active)
+        count = voices.size
+        if count > self._pos.shape[0] or num_frames > self._pos.shape[1]:
+            rows = 1 << (max(count, self._pos.shape[0]) - 1).bit_length()
+            self._allocate_scratch(min(rows, self.max_voices), max(num_frames, self._pos.shape[1]))
+        if num_frames > self._ramp.shape[0]:
+            self._ramp = np.arange(num_frames, dtype=np.float32)
+
+        inc = self._inc[voices]
+        phase = self._phase[voices]
+        pos = self._pos[:count, :num_frames]
+        idx = self._idx[:count, :num_frames]
+        frac = self._frac[:count, :num_frames]
+        a = self._a[:count, :num_frames]
+        b = self._b[:count, :num_frames]
+        ramp = self._ramp[:num_frames]
+
+        # Table position per voice and frame
+        np.multiply(inc[:, None], ramp, out=pos)
+        if freq_curve is not None:
+            # Pad voice glide: phase is the exclusive running sum of per-sample increments
+            pad = pos[0]
+            step = self._tmp[:num_frames]
+            np.multiply(freq_curve[:num_frames], 1.0 / self.sample_rate, out=step)
+            np.cumsum(step, out=pad)
+            glide_end = pad[-1]
+            pad -= step
+            self._level[0] = self._mip_level(np.max(freq_curve[:num_frames]))
+        pos += phase[:, None]
+        np.remainder(pos, 1.0, out=pos)
+        pos *= self.table_size
+
+        # Integer index into the flattened mip-map stack, plus fractional part
+        np.copyto(idx, pos, casting="unsafe")
+        np.subtract(pos, idx, out=frac, casting="unsafe")
+        idx += (self._level[voices] * (self.table_size + 1))[:, None]
+
+        # Linear interpolation: a + frac * (b - a)
+        np.take(self._flat_tables, idx, out=a)
+        idx += 1
+        np.take(self._flat_tables, idx, out=b)
+        b -= a
+        b *= frac
+        a += b
+
+        # Sum voices with a per-voice linear amplitude ramp across the block:
+        # out[j] = sum_v a[v, j] * (amp_v + (target_v - amp_v) * j / n)
+        amp0 = self._amp[voices]
+        delta = self._target[voices] - amp0
+        np.dot(amp0, a, out=out)
+        if np.any(delta):
+            tmp = self._tmp[:num_frames]
+            np.dot(delta, a, out=tmp)
+            tmp *= ramp
+            tmp *= 1.0 / num_frames
+            out += tmp
+        if amp_curve is None:
+            out *= self.amplitude
+        else:
+            out *= amp_curve[:num_frames]
+
+        # Advance phases and settle amplitudes
+        self._phase[voices] = (phase + inc * num_frames) % 1.0
+        if freq_curve is not None:
+            self._phase[0] = (phase[0] + glide_end) % 1.0
+        self._amp[voices] = self._target[voices]
+        released = voices[~self._gate[voices] & (self._target[voices] == 0.0)]
+        self._active[released] = False
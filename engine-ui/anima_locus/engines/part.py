@@ -1,83 +1,274 @@
+import math
 import numpy as np
-from typing import Optional
+from typing import List, Optional
 from .base import AudioEngine
+from .effects import EffectChain
+
+MIXER_PARAMS = ("volume", "pan", "mute")
+MAX_PARTS = 32
+
+
+def part_ids(count: int) -> List[str]:
+    """Part labels in order: A..Z, then AA, AB, ..."""
+    if not 1 <= count <= MAX_PARTS:
+        raise ValueError(f"Part count must be between 1 and {MAX_PARTS}")
+    letters = [chr(ord("A") + i) for i in range(26)]
+    return (letters + ["A" + letter for letter in letters])[:count]
+
+
+def pan_gains(volume: float, pan: float):
+    """Constant-power pan law: (left, right) with L^2 + R^2 = volume^2 (-3 dB each at centre)."""
+    theta = (pan + 1.0) * (0.25 * math.pi)
+    return volume * math.cos(theta), volume * math.sin(theta)
+
+
+class EngineFade:
+    """An outgoing engine being crossfaded out; `position` is advanced by the audio thread."""
+
+    def __init__(self, engine: AudioEngine, samples: int):
+        self.engine = engine
+        self.samples = max(1, samples)
+        self.position = 0
+
 
 class AudioPart:
-    """Represents one of the 4 timbral parts (A, B, C, D)."""
+    """Represents one timbral part (A, B, C, ...; see part_ids)."""
     
-    def __init__(self, part_id: str, sample_rate: int = 48000):
+    def __init__(self, part_id: str, sample_rate: int = 48000, max_block_size: int = 4096):
         self.part_id = part_id
         self.sample_rate = sample_rate
         self.engine: Optional[AudioEngine] = None
         
+        # Bumped whenever the gains or the channel layout change (PartMixer rebuilds its matrix)
+        self.mix_version = 0
+        
         # Mixer controls
-        self.volume = 1.0
-        self.pan = 0.0  # -1.0 (L) to 1.0 (R)
-        self.mute = False
+        self._volume = 1.0
+        self._pan = 0.0  # -1.0 (L) to 1.0 (R)
+        self._mute = False
+        
+        # Outgoing engine during a crossfaded swap (see assign_engine)
+        self.fade: Optional[EngineFade] = None
+        
+        # Insert effects, pre-fader (see set_inserts)
+        self.inserts: Optional[EffectChain] = None
+        
+        # Preallocated buses: engine output (mono) and the part's stereo output
+        self._allocate_buses(max_block_size)
         
-    def assign_engine(self, engine: AudioEngine):
-        """Assigns an active engine to this part."""
+    def _allocate_buses(self, frames: int):
+        self.max_block_size = frames
+        self._mono_bus = np.zeros(frames, dtype=np.float32)
+        self._bus = np.zeros((frames, 2), dtype=np.float32)
+        # Crossfade scratch: outgoing engine's buses and the gain ramps
+        self._fade_mono = np.zeros(frames, dtype=np.float32)
+        self._fade_bus = np.zeros((frames, 2), dtype=np.float32)
+        self._fade_in = np.zeros(frames, dtype=np.float32)
+        self._fade_out = np.zeros(frames, dtype=np.float32)
+        self._ramp = np.arange(frames, dtype=np.float32)
+        
+    def assign_engine(self, engine: AudioEngine, crossfade: float = 0.0):
+        """
+        Assigns an active engine to this part. With `crossfade` (seconds) the
+        previous engine keeps playing under an equal-power crossfade; build the
+        new engine beforehand (EngineManager.build_engine) so the swap itself is
+        two reference assignments.
+        """
+        if crossfade > 0.0 and self.engine is not None:
+            # Fade first: a block that still sees the old engine just fades it against itself
+            self.fade = EngineFade(self.engine, int(round(crossfade * self.sample_rate)))
+        else:
+            self.fade = None
         self.engine = engine
+        self.mix_version += 1
         # Ensure engine sample rate matches
         # In a real system, we might need resampling here
         if hasattr(self.engine, 'sample_rate') and self.engine.sample_rate != self.sample_rate:
              pass # TODO: Handle mismatch
              
-    def process(self, num_frames: int) -> np.ndarray:
+    @property
+    def volume(self) -> float:
+        return self._volume
+
+    @volume.setter
+    def volume(self, value: float):
+        self._volume = value
+        self.mix_version += 1
+
+    @property
+    def pan(self) -> float:
+        return self._pan
+
+    @pan.setter
+    def pan(self, value: float):
+        self._pan = value
+        self.mix_version += 1
+
+    @property
+    def mute(self) -> bool:
+        return self._mute
+
+    @mute.setter
+    def mute(self, value: bool):
+        self._mute = value
+        self.mix_version += 1
+
+    @property
+    def channels(self) -> int:
+        """Rows this part fills in a PartMixer stack: 1 for a mono engine, 2 if stereo, crossfading or with inserts."""
+        if self.fade is None and self.inserts is None and (self.engine is None or self.engine.channels == 1):
+            return 1
+        return 2
+
+    def set_inserts(self, chain: Optional[EffectChain]):
+        """Replaces the insert chain (built off the audio thread); None removes it."""
+        self.inserts = chain
+        self.mix_version += 1
+
+    def has_param(self, name: str) -> bool:
+        if name in MIXER_PARAMS:
+            return True
+        return self.engine is not None and self.engine.has_param(name)
+
+    def get_param(self, name: str) -> float:
+        if name in MIXER_PARAMS:
+            return float(getattr(self, name))
+        return self.engine.get_param(name)
+
+    def set_param(self, name: str, value: float):
+        """Sets a mixer control (volume, pan, mute) or forwards to the engine."""
+        if name == "volume":
+            self.volume = max(0.0, float(value))
+        elif name == "pan":
+            self.pan = min(1.0, max(-1.0, float(value)))
+        elif name == "mute":
+            self.mute = bool(value)
+        elif self.engine is not None:
+            self.engine.set_param(name, value)
+        else:
+            raise KeyError(f"Part {self.part_id} has no engine for parameter '{name}'")
+             
+    def _pan_gains(self):
+        return pan_gains(self.volume, self.pan)
+        
+    def render(self, num_frames: int) -> np.ndarray:
         """
-        Generates audio for this part, applying volume and pan.
-        Returns stereo numpy array [frames, 2].
+        Renders this part into its own preallocated stereo bus.
+        Returns a [frames, 2] view that is only valid until the next call.
         """
+        if num_frames > self.max_block_size:
+            # Only reallocates when a larger block than ever seen arrives
+            self._allocate_buses(num_frames)
+        
+        bus = self._bus[:num_frames]
+        if self.fade is not None:
+            return self._render_crossfade(bus, num_frames)
         if self.mute or self.engine is None:
-            return np.zeros((num_frames, 2), dtype=np.float32)
-            
-        # Get raw engine output
-        raw_output = self.engine.process(num_frames)
+            bus.fill(0.0)
+            return bus
         
-        # Ensure stereo
-        if raw_output.ndim == 1:
-            stereo_out = np.column_stack((raw_output, raw_output))
-        else:
-            stereo_out = raw_output
-            
-        # Apply Volume
-        stereo_out *= self.volume
+        l_gain, r_gain = self._pan_gains()
         
-        # Apply Pan (Linear pan law for simplicity, constant power is better for prod)
-        # Left channel gain
-        left_gain = np.clip((1.0 - self.pan) * 0.5 + 0.5, 0.0, 1.0) if self.pan > 0 else 1.0
-        if self.pan < 0:
-             # If panning left, right channel reduces
-             right_gain = np.clip((1.0 + self.pan) * 0.5 + 0.5, 0.0, 1.0) 
+        inserts = self.inserts
+        if inserts is not None:
+            # Inserts run on the unity-gain signal, before volume and pan
+            self._render_engine(self.engine, bus, self._mono_bus[:num_frames])
+            inserts.process_into(bus)
+            bus[:, 0] *= l_gain
+            bus[:, 1] *= r_gain
+        elif self.engine.channels == 1:
+            mono = self._mono_bus[:num_frames]
+            self.engine.process_into(mono)
+            # Volume and pan written straight into the stereo bus
+            np.multiply(mono, l_gain, out=bus[:, 0])
+            np.multiply(mono, r_gain, out=bus[:, 1])
         else:
-             right_gain = 1.0
-             
-        # Re-calc simple linear pan for now
-        # L = (1-pan)/2 * 2 ? No, let's stick to standard linear
-        # L = 1, R = 1 when pan = 0
-        
-        l_gain = 1.0 - max(0.0, self.pan)
-        r_gain = 1.0 + min(0.0, self.pan) # wait, pan is -1 to 1.
-        
-        # Correct Linear Pan:
-        # P = (pan + 1) / 2  (0=L, 0.5=C, 1=R)
-        # L = 1.0 - P
-        # R = P
-        # But we want center to be 1.0, 1.0 usually? Or -3dB?
-        # Let's simple: Scale gains
+            self.engine.process_into(bus)
+            bus[:, 0] *= l_gain
+            bus[:, 1] *= r_gain
         
-        # Let's use simple balance controls for now
-        # If pan < 0 (Left): Left=1, Right=1+pan 
-        # If pan > 0 (Right): Left=1-pan, Right=1
+        return bus
         
-        if self.pan < 0:
-            l_gain = 1.0
-            r_gain = 1.0 + self.pan
+    @staticmethod
+    def _render_engine(engine: AudioEngine, bus: np.ndarray, mono: np.ndarray):
+        """Renders an engine at unity gain into a stereo bus."""
+        if engine.channels == 1:
+            engine.process_into(mono)
+            bus[:, 0] = mono
+            bus[:, 1] = mono
         else:
-            l_gain = 1.0 - self.pan
-            r_gain = 1.0
-            
-        stereo_out[:, 0] *= l_gain
-        stereo_out[:, 1] *= r_gain
-        
-        return stereo_out
+            engine.process_into(bus)
+
+    def render_rows(self, rows: np.ndarray, num_frames: int) -> np.ndarray:
+        """
+        Renders the engine at unity gain into `rows` ([2, >= frames] rows of a
+        PartMixer stack); volume, pan and mute are applied by the mixer's gain
+        matrix. Returns the rows written ([channels, frames]).
+        """
+        inserts = self.inserts
+        out = rows[:2 if inserts is not None else self.channels, :num_frames]
+        if self.fade is not None:
+            if num_frames > self.max_block_size:
+                self._allocate_buses(num_frames)
+            # The fade keeps advancing while muted
+            bus = self._crossfade(self._bus[:num_frames], num_frames)
+            out[:] = 0.0 if self.mute else bus.T
+        elif self.mute or self.engine is None:
+            out.fill(0.0)
+        elif self.engine.channels == 1:
+            self.engine.process_into(out[0])
+            if out.shape[0] == 2:
+                out[1] = out[0]
+        else:
+            self.engine.process_into(out.T)
+        if inserts is not None and not self.mute:
+            inserts.process_into(out.T)
+        return out
+
+    def _render_crossfade(self, bus: np.ndarray, num_frames: int) -> np.ndarray:
+        self._crossfade(bus, num_frames)
+        inserts = self.inserts
+        if inserts is not None and not self.mute:
+            inserts.process_into(bus)
+        if self.mute:
+            bus.fill(0.0)
+        else:
+            l_gain, r_gain = self._pan_gains()
+            bus[:, 0] *= l_gain
+            bus[:, 1] *= r_gain
+        return bus
+
+    def _crossfade(self, bus: np.ndarray, num_frames: int) -> np.ndarray:
+        """Both engines at unity under the equal-power fade, into a stereo bus."""
+        fade = self.fade
+        engine = self.engine
+        faded = self._fade_bus[:num_frames]
+        self._render_engine(fade.engine, faded, self._fade_mono[:num_frames])
+        if engine is not None:
+            self._render_engine(engine, bus, self._mono_bus[:num_frames])
+        else:
+            bus.fill(0.0)
+
+        # Equal-power gains: sin / cos of the fade progress, clamped once it completes
+        g_in, g_out = self._fade_in[:num_frames], self._fade_out[:num_frames]
+        np.add(self._ramp[:num_frames], np.float32(fade.position), out=g_in)
+        np.multiply(g_in, np.float32(0.5 * np.pi / fade.samples), out=g_in)
+        np.minimum(g_in, np.float32(0.5 * np.pi), out=g_in)
+        np.cos(g_in, out=g_out)
+        np.sin(g_in, out=g_in)
+        bus *= g_in[:, None]
+        faded *= g_out[:, None]
+        bus += faded
+
+        fade.position += num_frames
+        if fade.position >= fade.samples and self.fade is fade:
+            self.fade = None
+            self.mix_version += 1
+        return bus
+
+    def process(self, num_frames: int) -> np.ndarray:
+        """
+        Generates audio for this part, applying volume and pan.
+        Returns stereo numpy array [frames, 2] (a copy; see render()).
+        """
+        return self.render(num_frames).copy()
@@ -0,0 +1,223 @@
+import numpy as np
+from dataclasses import dataclass
+from typing import List, Optional
+from .base import AudioEngine
+from .samples import Sample, SampleCache, sample_cache
+
+# Read-ahead per voice: a region this long is requested whenever the playhead
+# gets within half of it of the last prefetched frame
+PREFETCH_SECONDS = 0.5
+
+
+@dataclass
+class SampleZone:
+    sample: Sample
+    root: float = 261.63   # Frequency the sample plays back at its own rate
+    low: float = 0.0       # Key range (Hz) this zone answers
+    high: float = float("inf")
+
+
+class SamplerEngine(AudioEngine):
+    """
+    Multi-sample player streaming from memory-mapped files (samples.py).
+
+    Zones map frequency ranges to cached samples. Voice 0 is the "pad" voice,
+    looping the zone picked by set_frequency() from `position` (the XY pad
+    mapping); note_on()/note_off() play the remaining voices one-shot,
+    stealing the oldest when the bank is full. Each active voice is rendered
+    with one vectorised gather + linear interpolation per block, reading the
+    mapping directly; the prefetch thread keeps the region ahead of every
+    playhead resident.
+    """
+    channels = 2
+    curve_params = ("amplitude",)
+    params = ("frequency", "amplitude", "position")
+
+    def __init__(self, sample_rate: int = 48000, max_voices: int = 32, cache: Optional[SampleCache] = None):
+        super().__init__(sample_rate)
+        self.cache = cache or sample_cache
+        self.zones: List[SampleZone] = []
+        self.frequency = 261.63
+        self.amplitude = 0.5
+        self.position = 0.0 # Loop / note start, 0..1 of the sample
+        self.max_voices = max_voices
+
+        # Voice state (index 0 = pad voice)
+        self._zone = np.full(max_voices, -1, dtype=np.int64)
+        self._pos = np.zeros(max_voices, dtype=np.float64)        # Playhead in source frames
+        self._rate = np.zeros(max_voices, dtype=np.float64)       # Source frames per output frame
+        self._amp = np.zeros(max_voices, dtype=np.float32)        # Amplitude at block start
+        self._target = np.zeros(max_voices, dtype=np.float32)     # Amplitude at block end
+        self._active = np.zeros(max_voices, dtype=np.bool_)
+        self._gate = np.zeros(max_voices, dtype=np.bool_)
+        self._started = np.zeros(max_voices, dtype=np.int64)      # Allocation order, for stealing
+        self._prefetched = np.zeros(max_voices, dtype=np.int64)   # End of the last read-ahead request
+        self._note_counter = 0
+        self._amp[0] = self._target[0] = 1.0
+        self._allocate_scratch(4096)
+
+    def _allocate_scratch(self, frames: int):
+        self._ramp = np.arange(frames, dtype=np.float64)
+        self._read = np.zeros(frames, dtype=np.float64)
+        self._idx = np.zeros(frames, dtype=np.int64)
+        self._frac = np.zeros(frames, dtype=np.float32)
+        self._a = np.zeros(frames, dtype=np.float32)
+        self._b = np.zeros(frames, dtype=np.float32)
+        self._gain = np.zeros(frames, dtype=np.float32)
+        # dtype -> (a, b) gather buffers for integer PCM zones
+        self._raw = {dtype: (np.zeros(frames, dtype=dtype), np.zeros(frames, dtype=dtype))
+                     for dtype in {z.sample.data.dtype for z in self.zones} if dtype != np.float32}
+
+    def add_sample(self, path: str, root: float = 261.63, low: float = 0.0, high: float = float("inf")) -> SampleZone:
+        """Maps a sample through the cache and adds it as a zone; the pad voice starts with the first."""
+        zone = SampleZone(self.cache.acquire(path), root, low, high)
+        self.zones.append(zone)
+        self._allocate_scratch(self._ramp.shape[0])
+        if len(self.zones) == 1:
+            self._active[0] = self._gate[0] = True
+            self.set_frequency(self.frequency)
+        return zone
+
+    def close(self):
+        for zone in self.zones:
+            self.cache.release(zone.sample)
+
+    def _zone_for(self, frequency: float) -> int:
+        inside = [i for i, z in enumerate(self.zones) if z.low <= frequency < z.high]
+        candidates = inside or range(len(self.zones))
+        # Nearest root (in octaves) among the zones covering it, or all zones
+        return min(candidates, key=lambda i: abs(np.log2(frequency / self.zones[i].root)))
+
+    def _start_frame(self, zone: SampleZone) -> float:
+        return float(int(self.position * (zone.sample.frames - 1)))
+
+    def _tune(self, voice: int, frequency: float):
+        zone_index = self._zone_for(max(frequency, 1e-3))
+        zone = self.zones[zone_index]
+        if self._zone[voice] != zone_index:
+            self._zone[voice] = zone_index
+            self._pos[voice] = self._start_frame(zone)
+            self._prefetched[voice] = 0
+        self._rate[voice] = frequency / zone.root * zone.sample.sample_rate / self.sample_rate
+
+    def set_frequency(self, frequency: float):
+        self.frequency = frequency
+        if self.zones:
+            self._tune(0, frequency)
+
+    def set_amplitude(self, amplitude: float):
+        self.amplitude = float(np.clip(amplitude, 0.0, 1.0))
+
+    def set_position(self, position: float):
+        self.position = float(np.clip(position, 0.0, 1.0))
+
+    @property
+    def active_voices(self) -> int:
+        return int(np.count_nonzero(self._active))
+
+    def note_on(self, frequency: float, amplitude: float = 1.0) -> int:
+        """Starts a one-shot voice and returns its index, stealing the oldest voice if none is free."""
+        if not self.zones:
+            raise ValueError("SamplerEngine has no samples loaded")
+        free = np.flatnonzero(~self._active[1:])
+        voice = int(free[0]) + 1 if free.size else int(np.argmin(self._started[1:])) + 1
+        self._note_counter += 1
+        self._started[voice] = self._note_counter
+        self._zone[voice] = -1 # Forces _tune to rewind
+        self._tune(voice, frequency)
+        self._amp[voice] = amplitude
+        self._target[voice] = amplitude
+        self._active[voice] = self._gate[voice] = True
+        return voice
+
+    def note_off(self, voice: int):
+        """Releases a voice; it fades out over the next block and is freed."""
+        if voice == 0:
+            return
+        self._gate[voice] = False
+        self._target[voice] = 0.0
+
+    def all_notes_off(self):
+        self._gate[1:] = False
+        self._target[1:] = 0.0
+
+    def process_into(self, out: np.ndarray) -> None:
+        num_frames = out.shape[0]
+        out.fill(0.0)
+        amp_curve = self.param_curves.get("amplitude")
+        if not self.zones or (amp_curve is None and self.amplitude <= 0.001):
+            return
+        if num_frames > self._ramp.shape[0]:
+            self._allocate_scratch(num_frames)
+
+        ramp = self._ramp[:num_frames]
+        read, idx, frac = self._read[:num_frames], self._idx[:num_frames], self._frac[:num_frames]
+        a, b, gain = self._a[:num_frames], self._b[:num_frames], self._gain[:num_frames]
+        for voice in np.flatnonzero(self._active):
+            zone = self.zones[self._zone[voice]]
+            sample = zone.sample
+            frames, stride = sample.frames, sample.channels
+            loop_start = self._start_frame(zone)
+            looping = voice == 0
+
+            # Playhead per output frame; the pad voice wraps back to the loop start
+            np.multiply(ramp, self._rate[voice], out=read)
+            read += self._pos[voice]
+            end = read[-1] + self._rate[voice]
+            if looping:
+                span = max(1.0, frames - 1 - loop_start)
+                if end >= frames - 1:
+                    read -= loop_start
+                    np.remainder(read, span, out=read)
+                    read += loop_start
+                    end = loop_start + (end - loop_start) % span
+            else:
+                np.minimum(read, frames - 1.0, out=read)
+            np.copyto(idx, read, casting="unsafe")
+            np.subtract(read, idx, out=frac, casting="unsafe")
+
+            # Per-voice gain ramp (note on / off) times the sample scale
+            amp0 = self._amp[voice]
+            np.multiply(ramp, (self._target[voice] - amp0) / num_frames, out=gain, casting="unsafe")
+            gain += amp0
+            gain *= np.float32(sample.scale)
+            if not looping and end >= frames - 1:
+                gain[read >= frames - 1.0] = 0.0 # Past the end of a one-shot
+
+            # Interleaved sample: frame i of channel c is at i * stride + c.
+            # Integer PCM is gathered in its own dtype, then widened.
+            raw = self._raw.get(sample.data.dtype)
+            ra, rb = (a, b) if raw is None else (raw[0][:num_frames], raw[1][:num_frames])
+            idx *= stride
+            for c in range(min(stride, 2)):
+                np.take(sample.data, idx, out=ra, mode="clip")
+                idx += stride
+                np.take(sample.data, idx, out=rb, mode="clip")
+                idx -= stride - 1
+                if raw is not None:
+                    np.copyto(a, ra)
+                    np.copyto(b, rb)
+                b -= a
+                b *= frac
+                a += b
+                a *= gain
+                if stride == 1:
+                    out += a[:, None]
+                else:
+                    out[:, c] += a
+
+            # Advance, retire, and keep the region ahead of the playhead resident
+            self._pos[voice] = end
+            self._amp[voice] = self._target[voice]
+            if (not looping and end >= frames - 1) or (not self._gate[voice] and self._target[voice] == 0.0):
+                self._active[voice] = False
+                continue
+            ahead = int(PREFETCH_SECONDS * sample.sample_rate)
+            if int(end) + ahead // 2 >= self._prefetched[voice] or int(end) < self._prefetched[voice] - 2 * ahead:
+                self.cache.prefetch(sample, int(end), ahead)
+                self._prefetched[voice] = int(end) + ahead
+
+        if amp_curve is None:
+            out *= self.amplitude
+        else:
+            out *= amp_curve[:num_frames, None]
@@ -0,0 +1,266 @@
+"""
+Memory-mapped samples and the process-wide sample cache.
+
+WAV (PCM 16 / 32-bit, float 32-bit) and raw PCM files are mapped read-only
+and exposed as interleaved numpy views over the mapping: nothing is read until
+a page is touched, and every engine using a sample shares the same pages.
+24-bit WAVs cannot be viewed in place and are decoded to float32 once.
+
+`SampleCache` hands out samples by path with reference counting. Released
+samples stay cached until the byte budget is exceeded, then the least
+recently used ones are dropped (their pages go when the last view does).
+`prefetch()` may be called from the audio thread: it only appends to a deque
+that a background thread drains, asking the kernel to read the region ahead
+(madvise WILLNEED, or touching one byte per page).
+"""
+
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+RAW_SUFFIXES = (".raw", ".pcm")
+# WAVE_FORMAT_PCM / WAVE_FORMAT_IEEE_FLOAT; EXTENSIBLE carries one of these in its subformat
+_PCM, _FLOAT, _EXTENSIBLE = 1, 3, 0xFFFE
+
+
+@dataclass(eq=False)
+class Sample:
+    path: str
+    sample_rate: int
+    channels: int
+    frames: int
+    data: np.ndarray        # [frames * channels] interleaved, file dtype, read-only
+    scale: float            # data * scale is -1..1
+    spec: Tuple[Any, ...]   # How it was opened (raw format), to reopen it elsewhere
+    offset: int = 0         # Byte offset of the sample data in the file
+    _mmap: Optional[mmap.mmap] = field(default=None, repr=False)
+
+    @property
+    def nbytes(self) -> int:
+        return self.data.nbytes
+
+    @property
+    def mapped(self) -> bool:
+        return self._mmap is not None
+
+    @property
+    def duration(self) -> float:
+        return self.frames / self.sample_rate
+
+    def frame_view(self) -> np.ndarray:
+        """[frames, channels] view of the data (no copy)."""
+        return self.data.reshape(self.frames, self.channels)
+
+    def to_float(self, start: int = 0, end: Optional[int] = None) -> np.ndarray:
+        """A float32 [frames, channels] copy of frames [start, end)."""
+        return self.frame_view()[start:end].astype(np.float32) * np.float32(self.scale)
+
+    def advise(self, start: int, frames: int):
+        """Asks the kernel to read frames [start, start + frames) ahead (background thread)."""
+        if self._mmap is None:
+            return
+        frame_bytes = self.channels * self.data.itemsize
+        begin = self.offset + max(0, start) * frame_bytes
+        end = min(self.offset + self.nbytes, self.offset + (start + frames) * frame_bytes)
+        begin -= begin % mmap.PAGESIZE
+        if end <= begin:
+            return
+        if hasattr(self._mmap, "madvise") and hasattr(mmap, "MADV_WILLNEED"):
+            self._mmap.madvise(mmap.MADV_WILLNEED, begin, end - begin)
+        else:
+            np.frombuffer(self._mmap, dtype=np.uint8)[begin:end:mmap.PAGESIZE].sum()
+
+    def __reduce__(self):
+        # Worker processes map the file themselves instead of pickling its contents
+        return _reopen, (self.path, self.spec)
+
+
+def _reopen(path: str, spec: Tuple[Any, ...]) -> Sample:
+    return sample_cache.acquire(path, *spec)
+
+
+def _wav_layout(mm: mmap.mmap, path: str) -> Tuple[int, int, int, int, int, int]:
+    """(format, channels, sample_rate, bits, data_offset, data_bytes) of a RIFF/WAVE file."""
+    if len(mm) < 12 or mm[:4] != b"RIFF" or mm[8:12] != b"WAVE":
+        raise ValueError(f"{path}: not a RIFF/WAVE file")
+    fmt = None
+    pos = 12
+    while pos + 8 <= len(mm):
+        chunk, size = struct.unpack_from("<4sI", mm, pos)
+        body = pos + 8
+        if chunk == b"fmt ":
+            tag, channels, rate, _, _, bits = struct.unpack_from("<HHIIHH", mm, body)
+            if tag == _EXTENSIBLE and size >= 40:
+                tag = struct.unpack_from("<H", mm, body + 24)[0]
+            fmt = (tag, channels, rate, bits)
+        elif chunk == b"data":
+            if fmt is None:
+                raise ValueError(f"{path}: data chunk before fmt chunk")
+            return (*fmt, body, min(size, len(mm) - body))
+        pos = body + size + (size & 1)
+    raise ValueError(f"{path}: no fmt/data chunk")
+
+
+def open_sample(path: str, dtype: str = "int16", channels: int = 1, sample_rate: int = 48000) -> Sample:
+    """
+    Maps a WAV file, or a headerless .raw / .pcm file of the given `dtype`,
+    `channels` and `sample_rate` (ignored for WAVs).
+    """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            raise ValueError(f"{path}: empty file")
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    spec: Tuple[Any, ...] = ()
+    if path.lower().endswith(RAW_SUFFIXES):
+        offset, size = 0, len(mm)
+        dt = np.dtype(dtype).newbyteorder("<")
+        spec = (dtype, channels, sample_rate)
+    else:
+        tag, channels, sample_rate, bits, offset, size = _wav_layout(mm, path)
+        if tag == _FLOAT and bits == 32:
+            dt = np.dtype("<f4")
+        elif tag == _PCM and bits in (16, 32):
+            dt = np.dtype(f"<i{bits // 8}")
+        elif tag == _PCM and bits == 24:
+            # No numpy dtype for packed 24-bit: decode once (sign-extend into the top bytes)
+            count = size // 3
+            packed = np.frombuffer(mm, dtype=np.uint8, count=count * 3, offset=offset).reshape(-1, 3)
+            wide = np.zeros((count, 4), dtype=np.uint8)
+            wide[:, 1:] = packed
+            data = wide.view("<i4").reshape(-1).astype(np.float32) * np.float32(1.0 / 2 ** 31)
+            data.setflags(write=False)
+            del packed
+            mm.close()
+            return Sample(path, sample_rate, channels, count // channels, data[:count - count % channels], 1.0, spec)
+        else:
+            mm.close()
+            raise ValueError(f"{path}: unsupported WAV format {tag} / {bits}-bit")
+    if dt.kind not in "if" or channels < 1:
+        mm.close()
+        raise ValueError(f"{path}: unsupported sample layout {dt} x {channels}")
+    frames = size // (dt.itemsize * channels)
+    if frames == 0:
+        mm.close()
+        raise ValueError(f"{path}: no sample frames")
+    data = np.frombuffer(mm, dtype=dt, count=frames * channels, offset=offset)
+    scale = 1.0 if dt.kind == "f" else 1.0 / float(2 ** (8 * dt.itemsize - 1))
+    return Sample(path, sample_rate, channels, frames, data, scale, spec, offset, mm)
+
+
+@dataclass(eq=False)
+class _Entry:
+    sample: Sample
+    refs: int = 0
+
+
+class SampleCache:
+    def __init__(self, budget: int = 512 << 20, root: str = "samples", prefetch_interval: float = 0.005):
+        self.budget = budget # Bytes of cached sample data kept once released
+        self.root = root     # Directory that control-plane sample names resolve under
+        self.prefetch_interval = prefetch_interval
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict() # LRU order, most recent last
+        self._lock = threading.Lock()
+        self._pending: deque = deque(maxlen=1024) # (sample, start, frames); appended by the audio thread
+        self._thread: Optional[threading.Thread] = None
+        self.bytes = 0
+        self.hits = self.misses = self.evictions = self.prefetches = 0
+
+    def resolve(self, name: str) -> str:
+        """Path of a sample named by a client; must stay under `root`."""
+        root = os.path.realpath(self.root)
+        path = os.path.realpath(os.path.join(root, name))
+        if os.path.commonpath([root, path]) != root:
+            raise ValueError(f"Sample path escapes the sample directory: {name}")
+        return path
+
+    def acquire(self, path: str, *spec) -> Sample:
+        """Returns the cached sample for `path` (mapping it on a miss) and takes a reference."""
+        key = os.path.realpath(path)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                entry.refs += 1
+                return entry.sample
+        sample = open_sample(key, *spec) # Outside the lock: parsing may touch the disk
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                entry = self._entries[key] = _Entry(sample)
+                self.bytes += sample.nbytes
+            self._entries.move_to_end(key)
+            entry.refs += 1
+            self._evict()
+            self._start_prefetcher()
+        self.prefetch(entry.sample, 0, entry.sample.sample_rate) # First second, for note onsets
+        return entry.sample
+
+    def release(self, sample: Sample):
+        with self._lock:
+            entry = self._entries.get(os.path.realpath(sample.path))
+            if entry is None or entry.sample is not sample or entry.refs == 0:
+                return
+            entry.refs -= 1
+            self._evict()
+
+    def _evict(self):
+        # Oldest unreferenced entries first; referenced ones may keep the cache over budget
+        for key in [k for k, e in self._entries.items() if e.refs == 0]:
+            if self.bytes <= self.budget:
+                break
+            self.bytes -= self._entries.pop(key).sample.nbytes
+            self.evictions += 1
+
+    def prefetch(self, sample: Sample, start: int, frames: int):
+        """Queues a read-ahead of frames [start, start + frames); safe on the audio thread."""
+        self._pending.append((sample, start, frames))
+
+    def _start_prefetcher(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._prefetch_loop, name="anima-sample-prefetch", daemon=True)
+            self._thread.start()
+
+    def _prefetch_loop(self):
+        pending = self._pending
+        while True:
+            while pending:
+                sample, start, frames = pending.popleft()
+                try:
+                    sample.advise(start, frames)
+                    self.prefetches += 1
+                except (OSError, ValueError) as e:
+                    logger.debug(f"Prefetch of {sample.path} failed: {e}")
+            time.sleep(self.prefetch_interval)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = [
+                {"path": key, "bytes": e.sample.nbytes, "refs": e.refs, "mapped": e.sample.mapped,
+                 "channels": e.sample.channels, "sample_rate": e.sample.sample_rate,
+                 "duration": e.sample.duration}
+                for key, e in self._entries.items()
+            ]
+            return {
+                "budget": self.budget, "bytes": self.bytes, "entries": entries,
+                "hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "prefetches": self.prefetches, "prefetch_pending": len(self._pending),
+            }
+
+
+# One cache per process (like the wavetable cache); part workers build their own
+sample_cache = SampleCache(
+    budget=int(os.environ.get("ANIMA_SAMPLE_CACHE_MB", "512")) << 20,
+    root=os.environ.get("ANIMA_SAMPLES", "samples"),
+)
@@ -0,0 +1,140 @@
+"""
+Precompiled preset snapshots.
+
+A preset's `engines` section is free-form JSON keyed by part ("C": {...}) or by
+engine type ("granular": {...}, every part running that engine). Walking and
+validating it happens once, when the preset is saved: `compile_preset()`
+flattens it into parallel (part, param, value) arrays holding only parameters
+the parts accept, and compiles the preset's mappings into a ModulationMatrix.
+
+Applying a snapshot is one reference assignment (`EngineManager.load_snapshot`);
+the audio thread picks it up at the next block and writes the values.
+`SnapshotMorph` blends two snapshots from a single morph value the same way.
+"""
+
+from dataclasses import dataclass
+from typing import Any, Dict, List, Mapping, Sequence, Tuple
+
+import numpy as np
+
+from .modulation import PARAM_RANGES, ModulationMatrix, compile_mappings, engine_type
+from .part import AudioPart
+
+
+@dataclass(frozen=True)
+class PresetSnapshot:
+    preset_id: str
+    part_ids: Tuple[str, ...]               # [N]
+    params: Tuple[str, ...]                 # [N]
+    values: np.ndarray                      # [N] float64, read-only
+    mappings: Dict[str, Any]
+    modulation: ModulationMatrix
+    skipped: Tuple[Dict[str, str], ...]     # Entries that are not settable parameters
+    layout: int                             # EngineManager.layout_version compiled against
+
+    def entries(self) -> List[List[Any]]:
+        return [[p, n, float(v)] for p, n, v in zip(self.part_ids, self.params, self.values)]
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "preset_id": self.preset_id,
+            "params": self.entries(),
+            "skipped": list(self.skipped),
+            "modulation": self.modulation.describe(),
+        }
+
+
+def compile_preset(preset_id: str, engines: Mapping[str, Any], mappings: Mapping[str, Any],
+                   parts: Mapping[str, AudioPart], sources: Sequence[str], layout: int = 0) -> PresetSnapshot:
+    values: Dict[Tuple[str, str], float] = {}
+    skipped = []
+    for scope, settings in engines.items():
+        if scope.upper() in parts:
+            matched = [parts[scope.upper()]]
+        else:
+            matched = [part for part in parts.values() if engine_type(part) == scope.lower()]
+        if not matched:
+            skipped.append({"key": scope, "reason": "no matching part"})
+            continue
+        if not isinstance(settings, Mapping):
+            skipped.append({"key": scope, "reason": "expected an object of parameters"})
+            continue
+        for name, value in settings.items():
+            key = f"{scope}.{name}"
+            if name == "enabled" and isinstance(value, bool):
+                name, value = "mute", not value
+            if isinstance(value, bool):
+                value = float(value)
+            if not isinstance(value, (int, float)) or not np.isfinite(value):
+                skipped.append({"key": key, "reason": "not a numeric parameter"})
+                continue
+            targets = [part for part in matched if part.has_param(name)]
+            if not targets:
+                skipped.append({"key": key, "reason": "no part has this parameter"})
+                continue
+            for part in targets:
+                values[(part.part_id, name)] = float(value)
+
+    array = np.array(list(values.values()), dtype=np.float64)
+    array.setflags(write=False)
+    return PresetSnapshot(
+        preset_id=preset_id,
+        part_ids=tuple(p for p, _ in values),
+        params=tuple(n for _, n in values),
+        values=array,
+        mappings=dict(mappings),
+        modulation=compile_mappings(mappings, parts, sources),
+        skipped=tuple(skipped),
+        layout=layout,
+    )
+
+
+class SnapshotMorph:
+    """
+    Interpolation between two compiled snapshots driven by one morph value.
+
+    The union of both parameter sets is laid out once as arrays; a parameter
+    present in only one snapshot holds that value throughout. Log-ranged
+    parameters (frequencies, density, ...) interpolate geometrically.
+    """
+
+    def __init__(self, a: PresetSnapshot, b: PresetSnapshot):
+        self.a, self.b = a, b
+        start = dict(zip(zip(a.part_ids, a.params), a.values))
+        end = dict(zip(zip(b.part_ids, b.params), b.values))
+        self.targets = list(dict.fromkeys([*start, *end]))
+        lo = np.array([start.get(key, end.get(key)) for key in self.targets], dtype=np.float64)
+        hi = np.array([end.get(key, start.get(key)) for key in self.targets], dtype=np.float64)
+        log = np.array([PARAM_RANGES.get(param, (0, 0, "linear"))[2] == "log" for _, param in self.targets], dtype=bool)
+        self._log = log & (lo > 0.0) & (hi > 0.0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            self._base = np.where(self._log, np.log(np.where(self._log, lo, 1.0)), lo)
+            self._span = np.where(self._log, np.log(np.where(self._log, hi, 1.0)), hi) - self._base
+        self.reset()
+
+    def reset(self):
+        self.values = np.full(len(self.targets), np.nan)
+        self._position = None
+
+    def evaluate(self, position: float) -> np.ndarray:
+        x = self._base + self._span * min(1.0, max(0.0, position))
+        x[self._log] = np.exp(x[self._log])
+        return x
+
+    def changes(self, position: float) -> Sequence[Tuple[str, str, float]]:
+        """(part_id, param, value) that moved since the last call; empty if `position` is unchanged."""
+        if position == self._position:
+            return ()
+        self._position = position
+        out = self.evaluate(position)
+        moved = np.flatnonzero(out != self.values)
+        self.values[moved] = out[moved]
+        return [(*self.targets[d], float(out[d])) for d in moved]
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "from": self.a.preset_id,
+            "to": self.b.preset_id,
+            "position": self._position,
+            "targets": [f"{part_id}.{param}" for part_id, param in self.targets],
+        }
@@ -2,18 +2,63 @@ import numpy as np
 from .base import AudioEngine
 
 class SpectralEngine(AudioEngine):
-    def __init__(self, sample_rate=48000):
+    """
+    Streaming STFT resonator: noise is analysed frame by frame, shaped by a
+    Gaussian band mask around center_freq, and resynthesised with windowed
+    overlap-add. FFT size and hop are independent of the device block size;
+    hops are produced into an output ring buffer until a block can be served.
+
+    Spectral modes operate on stored magnitude frames:
+      - freeze: hold the magnitude frame captured when freeze was enabled,
+                resynthesised with fresh random phases every hop.
+      - blur:   exponential average of magnitudes across frames (0 = off).
+    """
+    curve_params = ("amplitude",)
+    params = ("frequency", "amplitude", "center_freq", "bandwidth", "freeze", "blur")
+
+    def __init__(self, sample_rate=48000, fft_size: int = 4096, hop_size: int = 1024):
         super().__init__(sample_rate)
-        self.phase = 0.0
         self.center_freq = 440.0
         self.bandwidth = 100.0
-        
-        # State for a simple IIR Bandpass filter
-        # y[n] = b0*x[n] - a1*y[n-1] - a2*y[n-2] ...
-        # Simplified Resonator
-        self.v1 = 0.0
-        self.v2 = 0.0
-        
+        self.amplitude = 0.9 # Matches the default bandwidth mapping in set_amplitude
+        self.freeze = False
+        self.blur = 0.0
+
+        self._rng = np.random.default_rng()
+        self._mask = None
+        self._mask_key = None
+        self.set_fft_size(fft_size, hop_size)
+
+    def set_fft_size(self, fft_size: int, hop_size: int):
+        """Rebuilds the frequency grid, window and streaming buffers (resets the stream)."""
+        if hop_size <= 0 or fft_size % hop_size:
+            raise ValueError("hop_size must divide fft_size")
+        self.fft_size = fft_size
+        self.hop_size = hop_size
+        bins = fft_size // 2 + 1
+
+        # Cached per FFT size
+        self._freqs = np.fft.rfftfreq(fft_size, 1/self.sample_rate)
+        self._window = (0.5 - 0.5 * np.cos(2.0 * np.pi * np.arange(fft_size) / fft_size))
+        # Hann analysis + synthesis: normalise by the overlapped sum of window^2
+        self._synthesis = self._window / (np.sum(self._window ** 2) / hop_size)
+        self._mask_key = None
+
+        # Streaming state
+        self._input = np.zeros(fft_size, dtype=np.float64)   # Sliding analysis input
+        self._frame = np.zeros(fft_size, dtype=np.float64)   # Windowed frame scratch
+        self._ola = np.zeros(fft_size, dtype=np.float64)     # Overlap-add accumulator
+        self._phase = np.zeros(bins, dtype=np.float64)
+        self._last_mag = np.zeros(bins, dtype=np.float64)
+        self._blur_mag = np.zeros(bins, dtype=np.float64)
+        self._frozen_mag = None
+        self._allocate_ring(fft_size + 4096)
+
+    def _allocate_ring(self, capacity: int):
+        self._ring = np.zeros(capacity, dtype=np.float32)
+        self._ring_read = 0
+        self._ring_count = 0
+
     def set_frequency(self, freq: float):
         self.center_freq = freq
 
@@ -22,46 +67,96 @@ class SpectralEngine(AudioEngine):
         # Map amplitude to "Q" or bandwidth (brighter/sharper when loud)
         self.bandwidth = 50.0 + (1.0 - amp) * 500.0
 
-    def process(self, num_frames: int) -> np.ndarray:
-        # Generate White Noise
-        noise = np.random.normal(0, 0.2, num_frames)
-        
-        # Apply Resonant Filter (State Variable or similar) around center_freq
-        # To simulate "Spectral" freezing/focus
-        
-        # Simple Chamberlin State Variable Filter for resonance
-        # f = 2 * sin(pi * freq / rate)
-        # q = 1 / Q
-        
-        f = 2.0 * np.sin(np.pi * self.center_freq / self.sample_rate)
-        q = self.bandwidth / self.center_freq # Crude approximation
-        
-        # Stability limit
-        f = min(f, 0.9)
-        
-        output = np.zeros(num_frames, dtype=np.float32)
-        
-        # Sample-by-sample processing typically required for IIR, 
-        # but numba/scipy is better. For pure numpy, we can only approximate 
-        # or use very slow python loop. 
-        # Let's do a trick: Overlap-Add with FFT is the *real* spectral way.
-        
-        # --- FFT Based Spectral Processing (Simplified) ---
-        # 1. Generate Noise
-        # 2. FFT
-        # 3. Apply brickwall bandpass mask
-        # 4. IFFT
-        
-        # For block size ~1024 this is fast enough in Python
-        
-        spectrum = np.fft.rfft(noise)
-        freqs = np.fft.rfftfreq(num_frames, 1/self.sample_rate)
-        
-        # Create Spectral Mask
-        # Gaussian centered at center_freq
-        mask = np.exp(-0.5 * ((freqs - self.center_freq) / (self.bandwidth + 1.0))**2)
-        
-        filtered_spectrum = spectrum * mask
-        filtered_audio = np.fft.irfft(filtered_spectrum, n=num_frames)
-        
-        return (filtered_audio * self.amplitude * 10.0).astype(np.float32) # Boost gain
+    def set_freeze(self, freeze: bool):
+        self.freeze = bool(freeze)
+        # Capture the most recent magnitude frame; released when freeze turns off
+        self._frozen_mag = self._last_mag.copy() if self.freeze else None
+
+    def set_blur(self, blur: float):
+        self.blur = float(np.clip(blur, 0.0, 0.999))
+
+    def _spectral_mask(self) -> np.ndarray:
+        key = (self.center_freq, self.bandwidth)
+        if key != self._mask_key:
+            # Gaussian centered at center_freq
+            self._mask = np.exp(-0.5 * ((self._freqs - self.center_freq) / (self.bandwidth + 1.0))**2)
+            self._mask_key = key
+        return self._mask
+
+    def _next_hop(self):
+        """Analyse one frame, shape it, and overlap-add one hop into the output ring."""
+        fft_size, hop = self.fft_size, self.hop_size
+
+        # Slide the analysis input by one hop of fresh noise
+        self._input[:-hop] = self._input[hop:]
+        tail = self._input[-hop:]
+        self._rng.standard_normal(out=tail)
+        tail *= 0.2
+
+        np.multiply(self._input, self._window, out=self._frame)
+        spectrum = np.fft.rfft(self._frame)
+        np.abs(spectrum, out=self._last_mag)
+
+        if self.freeze and self._frozen_mag is not None:
+            # Held magnitudes with fresh phases
+            self._rng.random(out=self._phase)
+            self._phase *= 2.0 * np.pi
+            spectrum = self._frozen_mag * np.exp(1j * self._phase)
+        elif self.blur > 0.0:
+            # Smear magnitudes over time, keep the current phases
+            self._blur_mag *= self.blur
+            self._blur_mag += (1.0 - self.blur) * self._last_mag
+            np.divide(spectrum, np.maximum(self._last_mag, 1e-12), out=spectrum)
+            spectrum *= self._blur_mag
+        else:
+            self._blur_mag[:] = self._last_mag
+
+        spectrum *= self._spectral_mask()
+        frame = np.fft.irfft(spectrum, n=fft_size)
+        frame *= self._synthesis
+        self._ola += frame
+
+        # Emit the finished hop and advance the accumulator
+        self._ring_write(self._ola[:hop])
+        self._ola[:-hop] = self._ola[hop:]
+        self._ola[-hop:] = 0.0
+
+    def _ring_write(self, data: np.ndarray):
+        cap = self._ring.shape[0]
+        n = data.shape[0]
+        start = (self._ring_read + self._ring_count) % cap
+        first = min(n, cap - start)
+        self._ring[start:start + first] = data[:first]
+        if first < n:
+            self._ring[:n - first] = data[first:]
+        self._ring_count += n
+
+    def _ring_read_into(self, out: np.ndarray, gain: float):
+        cap = self._ring.shape[0]
+        n = out.shape[0]
+        start = self._ring_read
+        first = min(n, cap - start)
+        np.multiply(self._ring[start:start + first], gain, out=out[:first])
+        if first < n:
+            np.multiply(self._ring[:n - first], gain, out=out[first:])
+        self._ring_read = (start + n) % cap
+        self._ring_count -= n
+
+    def process_into(self, out: np.ndarray) -> None:
+        num_frames = out.shape[0]
+        if num_frames + self.hop_size > self._ring.shape[0]:
+            # Keep buffered samples while growing the ring for a larger block
+            pending = np.zeros(self._ring_count, dtype=np.float32)
+            self._ring_read_into(pending, 1.0)
+            self._allocate_ring(num_frames + self.fft_size)
+            self._ring_write(pending)
+
+        while self._ring_count < num_frames:
+            self._next_hop()
+
+        amp_curve = self.param_curves.get("amplitude")
+        if amp_curve is None:
+            self._ring_read_into(out, self.amplitude * 10.0) # Boost gain
+        else:
+            self._ring_read_into(out, 10.0)
+            out *= amp_curve[:num_frames]
@@ -0,0 +1,288 @@
+"""
+Link Protocol capture log and replay.
+
+A capture is a memory-mapped append-only file:
+
+    header   16 bytes   <8sd: magic, wall-clock start time (time.time())
+    records             <dI: receive time (s since start), frame length,
+                        then the raw frame (sync ... crc) as it came off the link
+
+The file grows in `grow`-sized steps and is truncated to its used length on
+close; after a crash the zero-filled tail reads as the end of the capture.
+An existing capture is never overwritten: a writer given a path that is
+taken records to `<name>-<YYYYmmdd-HHMMSS>[-N].<ext>` next to it instead.
+A sparse time index (`<path>.idx`, <dQ: time, offset, one entry per
+`index_interval` seconds) makes seeking O(log n) plus a short scan; a missing
+index is rebuilt by scanning.
+
+Recording: pass a CaptureWriter to LinkIngest (ANIMA_LINK_CAPTURE=path).
+Replay: ANIMA_LINK_SOURCE=capture://path?speed=2&start=60 feeds the frames
+back through LinkIngest at 1x, Nx or as fast as possible (speed=0), and
+`python -m anima_locus.audio_io.offline --capture path` replays one against
+an offline render, in audio time.
+
+    python -m anima_locus.fusion.capture info session.bin
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import mmap
+import os
+import struct
+import time
+from typing import Callable, Iterator, Optional, Tuple
+
+import numpy as np
+
+from ..link import HEADER, SYNC, LinkFrame
+
+MAGIC = b"ANLCAP01"
+FILE_HEADER = struct.Struct("<8sd")
+RECORD = struct.Struct("<dI")
+INDEX_DTYPE = np.dtype([("time", "<f8"), ("offset", "<u8")])
+
+logger = logging.getLogger(__name__)
+
+
+def _create(path: str, start_time: float):
+    """Exclusively creates the capture and its index, rotating to a timestamped name if `path` is taken."""
+    root, ext = os.path.splitext(path)
+    stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(start_time))
+    candidates = [path, f"{root}-{stamp}{ext}"] + [f"{root}-{stamp}-{n}{ext}" for n in range(1, 100)]
+    for candidate in candidates:
+        if os.path.exists(f"{candidate}.idx"):
+            continue
+        try:
+            f = open(candidate, "x+b")
+        except FileExistsError:
+            continue
+        try:
+            index = open(f"{candidate}.idx", "xb")
+        except FileExistsError:
+            f.close()
+            os.remove(candidate)
+            continue
+        if candidate != path:
+            logger.warning(f"Capture {path} exists; recording to {candidate}")
+        return candidate, f, index
+    raise FileExistsError(f"No free capture name next to {path}")
+
+
+class CaptureWriter:
+    def __init__(self, path: str, index_interval: float = 1.0, grow: int = 16 << 20):
+        self.index_interval = index_interval
+        self.grow = grow
+        self.start_time = time.time()
+        self._clock_start = time.monotonic()
+        self._next_index = 0.0
+        self.records = 0
+
+        # self.path is where the capture actually goes (see _create)
+        self.path, self._file, self._index = _create(path, self.start_time)
+        self._file.truncate(grow)
+        self._mm = mmap.mmap(self._file.fileno(), grow)
+        FILE_HEADER.pack_into(self._mm, 0, MAGIC, self.start_time)
+        self._pos = FILE_HEADER.size
+
+    def append(self, frame: bytes, t: Optional[float] = None):
+        """Appends one raw frame received `t` seconds into the capture (default: now)."""
+        if t is None:
+            t = time.monotonic() - self._clock_start
+        end = self._pos + RECORD.size + len(frame)
+        if end > len(self._mm):
+            self._remap(max(end, len(self._mm) + self.grow))
+        if t >= self._next_index:
+            self._index.write(struct.pack("<dQ", t, self._pos))
+            self._next_index = t + self.index_interval
+        RECORD.pack_into(self._mm, self._pos, t, len(frame))
+        self._mm[self._pos + RECORD.size:end] = frame
+        self._pos = end
+        self.records += 1
+
+    def _remap(self, size: int):
+        self._mm.flush()
+        self._mm.close()
+        self._file.truncate(size)
+        self._mm = mmap.mmap(self._file.fileno(), size)
+
+    @property
+    def size(self) -> int:
+        return self._pos
+
+    def flush(self):
+        self._mm.flush()
+        self._index.flush()
+
+    def close(self):
+        if self._file.closed:
+            return
+        self._mm.flush()
+        self._mm.close()
+        self._file.truncate(self._pos)
+        self._file.close()
+        self._index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class CaptureReader:
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.start_time = FILE_HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a link capture")
+        if os.path.exists(f"{path}.idx"):
+            self.index = np.fromfile(f"{path}.idx", dtype=INDEX_DTYPE)
+        else:
+            self.index = self._build_index()
+
+    def _scan(self, offset: int = FILE_HEADER.size) -> Iterator[Tuple[int, float, int]]:
+        """(offset, time, frame length) of each record from `offset` to the end."""
+        mm, size, unpack = self._mm, len(self._mm), RECORD.unpack_from
+        while offset + RECORD.size <= size:
+            t, length = unpack(mm, offset)
+            if length == 0 or offset + RECORD.size + length > size:
+                return # Zero-filled tail of an unclosed capture
+            yield offset, t, length
+            offset += RECORD.size + length
+
+    def _build_index(self, interval: float = 1.0) -> np.ndarray:
+        entries, next_time = [], 0.0
+        for offset, t, _ in self._scan():
+            if t >= next_time:
+                entries.append((t, offset))
+                next_time = t + interval
+        return np.array(entries, dtype=INDEX_DTYPE)
+
+    @property
+    def duration(self) -> float:
+        """Time of the last record (scans from the last index entry)."""
+        start = int(self.index["offset"][-1]) if len(self.index) else FILE_HEADER.size
+        last = 0.0
+        for _, t, _ in self._scan(start):
+            last = t
+        return last
+
+    def offset_at(self, t: float) -> int:
+        """Offset of the first record received at or after `t`."""
+        i = int(np.searchsorted(self.index["time"], t, side="right")) - 1
+        start = int(self.index["offset"][i]) if i >= 0 else FILE_HEADER.size
+        for offset, rt, _ in self._scan(start):
+            if rt >= t:
+                return offset
+        return len(self._mm)
+
+    def records(self, start: float = 0.0, end: Optional[float] = None) -> Iterator[Tuple[float, bytes]]:
+        """(time, raw frame) for every record in [start, end)."""
+        mm = self._mm
+        for offset, t, length in self._scan(self.offset_at(start)):
+            if end is not None and t >= end:
+                return
+            yield t, mm[offset + RECORD.size:offset + RECORD.size + length]
+
+    def frames(self, start: float = 0.0, end: Optional[float] = None) -> Iterator[Tuple[float, LinkFrame]]:
+        """Decoded frames (CRCs were checked when they were captured)."""
+        body = len(SYNC) + HEADER.size
+        for t, raw in self.records(start, end):
+            frame_type, seq, length, ts = HEADER.unpack_from(raw, len(SYNC))
+            yield t, LinkFrame(frame_type, seq, ts, raw[body:body + length])
+
+    def chunks(self, start: float = 0.0, end: Optional[float] = None, batch: float = 0.005) -> Iterator[Tuple[float, bytes]]:
+        """
+        Records grouped into reads the way they arrived: frames received within
+        `batch` seconds of each other form one chunk. Yields (time, bytes).
+        """
+        parts, first = [], None
+        for t, raw in self.records(start, end):
+            if first is not None and t - first > batch:
+                yield first, b"".join(parts)
+                parts = []
+                first = None
+            if first is None:
+                first = t
+            parts.append(raw)
+        if parts:
+            yield first, b"".join(parts)
+
+    async def replay(self, handle: Callable[[bytes], None], speed: float = 1.0, start: float = 0.0,
+                     end: Optional[float] = None, batch: float = 0.005):
+        """Feeds chunks to `handle` at `speed` times the recorded rate (0 = as fast as possible)."""
+        loop = asyncio.get_running_loop()
+        t0 = loop.time()
+        for i, (t, chunk) in enumerate(self.chunks(start, end, batch)):
+            if speed > 0:
+                delay = t0 + (t - start) / speed - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            elif i % 64 == 0:
+                await asyncio.sleep(0) # Let the rest of the loop run
+            handle(chunk)
+
+    def cursor(self, handle: Callable[[bytes], None], start: float = 0.0,
+               batch: float = 0.005) -> Callable[[float], int]:
+        """
+        Returns feed(t): hands `handle` every chunk due `t` seconds after `start`
+        and returns how many it fed. Drives replay from an external clock, e.g.
+        the stream time of an offline render.
+        """
+        chunks = self.chunks(start, batch=batch)
+        pending = next(chunks, None)
+
+        def feed(t: float) -> int:
+            nonlocal pending
+            fed = 0
+            while pending is not None and pending[0] - start <= t:
+                handle(pending[1])
+                fed += 1
+                pending = next(chunks, None)
+            return fed
+        return feed
+
+    def info(self) -> dict:
+        records = sum(1 for _ in self._scan())
+        return {
+            "path": self.path,
+            "start_time": self.start_time,
+            "duration_s": round(self.duration, 3),
+            "records": records,
+            "bytes": len(self._mm),
+            "index_entries": len(self.index),
+        }
+
+    def close(self):
+        self._mm.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect Link Protocol captures")
+    parser.add_argument("command", choices=["info", "dump"])
+    parser.add_argument("path")
+    parser.add_argument("--start", type=float, default=0.0, help="Seconds into the capture (dump)")
+    parser.add_argument("--end", type=float, help="Stop at this time (dump)")
+    args = parser.parse_args()
+
+    with CaptureReader(args.path) as reader:
+        if args.command == "info":
+            print(json.dumps(reader.info(), indent=2))
+            return
+        for t, frame in reader.frames(args.start, args.end):
+            print("%10.3f type=0x%02x seq=%d ts=%d payload=%s" % (t, frame.type, frame.seq, frame.ts, frame.payload.hex()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Elemental bus: the latest Earth / Air / Water / Fire values, all in 0..1
+(the range UI clients are validated against; MCU ingestion rescales its
+signed values to it).
+
+Writers (MCU ingestion and UI `set_element` messages, all on the event loop)
+build a new immutable `ElementSnapshot` and publish it with a single reference
+assignment. Readers, including the audio thread, take `bus.snapshot` once and
+use it for the whole block: no locks, and a reader never sees a half-applied
+update.
+"""
+
+import time
+from dataclasses import dataclass
+from typing import Dict, Mapping, Sequence, Tuple, Union
+
+import numpy as np
+
+ELEMENTS = ("earth", "air", "water", "fire")
+
+
+@dataclass(frozen=True)
+class ElementSnapshot:
+    seq: int                  # Bumped on every publish
+    values: np.ndarray        # [4] float32, read-only, ELEMENTS order
+    sources: Tuple[str, ...]  # Who last set each element ("mcu", "ui", ...)
+    updated: float            # time.monotonic() of the publish
+
+    def as_dict(self) -> Dict[str, float]:
+        return {name: float(v) for name, v in zip(ELEMENTS, self.values)}
+
+
+def _frozen(values) -> np.ndarray:
+    array = np.array(values, dtype=np.float32)
+    array.setflags(write=False)
+    return array
+
+
+class ElementBus:
+    """Single-writer, many-reader element values published by reference swap."""
+
+    def __init__(self):
+        self.snapshot = ElementSnapshot(0, _frozen(np.zeros(len(ELEMENTS))), ("init",) * len(ELEMENTS), time.monotonic())
+
+    def publish(self, values: Union[Mapping[str, float], Sequence[float]], source: str) -> ElementSnapshot:
+        """
+        Publishes new values: a mapping updates only the named elements, a
+        sequence of four updates all of them. Returns the new snapshot.
+        """
+        current = self.snapshot
+        merged = current.values.copy()
+        sources = list(current.sources)
+        if isinstance(values, Mapping):
+            for name, value in values.items():
+                i = ELEMENTS.index(name)
+                merged[i] = value
+                sources[i] = source
+        else:
+            if len(values) != len(ELEMENTS):
+                raise ValueError(f"Expected {len(ELEMENTS)} element values, got {len(values)}")
+            merged[:] = values
+            sources = [source] * len(ELEMENTS)
+        snapshot = ElementSnapshot(current.seq + 1, _frozen(merged), tuple(sources), time.monotonic())
+        # Publish: one reference assignment
+        self.snapshot = snapshot
+        return snapshot
@@ -0,0 +1,254 @@
+"""
+Vectorized sensor-fusion filter bank.
+
+`FusionPipeline` holds every sensor channel as one NumPy vector and runs each
+batch of frames (one read from the link) through three stages:
+
+  1. outliers  - reject samples further than `outlier_k` robust deviations
+                 from the last accepted sample; a run of `max_rejects` rejections
+                 is accepted as a real step.
+  2. smooth    - "one_euro" (adaptive cutoff, low lag on fast moves),
+                 "ema" (time-constant low-pass) or "kalman" (constant-position
+                 Kalman with process noise growing with dt).
+  3. resample  - linear interpolation of the filtered trajectory onto a
+                 uniform grid at the audio block rate.
+
+The EMA and Kalman smoothers are time-varying one-pole filters,
+y[i] = y[i-1] + a[i] * (x[i] - y[i-1]), which `_one_pole` solves for a whole
+batch at once: y[i] = P[i] * (y[-1] + cumsum(a[j] * x[j] / P[j])), with P the
+running product of (1 - a) kept in log space. The Kalman gains do not depend
+on the data. Each frame's variance update is a Mobius map of the previous
+variance, so the whole sequence comes from a prefix scan of 2x2 matrices.
+Outlier rejection takes whole runs of frames that need no decision in one
+step and only walks the frames that do. The one-euro filter's cutoff depends
+on its own smoothed derivative, so it stays a per-frame loop (vectorized
+across channels). Timestamps are the MCU's millisecond `ts` field (u32,
+wrapping), so irregular arrival, bursts and gaps use the real sample spacing.
+"""
+
+import math
+from time import perf_counter
+from typing import Dict, Sequence, Tuple
+
+import numpy as np
+
+SMOOTHERS = ("one_euro", "ema", "kalman")
+STAGES = ("outliers", "smooth", "resample")
+
+_TS_WRAP = 1 << 32
+_MIN_DT = 1e-4
+_MAX_EXP = 500.0 # Largest exponent _one_pole lets 1 / P reach before starting a new segment
+_SCALE_RATE = 0.05 # Outliers: robust scale averaging rate per frame
+_RUN = 256         # Outliers: frames examined per vectorized run (bounds the work redone after a rejection)
+
+
+def _one_pole(a: np.ndarray, x: np.ndarray, y0: np.ndarray) -> np.ndarray:
+    """
+    y[i] = y[i-1] + a[i] * (x[i] - y[i-1]) down the rows of `x` [N, C], from
+    y[-1] = `y0` [C]; `a` is [N] or [N, C].
+    """
+    n = x.shape[0]
+    a = a.reshape(n, -1)
+    decay = np.cumsum(np.log(np.maximum(1.0 - a, 1e-12)), axis=0) # log P, non-increasing
+    out = np.empty_like(x)
+    y = y0
+    start = 0
+    while start < n:
+        base = decay[start - 1] if start else 0.0
+        depth = -(decay[start:] - base).min(axis=1)
+        end = start + max(1, int(np.searchsorted(depth, _MAX_EXP, side="right")))
+        d = decay[start:end] - base
+        acc = np.cumsum(a[start:end] * np.exp(-d) * x[start:end], axis=0)
+        acc += y
+        out[start:end] = np.exp(d) * acc
+        y = out[end - 1]
+        start = end
+    return out
+
+
+class FusionPipeline:
+    def __init__(self, channels: Sequence[str], mode: str = "one_euro", grid_period: float = 1024 / 48000,
+                 min_cutoff: float = 1.0, beta: float = 0.05, d_cutoff: float = 1.0, tau: float = 0.05,
+                 process_noise: float = 1.0, measurement_noise: float = 1e-3,
+                 outlier_k: float = 6.0, min_scale: float = 0.02, max_rejects: int = 3):
+        if mode not in SMOOTHERS:
+            raise ValueError(f"Unknown smoother: {mode}")
+        self.channels = list(channels)
+        self.mode = mode
+        self.grid_period = grid_period
+        self.min_cutoff, self.beta, self.d_cutoff = min_cutoff, beta, d_cutoff
+        self.tau = tau
+        self.process_noise, self.measurement_noise = process_noise, measurement_noise
+        self.outlier_k, self.min_scale, self.max_rejects = outlier_k, min_scale, max_rejects
+
+        n = len(self.channels)
+        self.value = np.zeros(n)        # Filtered estimate
+        self._deriv = np.zeros(n)       # One-euro: smoothed derivative
+        self._var = np.ones(n)          # Kalman: estimate variance
+        self._scale = np.full(n, min_scale) # Outliers: running mean absolute deviation
+        self._rejects = np.zeros(n, dtype=np.int64)
+        self._ref = np.zeros(n)         # Outliers: last accepted raw frame
+        self._last_raw = np.zeros(n)
+        self._started = False
+
+        self.time = 0.0                 # Unwrapped sample time of `value`, seconds
+        self._last_ts = None
+        self._next_grid = None
+
+        self.samples = 0
+        self.outliers = np.zeros(n, dtype=np.int64)
+        self._stage_time = {stage: [0.0, 0.0, 0] for stage in STAGES} # total, max, count
+
+    def _unwrap(self, ts: np.ndarray) -> np.ndarray:
+        """u32 millisecond timestamps -> monotonic seconds (wrap-safe, duplicates nudged)."""
+        ts = np.asarray(ts, dtype=np.int64)
+        prev = ts[0] - 1 if self._last_ts is None else self._last_ts
+        steps = np.diff(np.concatenate(([prev], ts))) % _TS_WRAP
+        self._last_ts = int(ts[-1])
+        dt = np.maximum(steps / 1000.0, _MIN_DT)
+        base = self.time if self._started else 0.0
+        return base + np.cumsum(dt), dt
+
+    def update(self, ts: Sequence[int], values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Filters a batch of frames: `ts` [N] MCU milliseconds, `values` [N, channels].
+        Returns (grid_times, grid_values): the filtered signal on the block-rate
+        grid points passed by this batch (possibly none).
+        """
+        values = np.asarray(values, dtype=np.float64).reshape(len(ts), len(self.channels))
+        times, dts = self._unwrap(ts)
+        start_time, start_value = self.time, self.value.copy()
+
+        t0 = perf_counter()
+        if not self._started:
+            # Seed every stage with the first frame
+            self.value[:] = self._last_raw[:] = self._ref[:] = values[0]
+            self._started = True
+            start_time, start_value = times[0], values[0].copy()
+            self._next_grid = times[0]
+        accepted = self._reject_outliers(values)
+        t1 = perf_counter()
+        filtered = getattr(self, f"_smooth_{self.mode}")(accepted, dts)
+        self.value = filtered[-1].copy()
+        self.time = float(times[-1])
+        t2 = perf_counter()
+        grid_times, grid_values = self._resample(np.concatenate(([start_time], times)),
+                                                 np.vstack((start_value, filtered)))
+        t3 = perf_counter()
+
+        self.samples += len(ts)
+        for stage, elapsed in zip(STAGES, (t1 - t0, t2 - t1, t3 - t2)):
+            acc = self._stage_time[stage]
+            acc[0] += elapsed
+            acc[1] = max(acc[1], elapsed)
+            acc[2] += 1
+        return grid_times, grid_values
+
+    def _reject_outliers(self, values: np.ndarray) -> np.ndarray:
+        accepted = values.copy()
+        ref = self._ref # Raw, not the smoothed value: its lag would read as a step at every batch start
+        i, n = 0, values.shape[0]
+        while i < n:
+            i, ref = self._accept_run(accepted, i, ref)
+            if i < n:
+                ref = self._reject_step(accepted[i], ref)
+                i += 1
+        self._ref = ref.copy()
+        return accepted
+
+    def _accept_run(self, values: np.ndarray, start: int, ref: np.ndarray):
+        """
+        Accepts frames from `start` while every deviation stays within its limit
+        (so nothing is rejected or clipped and the scale average is linear).
+        Returns the first frame that needs _reject_step, and the new reference.
+        """
+        x = values[start:start + _RUN]
+        prev = np.vstack((ref, x[:-1]))
+        dev = np.abs(x - prev)
+        scale = _one_pole(np.full(len(x), _SCALE_RATE), dev, self._scale)
+        before = np.vstack((self._scale, scale[:-1]))
+        over = np.any(dev > self.outlier_k * np.maximum(before, self.min_scale), axis=1)
+        run = int(np.argmax(over)) if over.any() else len(x)
+        if run == 0:
+            return start, ref
+        self._scale = scale[run - 1].copy()
+        self._rejects[:] = 0
+        return start + run, x[run - 1].copy()
+
+    def _reject_step(self, x: np.ndarray, ref: np.ndarray) -> np.ndarray:
+        """One frame, rejecting (in place) channels that deviate too far."""
+        dev = np.abs(x - ref)
+        limit = self.outlier_k * np.maximum(self._scale, self.min_scale)
+        bad = (dev > limit) & (self._rejects < self.max_rejects)
+        self._rejects = np.where(bad, self._rejects + 1, 0)
+        self.outliers += bad
+        x[bad] = ref[bad]
+        # Robust scale: clipped deviations, slow exponential average
+        self._scale += _SCALE_RATE * (np.minimum(dev, limit) - self._scale)
+        return np.where(bad, ref, x)
+
+    def _smooth_ema(self, x: np.ndarray, dt: np.ndarray) -> np.ndarray:
+        return _one_pole(-np.expm1(-dt / self.tau), x, self.value)
+
+    def _smooth_one_euro(self, x: np.ndarray, dt: np.ndarray) -> np.ndarray:
+        def alpha(cutoff, dt):
+            return 1.0 / (1.0 + 1.0 / (2.0 * math.pi * cutoff * dt))
+        out = np.empty_like(x)
+        value, deriv, last = self.value.copy(), self._deriv, self._last_raw
+        for i in range(x.shape[0]):
+            dx = (x[i] - last) / dt[i]
+            last = x[i]
+            deriv = deriv + alpha(self.d_cutoff, dt[i]) * (dx - deriv)
+            cutoff = self.min_cutoff + self.beta * np.abs(deriv)
+            value += alpha(cutoff, dt[i]) * (x[i] - value)
+            out[i] = value
+        self._deriv, self._last_raw = deriv, last.copy()
+        return out
+
+    def _smooth_kalman(self, x: np.ndarray, dt: np.ndarray) -> np.ndarray:
+        # Per frame the posterior variance is p' = R (p + q dt) / (p + q dt + R),
+        # the Mobius map of [[R, R q dt], [1, q dt + R]]; compose them with a prefix scan
+        r = self.measurement_noise
+        qdt = self.process_noise * dt
+        maps = np.empty((len(dt), 2, 2))
+        maps[:, 0, 0] = r
+        maps[:, 0, 1] = r * qdt
+        maps[:, 1, 0] = 1.0
+        maps[:, 1, 1] = qdt + r
+        shift = 1
+        while shift < len(dt):
+            maps[shift:] = maps[shift:] @ maps[:-shift] # Right side read before the write
+            maps /= np.abs(maps).max(axis=(1, 2), keepdims=True)
+            shift *= 2
+        p0 = self._var
+        post = (maps[:, 0, 0, None] * p0 + maps[:, 0, 1, None]) / (maps[:, 1, 0, None] * p0 + maps[:, 1, 1, None])
+        pred = np.vstack((p0, post[:-1])) + qdt[:, None]
+        self._var = post[-1].copy()
+        return _one_pole(pred / (pred + r), x, self.value)
+
+    def _resample(self, times: np.ndarray, values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Interpolates the filtered trajectory at every grid tick inside [times[0], times[-1]]."""
+        if self._next_grid > times[-1]:
+            return np.empty(0), np.empty((0, len(self.channels)))
+        grid = np.arange(self._next_grid, times[-1] + 1e-12, self.grid_period)
+        self._next_grid = grid[-1] + self.grid_period
+        # One searchsorted shared by all channels, then a vectorized lerp
+        idx = np.clip(np.searchsorted(times, grid, side="right"), 1, len(times) - 1)
+        t_lo, t_hi = times[idx - 1], times[idx]
+        frac = np.clip((grid - t_lo) / np.maximum(t_hi - t_lo, 1e-12), 0.0, 1.0)[:, None]
+        return grid, values[idx - 1] + frac * (values[idx] - values[idx - 1])
+
+    def stats(self) -> Dict:
+        """Samples seen, outliers per channel, and per-stage processing time per batch."""
+        return {
+            "mode": self.mode,
+            "samples": self.samples,
+            "outliers": dict(zip(self.channels, self.outliers.tolist())),
+            "stages_us": {
+                stage: {
+                    "mean": round(total / count * 1e6, 1) if count else 0.0,
+                    "max": round(peak * 1e6, 1),
+                }
+                for stage, (total, peak, count) in self._stage_time.items()
+            },
+        }
@@ -0,0 +1,214 @@
+"""
+Asyncio ingestion of MCU Link Protocol frames.
+
+Reads a byte stream without blocking the event loop and feeds it through a
+LinkParser; ELEMENTAL_BUS frames are published to the ElementBus, raw or, with
+a FusionPipeline, filtered in one batch per read and published at block rate.
+The MCU's signed -1..1 values are mapped onto the bus range 0..1 on the way in.
+Sources:
+
+    /dev/ttyACM0            serial port (pyserial sets the baud rate), or a pty
+    serial:///dev/ttyACM0   same, explicit
+    tcp://host:port         TCP stand-in (simulators, ser2net, socat)
+    capture://path?speed=N  replay of a recorded capture (speed=0: as fast as possible,
+                            &start=S seconds in); restarts from the top when it ends
+
+Device sources are polled with loop.add_reader() on a non-blocking file
+descriptor and drained with one os.read per wake-up; TCP uses a stream reader.
+The connection is reopened with a backoff when the source goes away. With a
+CaptureWriter every valid frame is also recorded with its receive time.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Optional
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+from ..link import FrameType, LinkFrame, LinkParser, encode_frame, seq_gap
+from .capture import CaptureReader, CaptureWriter
+from .elements import ElementBus
+from .filters import FusionPipeline
+
+logger = logging.getLogger(__name__)
+
+READ_SIZE = 65536
+
+
+def bus_values(frame: LinkFrame):
+    """ELEMENTAL_BUS values mapped from -1..1 onto the element bus range 0..1."""
+    return tuple(0.5 * (v + 1.0) for v in frame.elemental())
+
+
+class LinkIngest:
+    def __init__(self, bus: ElementBus, source: str, baud: int = 115200,
+                 reconnect_delay: float = 1.0, max_reconnect_delay: float = 10.0,
+                 pipeline: Optional[FusionPipeline] = None, capture: Optional[CaptureWriter] = None):
+        self.bus = bus
+        self.pipeline = pipeline
+        self.capture = capture
+        self.source = source
+        self.baud = baud
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.parser = LinkParser()
+        self.connected = False
+        self.elemental_frames = 0
+        self.seq_gaps = 0   # Frames missing according to the MCU sequence counter
+        self.seq_resets = 0 # Duplicated, reordered or restarted sequence numbers
+        self.last_frame: Optional[float] = None # time.monotonic() of the last ELEMENTAL_BUS frame
+        self._last_seq: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> asyncio.Task:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="link-ingest")
+        return self._task
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        if self.capture is not None:
+            self.capture.close()
+
+    def handle(self, data: bytes):
+        """Parses a chunk and publishes the element frames it completes."""
+        stamps, values = [], []
+        for frame in self.parser.feed(data):
+            if self.capture is not None:
+                self.capture.append(encode_frame(frame.type, frame.seq, frame.ts, frame.payload))
+            if frame.type != FrameType.ELEMENTAL_BUS or len(frame.payload) != 4:
+                continue
+            if self._last_seq is not None:
+                gap = seq_gap(self._last_seq, frame.seq)
+                if gap is None:
+                    self.seq_resets += 1
+                else:
+                    self.seq_gaps += gap
+            self._last_seq = frame.seq
+            self.elemental_frames += 1
+            self.last_frame = time.monotonic()
+            if self.pipeline is None:
+                self.bus.publish(bus_values(frame), source="mcu")
+            else:
+                stamps.append(frame.ts)
+                values.append(bus_values(frame))
+        if stamps:
+            _, grid = self.pipeline.update(np.array(stamps), np.array(values))
+            if len(grid):
+                self.bus.publish(grid[-1], source="mcu")
+
+    async def _run(self):
+        delay = self.reconnect_delay
+        while True:
+            try:
+                url = urlparse(self.source)
+                if url.scheme == "tcp":
+                    await self._read_tcp(url.hostname, url.port)
+                elif url.scheme == "capture":
+                    await self._read_capture(url.netloc + url.path, parse_qs(url.query))
+                else:
+                    await self._read_device(url.path if url.scheme == "serial" else self.source)
+                delay = self.reconnect_delay
+                logger.warning(f"Link source {self.source} closed")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Link source {self.source} unavailable: {e!r}")
+            finally:
+                self.connected = False
+            # Reconnect with backoff, dropping any partial frame
+            self.parser.reset()
+            self._last_seq = None
+            await asyncio.sleep(delay)
+            delay = min(delay * 2.0, self.max_reconnect_delay)
+
+    async def _read_tcp(self, host: str, port: int):
+        reader, writer = await asyncio.open_connection(host, port)
+        self.connected = True
+        logger.info(f"Link connected to tcp://{host}:{port}")
+        try:
+            while True:
+                data = await reader.read(READ_SIZE)
+                if not data:
+                    return
+                self.handle(data)
+        finally:
+            writer.close()
+
+    async def _read_capture(self, path: str, query: dict):
+        speed = float(query.get("speed", ["1"])[0])
+        start = float(query.get("start", ["0"])[0])
+        with CaptureReader(path) as reader:
+            self.connected = True
+            logger.info(f"Link replaying {path} at {speed or 'max'}x from {start}s")
+            await reader.replay(self.handle, speed=speed, start=start)
+
+    async def _read_device(self, path: str):
+        port = None
+        try:
+            import serial
+            # timeout=0: reads never block; configures baud rate and raw mode
+            port = serial.Serial(path, self.baud, timeout=0)
+            fd = port.fileno()
+        except ImportError:
+            fd = os.open(path, os.O_RDONLY | os.O_NONBLOCK | os.O_NOCTTY)
+            if os.isatty(fd):
+                import tty
+                # Binary frames: no line buffering, echo or byte translation
+                tty.setraw(fd)
+        os.set_blocking(fd, False)
+
+        loop = asyncio.get_running_loop()
+        closed = loop.create_future()
+
+        def on_readable():
+            try:
+                data = os.read(fd, READ_SIZE)
+            except BlockingIOError:
+                return
+            except OSError as e:
+                # e.g. EIO when the USB device or pty peer goes away
+                if not closed.done():
+                    closed.set_exception(e)
+                return
+            if not data:
+                if not closed.done():
+                    closed.set_result(None)
+                return
+            self.handle(data)
+
+        loop.add_reader(fd, on_readable)
+        self.connected = True
+        logger.info(f"Link connected to {path}")
+        try:
+            await closed
+        finally:
+            loop.remove_reader(fd)
+            if port is not None:
+                port.close()
+            else:
+                os.close(fd)
+
+    def stats(self) -> dict:
+        stats = self.parser.stats()
+        stats.update({
+            "source": self.source,
+            "connected": self.connected,
+            "elemental_frames": self.elemental_frames,
+            "seq_gaps": self.seq_gaps,
+            "seq_resets": self.seq_resets,
+            "last_frame_age_s": None if self.last_frame is None else round(time.monotonic() - self.last_frame, 3),
+            "filter": None if self.pipeline is None else self.pipeline.stats(),
+            "capture": None if self.capture is None else {"path": self.capture.path, "records": self.capture.records},
+        })
+        return stats
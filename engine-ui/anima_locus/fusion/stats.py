@@ -0,0 +1,131 @@
+"""
+Constant-memory streaming statistics for link timing.
+
+`StreamingStats` keeps count / mean / variance (Welford) plus min and max, and a
+log-bucketed quantile sketch: bucket i covers (gamma^(i-1), gamma^i] ms, so
+every quantile it reports is within `accuracy` relative error of a real
+sample. Memory is one fixed int64 array whatever the stream length. The sketch
+is meant for non-negative values: anything up to `min_value` reads back as
+the smallest value seen, floored at zero.
+
+`LinkTiming` feeds frames (host arrival time, MCU `ts`, `seq`) into three of
+them: transit delay, inter-arrival time and RFC 3550-style jitter, and counts
+sequence gaps (lost frames) apart from duplicated, reordered or restarted
+sequence numbers (see link.seq_gap).
+"""
+
+import math
+from typing import Dict, Optional
+
+import numpy as np
+
+from ..link import seq_gap
+
+
+class StreamingStats:
+    def __init__(self, accuracy: float = 0.01, min_value: float = 1e-3, max_value: float = 1e6):
+        self.gamma = (1.0 + accuracy) / (1.0 - accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.min_value = min_value
+        self._offset = math.floor(math.log(min_value) / self._log_gamma)
+        # Bucket 0 holds everything <= min_value (including zero and negatives)
+        self._counts = np.zeros(math.ceil(math.log(max_value) / self._log_gamma) - self._offset + 1, dtype=np.int64)
+
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, x: float):
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (x - self.mean)
+        if x < self.min:
+            self.min = x
+        if x > self.max:
+            self.max = x
+        if x <= self.min_value:
+            bucket = 0
+        else:
+            bucket = min(math.ceil(math.log(x) / self._log_gamma) - self._offset, len(self._counts) - 1)
+        self._counts[bucket] += 1
+
+    @property
+    def stddev(self) -> float:
+        return math.sqrt(self._m2 / (self.count - 1)) if self.count > 1 else 0.0
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        bucket = int(np.searchsorted(np.cumsum(self._counts), rank, side="right"))
+        if bucket == 0:
+            return max(self.min, 0.0)
+        # Bucket midpoint (in the relative sense), clamped to the observed range
+        value = 2.0 * self.gamma ** (bucket + self._offset) / (self.gamma + 1.0)
+        return min(max(value, self.min), self.max)
+
+    def summary(self, digits: int = 3) -> Dict:
+        if not self.count:
+            return {"count": 0}
+        return {
+            "count": self.count,
+            "mean": round(self.mean, digits),
+            "stddev": round(self.stddev, digits),
+            "min": round(self.min, digits),
+            "p50": round(self.quantile(0.50), digits),
+            "p95": round(self.quantile(0.95), digits),
+            "p99": round(self.quantile(0.99), digits),
+            "max": round(self.max, digits),
+        }
+
+
+class LinkTiming:
+    """Arrival statistics for one frame stream; times in milliseconds."""
+
+    def __init__(self):
+        self.transit = StreamingStats()     # Arrival delay above the fastest frame seen so far
+        self.interarrival = StreamingStats()
+        self.jitter = 0.0                   # RFC 3550 interarrival jitter estimate
+        self.frames = 0
+        self.seq_gaps = 0
+        self.seq_resets = 0
+        self._min_offset = math.inf
+        self._last_arrival: Optional[float] = None
+        self._last_offset: Optional[float] = None
+        self._last_seq: Optional[int] = None
+        self._last_ts: Optional[int] = None
+        self._ts_base = 0
+
+    def add(self, arrival_ms: float, ts: int, seq: int):
+        self.frames += 1
+        # Unwrap the u32 MCU clock; host and MCU clocks only differ by an unknown offset
+        if self._last_ts is not None and ts < self._last_ts and self._last_ts - ts > 1 << 31:
+            self._ts_base += 1 << 32
+        self._last_ts = ts
+        offset = arrival_ms - (ts + self._ts_base)
+        self._min_offset = min(self._min_offset, offset)
+        self.transit.add(offset - self._min_offset)
+
+        if self._last_arrival is not None:
+            self.interarrival.add(arrival_ms - self._last_arrival)
+            self.jitter += (abs(offset - self._last_offset) - self.jitter) / 16.0
+        if self._last_seq is not None:
+            gap = seq_gap(self._last_seq, seq)
+            if gap is None:
+                self.seq_resets += 1
+            else:
+                self.seq_gaps += gap
+        self._last_arrival, self._last_offset, self._last_seq = arrival_ms, offset, seq
+
+    def summary(self) -> Dict:
+        return {
+            "frames": self.frames,
+            "seq_gaps": self.seq_gaps,
+            "seq_resets": self.seq_resets,
+            "jitter_ms": round(self.jitter, 3),
+            "transit_ms": self.transit.summary(),
+            "interarrival_ms": self.interarrival.summary(),
+        }
@@ -1,9 +1,10 @@
+import asyncio
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from .api.websocket import router as ws_router
-from .api.rest import router as rest_router
-from .state import audio_stream, engine_manager
+from .api.websocket import router as ws_router, telemetry_loop, analysis_loop, elements_loop
+from .api.rest import router as rest_router, precompile_presets
+from .state import audio_stream, engine_manager, audio_analysis, link_ingest
 from .engines.oscillator import OscillatorEngine
 import logging
 
@@ -15,15 +16,28 @@ logger = logging.getLogger(__name__)
 async def lifespan(app: FastAPI):
     # Startup
     logger.info("Initializing Audio System...")
+    precompile_presets()
     try:
         audio_stream.start()
     except Exception as e:
         logger.error(f"Audio start failed: {e}")
+    telemetry_task = asyncio.create_task(telemetry_loop())
+    audio_analysis.start()
+    analysis_task = asyncio.create_task(analysis_loop())
+    elements_task = asyncio.create_task(elements_loop())
+    if link_ingest is not None:
+        link_ingest.start()
     
     yield
     
     # Shutdown
     logger.info("Shutting down Audio System...")
+    telemetry_task.cancel()
+    analysis_task.cancel()
+    elements_task.cancel()
+    if link_ingest is not None:
+        await link_ingest.stop()
+    audio_analysis.stop()
     audio_stream.stop()
 
 app = FastAPI(
@@ -61,7 +75,8 @@ async def set_part_frequency(part_id: str, freq: float):
         part = engine_manager.get_part(part_id)
         # Check if the part has an engine and if it's an oscillator
         if part.engine and isinstance(part.engine, OscillatorEngine):
-            part.engine.set_frequency(freq)
+            if not engine_manager.queue_param(part_id, "frequency", freq):
+                raise HTTPException(status_code=503, detail="Parameter queue full")
             return {"part": part_id, "frequency": freq}
         else:
             raise HTTPException(status_code=400, detail="Part has no oscillator assigned")
@@ -73,7 +88,8 @@ async def set_part_amplitude(part_id: str, amp: float):
     try:
         part = engine_manager.get_part(part_id)
         if part.engine and isinstance(part.engine, OscillatorEngine):
-            part.engine.set_amplitude(amp)
+            if not engine_manager.queue_param(part_id, "amplitude", amp):
+                raise HTTPException(status_code=503, detail="Parameter queue full")
             return {"part": part_id, "amplitude": amp}
         else:
              raise HTTPException(status_code=400, detail="Part has no oscillator assigned")
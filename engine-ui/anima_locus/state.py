@@ -1,26 +1,35 @@
-from .engines.manager import EngineManager
+import os
+
+from .engines.manager import create_default_manager
 from .audio_io.stream import AudioStream
-from .engines.oscillator import OscillatorEngine
-from .engines.granular import GranularEngine
-from .engines.spectral import SpectralEngine
+from .audio_io.metrics import MetricsAggregator
+from .audio_io.analysis import AnalysisWorker
+from .fusion.capture import CaptureWriter
+from .fusion.elements import ELEMENTS
+from .fusion.filters import FusionPipeline
+from .fusion.ingest import LinkIngest
+from .store import PresetStore
 
 # Singleton Instances
-engine_manager = EngineManager()
+# Parts: A = Granular (Texture), B = Spectral (Pad), C = Oscillator (Bass), D = Oscillator (Lead);
+# ANIMA_PARTS > 4 adds empty parts E, F, ... (up to 32) for larger installations
+engine_manager = create_default_manager(num_parts=int(os.environ.get("ANIMA_PARTS", "4")))
 audio_stream = AudioStream(engine_manager)
+audio_metrics = MetricsAggregator(audio_stream.metrics)
+audio_analysis = AnalysisWorker(audio_stream.tap, audio_stream.sample_rate, rate=30.0)
 
-# Initialize Parts
-# Part A: Granular (Texture)
-eng_a = GranularEngine()
-engine_manager.assign_engine_to_part("A", eng_a)
-
-# Part B: Spectral (Pad)
-eng_b = SpectralEngine()
-engine_manager.assign_engine_to_part("B", eng_b)
-
-# Part C: Oscillator (Bass)
-eng_c = OscillatorEngine(frequency=110.0, amplitude=0.4)
-engine_manager.assign_engine_to_part("C", eng_c)
+# MCU link: serial device / pty path, tcp://host:port or capture://path; unset = no MCU
+# Element filter: one_euro / ema / kalman, or "none" to publish raw frames
+# Capture: record every received frame to this file (replay with capture://path)
+LINK_SOURCE = os.environ.get("ANIMA_LINK_SOURCE")
+LINK_FILTER = os.environ.get("ANIMA_LINK_FILTER", "one_euro")
+LINK_CAPTURE = os.environ.get("ANIMA_LINK_CAPTURE")
+link_ingest = LinkIngest(
+    engine_manager.elements, LINK_SOURCE,
+    pipeline=None if LINK_FILTER == "none" else FusionPipeline(
+        ELEMENTS, mode=LINK_FILTER, grid_period=audio_stream.block_size / audio_stream.sample_rate),
+    capture=CaptureWriter(LINK_CAPTURE) if LINK_CAPTURE else None,
+) if LINK_SOURCE else None
 
-# Part D: Oscillator (Lead)
-eng_d = OscillatorEngine(frequency=660.0, amplitude=0.2)
-engine_manager.assign_engine_to_part("D", eng_d)
+# Presets and scenes (SQLite file; ":memory:" for throwaway sessions)
+preset_store = PresetStore(os.environ.get("ANIMA_DB", "anima.db"))
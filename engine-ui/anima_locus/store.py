@@ -0,0 +1,124 @@
+"""
+Persistent preset / scene store (SQLite, WAL mode).
+
+Rows keep the JSON body next to indexed id / name columns. The store knows
+nothing about engines: the API compiles presets into snapshots
+(engines/snapshot.py) when they are saved or first read after a restart.
+
+Every write bumps a per-table revision; list ETags are derived from it (plus
+the page), and item ETags from the row version, so unchanged collections are
+answered with 304 without touching the rows.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+TABLES = ("presets", "scenes")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS {table} (
+    id       TEXT PRIMARY KEY,
+    name     TEXT NOT NULL,
+    body     TEXT NOT NULL,
+    version  INTEGER NOT NULL DEFAULT 1,
+    updated  REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS {table}_name ON {table} (name, id);
+"""
+
+
+class PresetStore:
+    def __init__(self, path: str):
+        self.path = path
+        # One connection shared by the request handlers; statements are short
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS revisions (name TEXT PRIMARY KEY, revision INTEGER NOT NULL)")
+            for table in TABLES:
+                self._db.executescript(_SCHEMA.format(table=table))
+                self._db.execute("INSERT OR IGNORE INTO revisions VALUES (?, 0)", (table,))
+
+    @staticmethod
+    def _table(table: str) -> str:
+        if table not in TABLES:
+            raise ValueError(f"Unknown table: {table}")
+        return table
+
+    def revision(self, table: str) -> int:
+        with self._lock:
+            row = self._db.execute("SELECT revision FROM revisions WHERE name = ?", (self._table(table),)).fetchone()
+        return row[0]
+
+    def list_etag(self, table: str, offset: int, limit: int) -> str:
+        return f'"{table}-{self.revision(table)}-{offset}-{limit}"'
+
+    def list(self, table: str, offset: int = 0, limit: int = 50) -> Tuple[List[Dict[str, Any]], int]:
+        """One page of bodies ordered by name, and the total row count."""
+        table = self._table(table)
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT body FROM {table} ORDER BY name, id LIMIT ? OFFSET ?", (limit, offset)
+            ).fetchall()
+            total = self._db.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        return [json.loads(body) for body, in rows], total
+
+    def get(self, table: str, item_id: str) -> Optional[Tuple[Dict[str, Any], str]]:
+        """(body, etag), or None."""
+        table = self._table(table)
+        with self._lock:
+            row = self._db.execute(f"SELECT body, version FROM {table} WHERE id = ?", (item_id,)).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), f'"{table}-{item_id}-{row[1]}"'
+
+    def ids(self, table: str) -> List[str]:
+        table = self._table(table)
+        with self._lock:
+            return [row[0] for row in self._db.execute(f"SELECT id FROM {table}")]
+
+    def save(self, table: str, body: Dict[str, Any], create: bool = False) -> bool:
+        """
+        Inserts or replaces a row. With `create`, refuses to overwrite (returns
+        False if the id exists); otherwise returns whether the row existed.
+        """
+        table = self._table(table)
+        args = (body["id"], body["name"], json.dumps(body), time.time())
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                exists = self._db.execute(f"SELECT 1 FROM {table} WHERE id = ?", (body["id"],)).fetchone() is not None
+                if exists and create:
+                    self._db.execute("ROLLBACK")
+                    return False
+                self._db.execute(
+                    f"INSERT INTO {table} (id, name, body, updated) VALUES (?, ?, ?, ?) "
+                    f"ON CONFLICT(id) DO UPDATE SET name = excluded.name, body = excluded.body, "
+                    f"updated = excluded.updated, version = version + 1",
+                    args,
+                )
+                self._db.execute("UPDATE revisions SET revision = revision + 1 WHERE name = ?", (table,))
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return True if create else exists
+
+    def delete(self, table: str, item_id: str) -> bool:
+        table = self._table(table)
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            deleted = self._db.execute(f"DELETE FROM {table} WHERE id = ?", (item_id,)).rowcount > 0
+            if deleted:
+                self._db.execute("UPDATE revisions SET revision = revision + 1 WHERE name = ?", (table,))
+            self._db.execute("COMMIT")
+        return deleted
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,4 @@
+import os
+
+# Keep the preset store out of the working tree during tests
+os.environ.setdefault("ANIMA_DB", ":memory:")
@@ -0,0 +1,220 @@
+import asyncio
+import json
+import struct
+
+from fastapi.testclient import TestClient
+
+from anima_locus.api import binary
+from anima_locus.api.websocket import ClientConnection, ConnectionManager
+from anima_locus.server import app
+from anima_locus.state import engine_manager
+
+
+def test_metrics_endpoint_prometheus_text():
+    with TestClient(app) as client:
+        resp = client.get("/api/v1/metrics")
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/plain")
+    body = resp.text
+    assert "# TYPE anima_audio_callback_load histogram" in body
+    assert 'anima_audio_part_process_seconds_bucket{part="A",le="+Inf"}' in body
+    assert 'anima_audio_part_errors_total{part="D"}' in body
+
+
+def test_websocket_set_param_is_queued_for_audio_thread():
+    engine_manager.commands.drain()
+    with TestClient(app) as client:
+        with client.websocket_connect("/ws") as ws:
+            for value in (300.0, 310.0, 320.0):
+                ws.send_json({"type": "set_param", "part_id": "D", "engine": "oscillator",
+                              "param": "frequency", "value": value})
+            ws.send_json({"type": "set_param", "part_id": "D", "engine": "oscillator",
+                          "param": "amplitude", "value": 0.3})
+            resp = client.get("/health")
+            assert resp.status_code == 200
+    assert sorted(engine_manager.commands.drain()) == [("D", "amplitude", 0.3, -1, 0), ("D", "frequency", 320.0, -1, 0)]
+
+
+def test_test_routes_report_a_full_param_queue():
+    engine_manager.commands.drain()
+    client = TestClient(app)
+    assert client.post("/test/part/D/frequency/330").status_code == 200
+    while engine_manager.commands.push("D", "frequency", 330.0):
+        pass
+    resp = client.post("/test/part/D/amplitude/0.2")
+    assert resp.status_code == 503
+    engine_manager.commands.drain()
+
+
+def test_websocket_binary_param_batch():
+    engine_manager.commands.drain()
+    with TestClient(app) as client:
+        assert client.get("/api/v1/protocol").json()["params"][:2] == ["frequency", "amplitude"]
+        with client.websocket_connect("/ws", subprotocols=[binary.SUBPROTOCOL]) as ws:
+            assert ws.accepted_subprotocol == binary.SUBPROTOCOL
+            ws.send_bytes(binary.encode_params([
+                ("C", "frequency", 200.0),
+                ("C", "frequency", 220.0),
+                ("A", "density", 12.0, 2.0, 0.5),
+                ("D", "density", 1.0), # Not a parameter of part D: dropped, rest applied
+            ]))
+            ws.send_bytes(b"\x01\x00\x05\x00") # Record count mismatch: whole frame rejected
+            ws.send_json({"type": "set_param", "part_id": "B", "engine": "spectral",
+                          "param": "blur", "value": 0.5})
+            assert client.get("/health").status_code == 200
+    assert sorted(engine_manager.commands.drain()) == [
+        ("A", "density", 12.0, 96000, 24000), ("B", "blur", 0.5, -1, 0), ("C", "frequency", 220.0, -1, 0),
+    ]
+
+
+def test_binary_frame_validation():
+    kind, records = binary.decode_frame(binary.encode_elements([("fire", 0.25), ("air", 1.0)]))
+    assert kind == binary.FRAME_ELEMENTS
+    assert records["element"].tolist() == [binary.ELEMENT_CODES.index("fire"), binary.ELEMENT_CODES.index("air")]
+    frame = bytearray(binary.encode_params([("A", "amplitude", 0.5, 1.0)]))
+    frame[binary.HEADER.size + 8:binary.HEADER.size + 16] = struct.pack("<d", -1.0)
+    try:
+        binary.decode_frame(bytes(frame))
+        assert False, "negative times are rejected"
+    except binary.ProtocolError:
+        pass
+
+
+def test_slow_client_coalesces_telemetry_and_bounds_queue():
+    class SlowSocket:
+        client = None
+
+        def __init__(self):
+            self.release = asyncio.Event()
+            self.frames = []
+
+        async def send_text(self, frame):
+            await self.release.wait()
+            self.frames.append(frame)
+
+    class BrokenSocket(SlowSocket):
+        async def send_text(self, frame):
+            raise RuntimeError("connection reset")
+
+    async def scenario():
+        slow, broken = SlowSocket(), BrokenSocket()
+        manager = ConnectionManager(max_queue=2)
+        manager.clients[slow] = ClientConnection(slow, max_queue=2)
+        manager.clients[broken] = ClientConnection(broken, max_queue=2)
+
+        manager.broadcast({"n": 0})
+        await asyncio.sleep(0) # Writer takes the first frame and blocks in send
+        for n in range(1, 4):
+            manager.broadcast({"n": n})
+        for n in range(10):
+            manager.broadcast({"type": "telemetry", "n": n}, channel="telemetry")
+        stats = {id(c.websocket): c.stats() for c in manager.clients.values()}
+        slow.release.set()
+        await asyncio.sleep(0.01)
+        return slow, manager.clients[slow], stats[id(broken)]
+
+    slow, client, broken_stats = asyncio.run(scenario())
+    assert client.dropped == 1
+    assert client.coalesced == 9
+    assert [json.loads(f)["n"] for f in slow.frames] == [0, 1, 2, 9]
+    assert broken_stats["closed"]
+
+
+def test_websocket_set_element_reaches_element_bus():
+    with TestClient(app) as client:
+        with client.websocket_connect("/ws", subprotocols=[binary.SUBPROTOCOL]) as ws:
+            ws.send_json({"type": "set_element", "element": "water", "value": 0.75})
+            ws.send_bytes(binary.encode_elements([("earth", 0.5)]))
+            assert client.get("/health").status_code == 200
+            elements = client.get("/api/v1/elements").json()
+    assert elements["values"]["water"] == 0.75
+    assert elements["values"]["earth"] == 0.5
+    assert elements["sources"]["water"] == "ui"
+
+
+def test_preset_mappings_apply_to_modulation_matrix():
+    client = TestClient(app)
+    preset = {
+        "id": "mod-test", "name": "Mod", "engines": {},
+        "mappings": {"water": {"target": "C.amplitude", "curve": "smooth"}, "earth": "spectral.center_freq"},
+    }
+    assert client.post("/api/v1/presets", json=preset).status_code == 200
+    applied = client.post("/api/v1/presets/mod-test/apply").json()["modulation"]
+    assert applied["targets"] == ["C.amplitude", "B.center_freq"] and not applied["unresolved"]
+    assert client.get("/api/v1/modulation").json()["routes"] == 2
+    engine_manager.set_mappings({})
+
+
+def test_preset_store_pages_etags_and_snapshot_apply():
+    client = TestClient(app)
+    for i in range(3):
+        preset = {
+            "id": f"store-{i}", "name": f"Store {i}",
+            "engines": {"C": {"frequency": 220.0 * (i + 1), "volume": 0.5}, "granular": {"density": 40, "sample": "x.wav"}},
+            "mappings": {},
+        }
+        assert client.post("/api/v1/presets", json=preset).status_code == 200
+    assert client.post("/api/v1/presets", json=preset).status_code == 400
+
+    page = client.get("/api/v1/presets", params={"offset": 1, "limit": 1})
+    assert int(page.headers["X-Total-Count"]) >= 3 and len(page.json()) == 1
+    etag = page.headers["ETag"]
+    cached = client.get("/api/v1/presets", params={"offset": 1, "limit": 1}, headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+
+    preset["name"] = "Renamed"
+    assert client.put("/api/v1/presets/store-2", json=preset).status_code == 200
+    assert client.get("/api/v1/presets", params={"offset": 1, "limit": 1},
+                      headers={"If-None-Match": etag}).status_code == 200 # Revision moved on
+    item = client.get("/api/v1/presets/store-2")
+    assert item.json()["name"] == "Renamed"
+    assert client.get("/api/v1/presets/store-2", headers={"If-None-Match": item.headers["ETag"]}).status_code == 304
+
+    snapshot = client.post("/api/v1/presets/store-1/apply").json()
+    assert ["C", "frequency", 440.0] in snapshot["params"] and ["A", "density", 40.0] in snapshot["params"]
+    assert [s["key"] for s in snapshot["skipped"]] == ["granular.sample"]
+    engine_manager.apply_pending(0, 0) # Next audio block picks up the swapped snapshot
+    assert engine_manager.parts["C"].engine.frequency == 440.0 and engine_manager.parts["C"].volume == 0.5
+
+    assert client.delete("/api/v1/presets/store-0").status_code == 200
+    assert client.get("/api/v1/presets/store-0").status_code == 404
+
+
+def test_engine_swap_and_scene_load():
+    client = TestClient(app)
+    swap = client.post("/api/v1/parts/D/engine", json={"type": "spectral", "crossfade": 0.1, "params": {"blur": 0.5}})
+    assert swap.status_code == 200
+    part = engine_manager.parts["D"]
+    assert type(part.engine).__name__ == "SpectralEngine" and part.engine.blur == 0.5
+    assert type(part.fade.engine).__name__ == "OscillatorEngine"
+    escape = {"type": "sampler", "samples": [{"path": "../../etc/passwd"}]}
+    assert client.post("/api/v1/parts/D/engine", json=escape).status_code == 400
+    assert client.post("/api/v1/parts/D/engine", json={"type": "oscillator", "samples": [{"path": "a.wav"}]}).status_code == 400
+
+    for i, freq in enumerate((110.0, 880.0)):
+        client.post("/api/v1/presets", json={"id": f"scene-p{i}", "name": f"P{i}", "engines": {"C": {"frequency": freq}}, "mappings": {}})
+    client.post("/api/v1/scenes", json={"id": "scene-1", "name": "Scene", "presets": ["scene-p0", "scene-p1"]})
+    loaded = client.post("/api/v1/scenes/scene-1/load").json()
+    assert loaded["morph"]["targets"] == ["C.frequency"]
+    with client.websocket_connect("/ws") as ws:
+        ws.send_text(json.dumps({"type": "set_morph", "value": 0.5}))
+        ws.send_text(json.dumps({"type": "set_morph", "value": 0.5}))
+    assert engine_manager.morph_position == 0.5
+    engine_manager.apply_pending(0, 0)
+    assert abs(engine_manager.parts["C"].engine.frequency - 311.127) < 1e-3
+    engine_manager.morph = None
+    engine_manager.assign_engine_to_part("D", part.fade.engine)
+
+
+def test_effect_chains_on_master_and_parts():
+    client = TestClient(app)
+    chain = [{"type": "reverb", "params": {"mix": 0.2}}, {"type": "filter", "mode": "lowpass", "params": {"cutoff": 8000}}]
+    put = client.put("/api/v1/fx/master", json=chain)
+    assert put.status_code == 200 and [e["type"] for e in put.json()["effects"]] == ["reverb", "filter"]
+    assert client.put("/api/v1/fx/c", json=[{"type": "delay", "params": {"feedback": 0.5}}]).json()["target"] == "C"
+    assert set(client.get("/api/v1/fx").json()) == {"master", "C"}
+    assert client.put("/api/v1/fx/C", json=[{"type": "delay", "mode": "lowpass"}]).status_code == 400
+    assert client.put("/api/v1/fx/Z", json=[]).status_code == 400
+    for target in ("master", "C"):
+        assert client.put(f"/api/v1/fx/{target}", json=[]).json()["effects"] == []
+    assert engine_manager.master_fx is None and engine_manager.parts["C"].inserts is None
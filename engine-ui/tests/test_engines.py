@@ -0,0 +1,560 @@
+import pickle
+import wave
+
+import numpy as np
+
+from anima_locus.audio_io.analysis import AnalysisWorker
+from anima_locus.audio_io.limiter import LookaheadLimiter
+from anima_locus.audio_io.metrics import MetricsAggregator
+from anima_locus.audio_io.offline import OfflineRenderer
+from anima_locus.audio_io.stream import AudioStream
+from anima_locus.engines.automation import AutomationScheduler
+from anima_locus.engines.base import AudioEngine
+from anima_locus.engines.commands import ParamCommandQueue
+from anima_locus.engines.effects import ConvolutionReverb, Delay, EffectChain, Filter
+from anima_locus.engines.granular import GranularEngine
+from anima_locus.engines.manager import create_default_manager
+from anima_locus.engines.oscillator import OscillatorEngine, wavetable_mipmaps
+from anima_locus.engines.part import AudioPart
+from anima_locus.engines.sampler import SamplerEngine
+from anima_locus.engines.samples import SampleCache
+from anima_locus.engines.spectral import SpectralEngine
+
+
+def test_offline_render_default_mix():
+    manager = create_default_manager(48000)
+    stream = AudioStream(manager, sample_rate=48000, block_size=256)
+    result = OfflineRenderer(stream).render(0.5, keep=True)
+    assert result.audio.shape == (24000, 2)
+    assert np.all(np.isfinite(result.audio))
+    assert np.max(np.abs(result.audio)) <= 0.95
+    assert result.block_times.size == -(-24000 // 256)
+    assert result.realtime_factor > 0
+
+
+def test_callback_metrics_count_part_errors():
+    class Broken(AudioEngine):
+        def process_into(self, out):
+            raise RuntimeError("boom")
+
+    manager = create_default_manager(48000)
+    manager.assign_engine_to_part("B", Broken())
+    stream = AudioStream(manager, sample_rate=48000, block_size=128)
+    OfflineRenderer(stream).render(0.1)
+
+    agg = MetricsAggregator(stream.metrics)
+    agg.collect()
+    snap = agg.snapshot()
+    assert agg.blocks == stream.metrics.blocks_written == 38
+    assert snap["parts"]["B"]["errors"] == 38
+    assert snap["parts"]["A"]["errors"] == 0
+    assert snap["parts"]["C"]["peak"] > 0.0
+    assert "anima_audio_blocks_total 38" in agg.render_prometheus()
+    assert snap["limiter"]["time_us"] > 0.0
+
+
+def test_process_wrapper_matches_process_into():
+    for engine in (GranularEngine(48000), SpectralEngine(48000), OscillatorEngine(48000, amplitude=0.5)):
+        out = engine.process(512)
+        assert out.dtype == np.float32
+        assert out.shape == ((512,) if engine.channels == 1 else (512, 2))
+
+
+def test_part_render_reuses_bus_and_pans_in_place():
+    part = AudioPart("C", 48000, max_block_size=1024)
+    part.assign_engine(OscillatorEngine(48000, frequency=440.0, amplitude=0.5))
+    part.pan = 1.0
+    first = part.render(256)
+    second = part.render(256)
+    assert np.shares_memory(first, second)
+    assert np.allclose(second[:, 0], 0.0)
+    assert np.max(np.abs(second[:, 1])) > 0.4
+    # Larger blocks grow the bus once
+    assert part.render(2048).shape == (2048, 2)
+    assert part.max_block_size == 2048
+
+
+def test_granular_pool_sample_accurate_onset():
+    eng = GranularEngine(48000, max_grains=8)
+    eng.spray = 0.0
+    eng.stereo_spread = 0.0
+    eng.set_density(48000 / 300.0)
+    eng.grain_size = 0.001
+    eng._spawn_counter = 10
+    out = np.zeros((256, 2), dtype=np.float32)
+    eng.process_into(out)
+    # Hann window is zero at onset, so the first audible sample follows it
+    assert np.flatnonzero(out[:, 0])[0] == 11
+    assert np.allclose(out[:, 0], out[:, 1])
+    assert np.all(out[:10] == 0.0)
+
+
+def test_granular_pool_recycles_slots():
+    eng = GranularEngine(48000, max_grains=32)
+    eng.set_density(4000.0)
+    eng.grain_size = 0.05
+    out = np.zeros((512, 2), dtype=np.float32)
+    for _ in range(40):
+        eng.process_into(out)
+    assert eng.active_grains <= 32
+    assert eng.dropped_grains > 0
+    assert np.all(np.isfinite(out))
+    # Stop spawning; every grain retires and returns to the free list
+    eng.set_density(0.1)
+    eng._spawn_counter = 10**9
+    for _ in range(10):
+        eng.process_into(out)
+    assert eng.active_grains == 0
+    assert np.all(out == 0.0)
+
+
+def test_spectral_stft_independent_of_block_size():
+    eng = SpectralEngine(48000, fft_size=2048, hop_size=512)
+    eng.bandwidth = 1e9  # mask is flat: overlap-add should reconstruct the noise level
+    eng.amplitude = 0.1  # x10 output boost -> unity
+    blocks = [eng.process(n) for n in (100, 1000, 37, 4096, 333) * 8]
+    audio = np.concatenate(blocks[5:])
+    assert abs(audio.std() - 0.2) < 0.02
+    assert eng._ring_count < eng.hop_size + 4096
+
+
+def test_spectral_mask_cached_and_freeze_holds_magnitudes():
+    eng = SpectralEngine(48000, fft_size=2048, hop_size=512)
+    eng.process(1024)
+    mask = eng._spectral_mask()
+    eng.process(1024)
+    assert eng._spectral_mask() is mask
+    eng.set_frequency(1000.0)
+    assert eng._spectral_mask() is not mask
+
+    eng.set_freeze(True)
+    frozen = eng._frozen_mag.copy()
+    eng.process(4096)
+    assert np.array_equal(eng._frozen_mag, frozen)
+    eng.set_freeze(False)
+    assert eng._frozen_mag is None
+
+
+def test_wavetable_pad_voice_matches_sine_and_tables_are_cached():
+    eng = OscillatorEngine(48000, frequency=1000.0, amplitude=1.0)
+    out = eng.process(4800)
+    ref = np.sin(2 * np.pi * 1000.0 * np.arange(4800) / 48000)
+    assert np.max(np.abs(out - ref)) < 1e-4
+    assert wavetable_mipmaps("saw") is wavetable_mipmaps("saw")
+
+
+def test_wavetable_saw_is_band_limited():
+    eng = OscillatorEngine(48000, frequency=5000.0, amplitude=1.0, waveform="saw")
+    spectrum = np.abs(np.fft.rfft(eng.process(48000)))
+    harmonics = np.arange(5000, 24000, 5000)
+    others = np.setdiff1d(np.arange(1, 24000), harmonics)
+    assert spectrum[others].max() < 1e-3 * spectrum.max()
+
+
+def test_wavetable_voice_stealing_and_release():
+    eng = OscillatorEngine(48000, amplitude=0.5, max_voices=4)
+    voices = [eng.note_on(200.0 + 100 * i) for i in range(3)]
+    assert voices == [1, 2, 3]
+    assert eng.active_voices == 4
+    # Bank full: the oldest note (voice 1) is stolen
+    assert eng.note_on(900.0) == 1
+    eng.note_off(2)
+    eng.process(256)
+    assert eng.active_voices == 3
+
+
+def test_command_queue_coalesces_per_part_and_param():
+    queue = ParamCommandQueue(["A", "B"], capacity=8)
+    for v in range(5):
+        queue.push("A", "frequency", float(v))
+    queue.push("B", "frequency", 10.0)
+    queue.push("A", "amplitude", 0.5)
+    assert sorted(queue.drain()) == [
+        ("A", "amplitude", 0.5, -1, 0), ("A", "frequency", 4.0, -1, 0), ("B", "frequency", 10.0, -1, 0),
+    ]
+    assert queue.drain() == []
+
+    # Timed commands are never coalesced and keep their publish order
+    queue.push("A", "frequency", 1.0, time=100, ramp=50)
+    queue.push("A", "frequency", 2.0, time=50)
+    queue.push("A", "frequency", 3.0)
+    assert queue.drain() == [
+        ("A", "frequency", 3.0, -1, 0), ("A", "frequency", 1.0, 100, 50), ("A", "frequency", 2.0, 50, 0),
+    ]
+
+    for v in range(8):
+        assert queue.push("A", "frequency", float(v))
+    assert not queue.push("A", "frequency", 99.0)
+    assert queue.dropped == 1
+    assert queue.drain() == [("A", "frequency", 7.0, -1, 0)]
+
+
+def test_manager_applies_queued_params_at_block_start():
+    manager = create_default_manager(48000)
+    stream = AudioStream(manager, sample_rate=48000, block_size=256)
+    manager.queue_param("C", "frequency", 220.0)
+    manager.queue_param("C", "pan", -0.5)
+    manager.queue_param("A", "density", 40.0)
+    assert manager.get_part("C").engine.frequency == 110.0
+    OfflineRenderer(stream).render(256 / 48000)
+    assert manager.get_part("C").engine.frequency == 220.0
+    assert manager.get_part("C").pan == -0.5
+    assert manager.get_part("A").engine.density == 40.0
+    try:
+        manager.queue_param("C", "sample_rate", 1.0)
+        assert False, "structural attributes are not params"
+    except ValueError:
+        pass
+
+
+def _oscillator_part(part_id="C"):
+    part = AudioPart(part_id, 48000)
+    part.assign_engine(OscillatorEngine(48000, frequency=110.0, amplitude=0.4, waveform="saw"))
+    return part
+
+
+def test_timed_step_lands_on_exact_sample():
+    parts = {"C": _oscillator_part()}
+    reference = _oscillator_part()
+    scheduler = AutomationScheduler()
+    scheduler.schedule(parts, "C", "amplitude", 0.0, at=300, ramp=0, now=0)
+
+    out = []
+    for t0 in (0, 256, 512):
+        scheduler.process_block(parts, t0, 256)
+        out.append(parts["C"].render(256).copy())
+    out = np.concatenate(out)
+    expected = np.concatenate([reference.render(256).copy() for _ in range(3)])
+    np.testing.assert_allclose(out[:300], expected[:300], atol=1e-6)
+    assert not np.any(out[300:])
+    assert parts["C"].engine.amplitude == 0.0
+    assert not parts["C"].engine.param_curves
+
+
+def test_amplitude_ramp_is_rendered_per_sample():
+    parts = {"C": _oscillator_part()}
+    engine = parts["C"].engine
+    scheduler = AutomationScheduler()
+    scheduler.schedule(parts, "C", "amplitude", 0.0, at=0, ramp=256, now=0)
+    scheduler.process_block(parts, 0, 256)
+
+    curve = engine.param_curves["amplitude"]
+    assert curve.shape == (256,)
+    assert np.all(np.diff(curve) < 0)
+    np.testing.assert_allclose(curve[128], 0.2, atol=1e-6)
+    assert engine.amplitude == curve[-1]
+    parts["C"].render(256)
+
+    # The ramp reaches its target at sample 256; the lane is released a block later
+    scheduler.process_block(parts, 256, 256)
+    assert not np.any(engine.param_curves["amplitude"])
+    assert engine.amplitude == 0.0
+    scheduler.process_block(parts, 512, 256)
+    assert not engine.param_curves
+
+
+def test_process_execution_matches_serial_mix():
+    def render(execution):
+        manager = create_default_manager(48000)
+        for part_id, freq in (("A", 220.0), ("B", 330.0)):
+            manager.assign_engine_to_part(part_id, OscillatorEngine(48000, frequency=freq, amplitude=0.2))
+        # Workers publish these with their rows; the callback mixes through the same gain matrix
+        manager.get_part("A").pan = -0.6
+        manager.get_part("B").volume = 0.5
+        manager.get_part("D").mute = True
+        stream = AudioStream(manager, sample_rate=48000, block_size=256, execution=execution,
+                             lookahead=2, part_groups=[["A", "B"], ["C", "D"]])
+        manager.queue_param("C", "amplitude", 0.0, time=1000 / 48000)
+        result = OfflineRenderer(stream).render(4096 / 48000, keep=True)
+        return result.audio, stream
+
+    serial, _ = render("serial")
+    parallel, stream = render("process")
+    assert not stream.parallel.running
+    np.testing.assert_allclose(parallel, serial, atol=1e-6)
+    np.testing.assert_allclose(stream.mixer.part_gains[3], 0.0) # Muted D
+    assert abs(parallel[:, 0]).max() > abs(parallel[:, 1]).max() # A panned left
+    assert not np.any(stream.metrics.part_starved)
+
+
+def test_analysis_tap_meters_and_spectrum():
+    manager = create_default_manager(48000)
+    for part_id in ("A", "B", "D"):
+        manager.get_part(part_id).mute = True
+    manager.assign_engine_to_part("C", OscillatorEngine(48000, frequency=1000.0, amplitude=0.5))
+    manager.get_part("C").pan = 0.0
+    stream = AudioStream(manager, sample_rate=48000, block_size=256)
+    worker = AnalysisWorker(stream.tap, 48000, fft_size=2048, bands=32)
+    OfflineRenderer(stream).render(4096 / 48000)
+
+    frame = worker.analyze()
+    assert frame.frame_time == 4096
+    master, part_a, part_c = frame.meters[0], frame.meters[1], frame.meters[3]
+    np.testing.assert_allclose(master[:2], part_c[:2], atol=1e-6)
+    # The master lags by the limiter's look-ahead, which the RMS window sees as silence
+    np.testing.assert_allclose(master[2:], part_c[2:], rtol=0.02)
+    assert not np.any(part_a)
+    assert 0.3 < master[0] < 0.6
+    np.testing.assert_allclose(master[2], master[0] / np.sqrt(2), rtol=0.05)
+
+    peak_band = int(np.argmax(frame.spectrum))
+    assert worker.band_edges[peak_band] <= 1000.0 < worker.band_edges[peak_band + 1]
+    assert worker.analyze() is None # Nothing new since the last tick
+
+
+def test_modulation_matrix_routes_elements_to_params():
+    manager = create_default_manager()
+    matrix = manager.set_mappings({
+        "earth": "C.frequency",                                           # Default log range 20-2000 Hz
+        "air": {"target": "granular.density", "depth": 0.5, "curve": "exp", "range": [5, 60]},
+        "fire": ["D.amplitude", {"target": "B.blur", "curve": "inverse"}],
+        "radar.x": "granular.position",                                   # Not on the element bus (yet)
+    })
+    assert matrix.routes == 4 and matrix.depth.shape == (4, 4)
+    assert [u["source"] for u in matrix.unresolved] == ["radar.x"]
+
+    manager.elements.publish([0.5, 1.0, 0.0, 0.75], source="ui")
+    manager.apply_pending(0, 256)
+    assert abs(manager.parts["C"].engine.frequency - 200.0) < 1e-6
+    assert abs(manager.parts["A"].engine.density - np.sqrt(5 * 60)) < 1e-6 # exp(1) = 1, half depth on a log range
+    assert manager.parts["D"].engine.amplitude == 0.75
+    assert abs(manager.parts["B"].engine.blur - 0.25 * 0.999) < 1e-6
+
+    # Unchanged snapshot: nothing is evaluated or written
+    manager.parts["D"].engine.amplitude = 0.1
+    manager.apply_pending(256, 256)
+    assert manager.parts["D"].engine.amplitude == 0.1
+
+    # Negative depth inverts a route around the top of its range
+    matrix = manager.set_mappings({"earth": [{"target": "D.amplitude", "depth": -1.0},
+                                             {"target": "C.volume", "depth": -0.5}]})
+    np.testing.assert_allclose(matrix.evaluate(np.array([0.0, 0, 0, 0])), [1.0, 0.5])
+    np.testing.assert_allclose(matrix.evaluate(np.array([0.75, 0, 0, 0])), [0.25, 0.125])
+    np.testing.assert_allclose(matrix.evaluate(np.array([1.0, 0, 0, 0])), [0.0, 0.0])
+
+
+def test_part_engine_swap_crossfades_at_equal_power():
+    class Constant(AudioEngine):
+        def __init__(self, level):
+            super().__init__(48000)
+            self.level = level
+
+        def process_into(self, out):
+            out.fill(self.level)
+
+    part = AudioPart("A", 48000)
+    part.assign_engine(Constant(1.0))
+    part.render(64)
+    part.assign_engine(Constant(0.0), crossfade=256 / 48000)
+    # Old engine alone at cos(t), so the power of old + new (uncorrelated) stays constant
+    faded = np.concatenate([part.process(100)[:, 0] for _ in range(3)])
+    t = np.minimum(np.arange(300) / 256, 1.0) * np.pi / 2
+    np.testing.assert_allclose(faded, np.cos(t) * np.sqrt(0.5), atol=1e-5) # Centre pan: -3 dB
+    assert part.fade is None and np.all(part.render(64) == 0.0)
+
+
+def test_snapshot_morph_interpolates_presets():
+    manager = create_default_manager()
+    a = manager.compile_preset("a", {"C": {"frequency": 100.0, "volume": 0.2}, "D": {"amplitude": 0.1}}, {})
+    b = manager.compile_preset("b", {"C": {"frequency": 400.0, "volume": 1.0}}, {})
+    manager.set_morph(a, b, position=0.5)
+    manager.apply_pending(0, 0)
+    assert abs(manager.parts["C"].engine.frequency - 200.0) < 1e-9 # Geometric for log-ranged params
+    assert abs(manager.parts["C"].volume - 0.6) < 1e-9
+    assert manager.parts["D"].engine.amplitude == 0.1              # Only in one preset: held
+    assert manager.morph.changes(0.5) == ()                        # Unchanged position: no work
+    manager.morph_position = 1.0
+    manager.apply_pending(0, 0)
+    assert abs(manager.parts["C"].engine.frequency - 400.0) < 1e-9
+
+    # Applying a preset ends the morph: later positions no longer touch its values
+    manager.load_snapshot(manager.compile_preset("c", {"C": {"frequency": 300.0}}, {}))
+    assert manager.morph is None
+    manager.morph_position = 0.0
+    manager.apply_pending(0, 0)
+    assert manager.parts["C"].engine.frequency == 300.0
+
+
+def test_matrix_mixer_scales_to_many_parts():
+    manager = create_default_manager(48000, num_parts=24)
+    assert list(manager.parts)[-2:] == ["W", "X"]
+    for i, part in enumerate(list(manager.parts.values())[4:]):
+        part.assign_engine(OscillatorEngine(48000, frequency=100.0 * (i + 1), amplitude=0.02))
+        part.pan = (i % 5) / 2.0 - 1.0
+    manager.get_part("B").mute = True
+
+    stream = AudioStream(manager, sample_rate=48000, block_size=256)
+    assert stream.mixer.stack.shape == (48, 256)
+    out = np.zeros((256, 2), dtype=np.float32)
+    stream._callback(out, 256, None, None)
+
+    expected = np.zeros((256, 2), dtype=np.float32)
+    for i, part in enumerate(manager.parts.values()):
+        # One matmul == per-part gains on the unity rows, summed
+        rows = stream.mixer.stack[2 * i:2 * i + part.channels, :256]
+        left, right = stream.mixer.part_gains[i]
+        expected[:, 0] += left * rows[0]
+        expected[:, 1] += right * rows[-1]
+    mixed = np.zeros((256, 2), dtype=np.float32)
+    stream.mixer.mix_into(mixed) # The callback's output is this, through the look-ahead limiter
+    np.testing.assert_allclose(mixed, expected, atol=1e-5)
+
+    # Mixer settings only rebuild the changed part's columns; hard right = cos / sin law
+    part = manager.get_part("X")
+    part.pan = 1.0
+    stream._callback(out, 256, None, None)
+    np.testing.assert_allclose(stream.mixer.gains[:, 46], [0.0, 1.0], atol=1e-7)
+    assert not np.any(stream.mixer.gains[:, 2:4]) # Muted B
+
+
+def _write_wav(path, frames):
+    with wave.open(str(path), "wb") as w:
+        w.setnchannels(frames.shape[1])
+        w.setsampwidth(2)
+        w.setframerate(48000)
+        w.writeframes(frames.astype("<i2").tobytes())
+
+
+def test_sampler_streams_cached_samples(tmp_path):
+    ramp = (np.arange(1000) * 30 - 15000).astype(np.int16)
+    _write_wav(tmp_path / "ramp.wav", np.stack([ramp, -ramp], axis=1))
+    (tmp_path / "tone.pcm").write_bytes(np.full(48000, 8192, dtype="<i2").tobytes()) # Raw: int16 mono by default
+
+    cache = SampleCache(budget=90_000)
+    sampler = SamplerEngine(48000, cache=cache)
+    zone = sampler.add_sample(str(tmp_path / "ramp.wav"), root=440.0, high=1000.0)
+    assert zone.sample.mapped and zone.sample.frame_view().shape == (1000, 2)
+    sampler.set_frequency(440.0)     # Pad voice loops the sample at its own rate
+    out = np.concatenate([sampler.process(400) for _ in range(3)])
+    expected = ramp[np.arange(1200) % 999] / 32768.0 * sampler.amplitude
+    np.testing.assert_allclose(out[:, 0], expected, atol=1e-6)
+    np.testing.assert_allclose(out[:, 1], -expected, atol=1e-6)
+
+    # One-shot note on a mono raw zone, an octave up: read at twice the rate
+    sampler.set_amplitude(0.0)
+    assert np.all(sampler.process(64) == 0.0)
+    sampler.add_sample(str(tmp_path / "tone.pcm"), root=1000.0, low=1000.0)
+    sampler.set_amplitude(1.0)
+    sampler._active[0] = False
+    voice = sampler.note_on(2000.0)
+    assert sampler._rate[voice] == 2.0
+    np.testing.assert_allclose(sampler.process(64), 0.25, atol=1e-6)
+    sampler.process(48000)
+    assert sampler.active_voices == 0 # Ran off the end
+
+    # Both zones referenced: over budget but nothing evictable; released ones go LRU-first
+    assert cache.bytes > cache.budget and cache.evictions == 0
+    assert cache.acquire(str(tmp_path / "ramp.wav")) is zone.sample and cache.hits == 1
+    cache.release(zone.sample)
+    cache.release(sampler.zones[1].sample)
+    assert cache.evictions == 1 and [e["path"] for e in cache.stats()["entries"]] == [str(tmp_path / "ramp.wav")]
+    sampler.close()                  # Back under budget: stays cached, unreferenced
+    assert cache.evictions == 1 and cache.stats()["entries"][0]["refs"] == 0
+
+
+def test_granular_uses_cached_sample_without_copying(tmp_path):
+    rng = np.random.default_rng(1)
+    _write_wav(tmp_path / "noise.wav", rng.integers(-8000, 8000, size=(48000, 2)))
+    engine = GranularEngine(48000)
+    engine.load_source(str(tmp_path / "noise.wav"), channel=1)
+    assert np.shares_memory(engine.audio_buffer, engine.source.data)
+    assert engine.buffer_size == 48000
+    engine.set_density(200.0)
+    first = engine.process(4096)
+    assert np.all(np.isfinite(first)) and np.max(np.abs(first)) > 0.01
+
+    clone = pickle.loads(pickle.dumps(engine)) # Re-mapped by path, not pickled by value
+    assert clone.source.path == engine.source.path and clone.audio_buffer.base is not None
+    assert np.all(np.isfinite(clone.process(256)))
+    engine.close()
+
+
+def test_block_effects_match_reference_processing():
+    rng = np.random.default_rng(3)
+    x = rng.normal(0.0, 0.3, (1000, 2)).astype(np.float32)
+
+    def blocks(effect, sizes=(100, 37, 300, 263, 300)):
+        y, pos = x.copy(), 0
+        for n in sizes: # Odd block sizes: state must carry across blocks
+            effect.process_into(y[pos:pos + n])
+            pos += n
+        return y
+
+    # Partitioned convolution == direct convolution, one partition late
+    ir = rng.normal(0.0, 0.1, 1500)
+    reverb = ConvolutionReverb(48000, ir=ir, partition=64, mix=1.0)
+    assert reverb.partitions == 24
+    np.testing.assert_allclose(blocks(reverb)[64:, 1], np.convolve(x[:, 1], ir)[:936], atol=1e-4)
+
+    # Delay shorter than a block: echoes of echoes inside the same block
+    delay = Delay(48000, time=50 / 48000, feedback=0.5, mix=1.0)
+    expected = np.zeros_like(x)
+    for k in range(1, 20):
+        expected[50 * k:] += 0.5 ** (k - 1) * x[:1000 - 50 * k]
+    np.testing.assert_allclose(blocks(delay), expected, atol=1e-5)
+
+    # Biquad state carried across blocks == one lfilter call
+    from scipy.signal import lfilter
+    lowpass = Filter(48000, cutoff=2000.0)
+    b, a = lowpass._coeffs
+    np.testing.assert_allclose(blocks(lowpass), lfilter(b, a, x, axis=0), atol=1e-6)
+
+
+def test_part_inserts_and_master_fx():
+    manager = create_default_manager(48000)
+    for part_id in ("A", "B", "D"):
+        manager.get_part(part_id).mute = True
+    stream = AudioStream(manager, sample_rate=48000, block_size=256)
+    dry = OfflineRenderer(stream).render(0.1, keep=True).audio
+
+    # C is a mono oscillator: with inserts it takes two stack rows, pre-fader
+    manager.set_effects("C", EffectChain([Filter(48000, mode="highpass", cutoff=5000.0)]))
+    manager.set_effects("master", manager.build_effects([{"type": "delay", "params": {"time": 0.01, "mix": 0.5}}]))
+    wet = OfflineRenderer(stream).render(0.1, keep=True).audio
+    assert manager.get_part("C").channels == 2
+    # 110 Hz through a 5 kHz high-pass (after the tail of the dry render leaves the limiter's delay line)
+    assert np.max(np.abs(wet[stream.limiter.latency:])) < 0.2 * np.max(np.abs(dry))
+    assert isinstance(manager.master_fx.effects[0], Delay)
+
+
+def test_lookahead_limiter_is_brickwall_and_block_size_independent():
+    sr = 48000
+    t = np.arange(sr) / sr
+    # Four parts summing hot: up to +10 dB over the ceiling, plus a single-sample spike
+    level = np.where((t > 0.25) & (t < 0.6), 3.0, 0.3)
+    x = np.stack([np.sin(2 * np.pi * 110 * t) * level, np.sin(2 * np.pi * 165 * t) * level], axis=1).astype(np.float32)
+    x[30000] = 5.0
+
+    def run(sizes):
+        limiter = LookaheadLimiter(sr, ceiling=0.95, max_block_size=256)
+        out, pos, reduction = x.copy(), 0, []
+        for n in sizes:
+            limiter.process_into(out[pos:pos + n])
+            reduction.append(limiter.reduction_db)
+            pos += n
+        return out, limiter, np.array(reduction)
+
+    out, limiter, reduction = run([512] * (sr // 512) + [sr % 512])
+    rng = np.random.default_rng(3)
+    sizes = list(rng.integers(1, 700, 200))
+    odd, _, _ = run(sizes + [sr - sum(sizes)]) # Includes blocks shorter than the look-ahead
+    assert np.max(np.abs(out)) <= 0.95
+    np.testing.assert_array_equal(out, odd)
+    assert 13.0 < reduction.max() < 14.5 # The spike: 20 * log10(5 / 0.95)
+
+    # Below the ceiling the signal only picks up the look-ahead delay
+    L = limiter.latency
+    np.testing.assert_allclose(out[L:10000], x[:10000 - L], atol=1e-6)
+    assert reduction[0] == 0.0
+    # Recovers (20 dB per release time) once the loud section ends
+    np.testing.assert_allclose(out[-2000:], x[-2000 - L:-L], atol=1e-6)
+
+    stream = AudioStream(create_default_manager(48000), sample_rate=48000, block_size=256)
+    for part in stream.manager.parts.values():
+        part.volume = 4.0
+    OfflineRenderer(stream).render(0.2)
+    agg = MetricsAggregator(stream.metrics)
+    agg.collect()
+    assert agg.snapshot()["limiter"]["gain_reduction_db"] > 1.0
+    assert agg.limited_blocks > 0
+    assert "anima_audio_limiter_gain_reduction_db" in agg.render_prometheus()
@@ -0,0 +1,200 @@
+import asyncio
+import os
+import struct
+
+import numpy as np
+
+from anima_locus.fusion.elements import ElementBus
+from anima_locus.fusion.ingest import LinkIngest
+from anima_locus.link import FrameType, encode_frame
+
+
+def _elemental(seq, earth, air, water, fire):
+    return encode_frame(FrameType.ELEMENTAL_BUS, seq, seq * 10, struct.pack('<bbbb', earth, air, water, fire))
+
+
+def test_element_bus_publishes_immutable_snapshots():
+    bus = ElementBus()
+    before = bus.snapshot
+    bus.publish([0.1, 0.2, 0.3, 0.4], source="mcu")
+    after = bus.publish({"fire": 1.0}, source="ui")
+    assert before.seq == 0 and not np.any(before.values) # Readers holding the old snapshot are unaffected
+    assert after.seq == 2
+    np.testing.assert_allclose(after.values, [0.1, 0.2, 0.3, 1.0])
+    assert after.sources == ("mcu", "mcu", "mcu", "ui")
+    assert not after.values.flags.writeable
+
+
+def test_ingest_from_pty_publishes_elements():
+    async def scenario():
+        master, slave = os.openpty()
+        bus = ElementBus()
+        ingest = LinkIngest(bus, os.ttyname(slave))
+        ingest.start()
+        try:
+            await asyncio.sleep(0.05)
+            # Line noise, then two frames in one burst and one split across writes
+            # A duplicate and an MCU restart (seq back to 0) are not counted as lost frames
+            os.write(master, b"\x13\x37" + _elemental(1, 127, 0, 0, 0) + _elemental(2, 0, 127, 0, 0)
+                     + _elemental(2, 0, 127, 0, 0) + _elemental(0, 0, 127, 0, 0))
+            frame = _elemental(2, -127, 0, 64, 0)
+            os.write(master, frame[:5])
+            await asyncio.sleep(0.05)
+            os.write(master, frame[5:])
+            for _ in range(100):
+                await asyncio.sleep(0.01)
+                if ingest.elemental_frames == 5:
+                    break
+            return bus.snapshot, ingest.stats()
+        finally:
+            await ingest.stop()
+            os.close(master)
+            os.close(slave)
+
+    snapshot, stats = asyncio.run(scenario())
+    assert stats["elemental_frames"] == 5
+    assert stats["seq_gaps"] == 1 and stats["seq_resets"] == 2
+    assert stats["bytes_skipped"] == 2
+    # Signed MCU values land on the 0..1 bus range
+    np.testing.assert_allclose(snapshot.values, [0.0, 0.5, (1 + 64 / 127) / 2, 0.5], atol=1e-6)
+    assert snapshot.sources == ("mcu",) * 4
+
+
+def test_ingest_from_tcp_stand_in():
+    async def scenario():
+        async def producer(reader, writer):
+            writer.write(_elemental(7, 0, 0, 0, 127))
+            await writer.drain()
+            writer.close()
+
+        server = await asyncio.start_server(producer, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        bus = ElementBus()
+        ingest = LinkIngest(bus, f"tcp://127.0.0.1:{port}", reconnect_delay=10.0)
+        ingest.start()
+        for _ in range(100):
+            await asyncio.sleep(0.01)
+            if bus.snapshot.seq:
+                break
+        await ingest.stop()
+        server.close()
+        await server.wait_closed()
+        return bus.snapshot
+
+    snapshot = asyncio.run(scenario())
+    assert snapshot.as_dict()["fire"] == 1.0
+
+
+def test_fusion_pipeline_filters_batches_onto_block_grid():
+    from anima_locus.fusion.filters import FusionPipeline
+    rng = np.random.default_rng(0)
+    # Irregular 5-15 ms arrivals, timestamps wrapping the u32 counter
+    ts = ((1 << 32) - 500 + np.cumsum(rng.integers(5, 16, 400))) % (1 << 32)
+    clean = np.where(np.arange(400) < 200, 0.2, 0.8)[:, None].repeat(4, axis=1)
+    noisy = clean + rng.normal(0, 0.01, clean.shape)
+    noisy[100, 2] = 40.0 # Glitch
+
+    for mode in ("one_euro", "ema", "kalman"):
+        pipeline = FusionPipeline(["earth", "air", "water", "fire"], mode=mode, grid_period=0.02)
+        times, rows = [], []
+        for i in range(0, 400, 37):
+            t, v = pipeline.update(ts[i:i + 37], noisy[i:i + 37])
+            times.append(t)
+            rows.append(v)
+        times, rows = np.concatenate(times), np.vstack(rows)
+        np.testing.assert_allclose(np.diff(times), 0.02, atol=1e-9) # Uniform across batches and the wrap
+        assert rows.max() < 1.0 # Glitch rejected
+        np.testing.assert_allclose(pipeline.value, 0.8, atol=0.03) # Real step accepted
+        stats = pipeline.stats()
+        assert stats["outliers"]["water"] >= 1 and stats["samples"] == 400
+        assert set(stats["stages_us"]) == {"outliers", "smooth", "resample"}
+
+
+def test_fusion_batches_match_frame_by_frame_filtering():
+    from anima_locus.fusion.filters import FusionPipeline
+    rng = np.random.default_rng(1)
+    ts = np.cumsum(rng.integers(1, 20, 600))
+    values = np.where(np.arange(600) < 300, 0.3, 0.6)[:, None] + rng.normal(0, 0.02, (600, 4))
+
+    # Smoothers solved over a whole batch == the recursion fed one frame at a time
+    for mode in ("ema", "kalman", "one_euro"):
+        batched = FusionPipeline(["earth", "air", "water", "fire"], mode=mode, grid_period=0.01, outlier_k=1e9)
+        _, whole = batched.update(ts, values)
+        single = FusionPipeline(["earth", "air", "water", "fire"], mode=mode, grid_period=0.01, outlier_k=1e9)
+        rows = [single.update(ts[i:i + 1], values[i:i + 1])[1] for i in range(600)]
+        np.testing.assert_allclose(whole, np.vstack(rows), atol=1e-10)
+
+    # Run-wise outlier rejection == the per-frame rule
+    values[[50, 51, 400], [1, 1, 3]] = [9.0, 9.0, -4.0] # Glitches
+    values[200:210, 0] = 2.0                            # A step long enough to be accepted
+    pipeline = FusionPipeline(["earth", "air", "water", "fire"], mode="ema")
+    pipeline.update(ts[:1], values[:1])
+    ref, scale, rejects, outliers = values[0].copy(), np.full(4, 0.02), np.zeros(4, dtype=int), 0
+    expected = values[1:].copy()
+    for x in expected:
+        dev = np.abs(x - ref)
+        limit = 6.0 * np.maximum(scale, 0.02)
+        bad = (dev > limit) & (rejects < 3)
+        rejects = np.where(bad, rejects + 1, 0)
+        outliers += bad.sum()
+        x[bad] = ref[bad]
+        scale += 0.05 * (np.minimum(dev, limit) - scale)
+        ref = np.where(bad, ref, x)
+    np.testing.assert_allclose(pipeline._reject_outliers(values[1:]), expected, atol=1e-12)
+    assert pipeline.outliers.sum() == outliers >= 6 # At least the glitches and the start of the step
+
+    # With rejection on, the result does not depend on how reads split the stream
+    sine = 0.5 + 0.4 * np.sin(2 * np.pi * np.arange(600) / 100)[:, None] * np.ones(4)
+    for signal in (values, sine):
+        for mode in ("one_euro", "ema", "kalman"):
+            results = []
+            for chunk in (1, 64):
+                pipeline = FusionPipeline(["earth", "air", "water", "fire"], mode=mode, grid_period=0.01)
+                rows = [pipeline.update(ts[i:i + chunk], signal[i:i + chunk])[1] for i in range(0, 600, chunk)]
+                results.append((pipeline.outliers.copy(), np.vstack(rows)))
+            np.testing.assert_array_equal(results[0][0], results[1][0])
+            np.testing.assert_allclose(results[0][1], results[1][1], atol=1e-10)
+        if signal is sine:
+            assert results[0][0].sum() == 0 # A clean signal has no outliers
+
+
+def test_capture_seek_and_replay(tmp_path):
+    from anima_locus.fusion.capture import CaptureReader, CaptureWriter
+    path = str(tmp_path / "session.bin")
+    writer = CaptureWriter(path, index_interval=0.5, grow=1024) # Small steps: exercises remapping
+    for seq in range(300):
+        writer.append(_elemental(seq, seq % 127, 0, 0, 0), t=seq * 0.01)
+    writer.flush() # Not closed: the reader must stop at the zero-filled tail
+
+    with CaptureReader(path) as reader:
+        assert len(reader.index) == 6
+        assert reader.duration == 2.99
+        t, frame = next(reader.frames(start=1.234))
+        assert (round(t, 2), frame.seq) == (1.24, 124)
+        assert [f.seq for _, f in reader.frames(1.0, 1.05)] == [100, 101, 102, 103, 104]
+
+        # Replay as fast as possible through the ingest path
+        bus = ElementBus()
+        ingest = LinkIngest(bus, f"capture://{path}")
+        asyncio.run(reader.replay(ingest.handle, speed=0, start=2.0))
+        assert ingest.elemental_frames == 100 and ingest.seq_gaps == 0
+        assert abs(bus.snapshot.as_dict()["earth"] - (1 + (299 % 127) / 127) / 2) < 1e-6
+
+        # Driven by an external clock (offline renders)
+        ingest = LinkIngest(ElementBus(), path)
+        feed = reader.cursor(ingest.handle, start=1.0, batch=0.0)
+        assert feed(0.0) == 1 and feed(0.5) == 50 and feed(10.0) == 149
+    writer.close()
+
+    os.remove(f"{path}.idx") # Index is rebuilt by scanning
+    with CaptureReader(path) as reader:
+        assert len(reader.index) == 3 and reader.duration == 2.99
+
+    # Restarting with the same path keeps the old recording and rotates the new one
+    size = os.path.getsize(path)
+    with CaptureWriter(path) as rotated:
+        rotated.append(_elemental(0, 0, 0, 0, 0), t=0.0)
+    assert rotated.path != path and rotated.path.startswith(str(tmp_path / "session-"))
+    assert os.path.getsize(path) == size
+    with CaptureReader(rotated.path) as reader:
+        assert [f.seq for _, f in reader.frames()] == [0]
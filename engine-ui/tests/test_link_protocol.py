@@ -1,5 +1,7 @@
 import struct
-from engine_ui.tools import link_bench
+
+from anima_locus.link import FrameType, LinkParser, encode_frame
+from tools import link_bench
 
 
 def test_crc_pack_unpack():
@@ -21,3 +23,89 @@ def test_elemental_normalize():
     # normalized
     e = earth/127.0
     assert round(e, 3) == 1.0
+
+
+def _bitwise_crc(data, crc=0xFFFF):
+    for b in data:
+        crc ^= (b << 8)
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x1021) & 0xFFFF if crc & 0x8000 else (crc << 1) & 0xFFFF
+    return crc
+
+
+def test_crc_table_matches_bitwise():
+    data = bytes(range(256)) * 3
+    assert link_bench.crc16_ccitt(data) == _bitwise_crc(data)
+    assert link_bench.crc16_ccitt(b"123456789") == 0x29B1 # CCITT-FALSE check value
+
+
+def test_parser_resyncs_after_noise_and_crc_errors():
+    frames = [encode_frame(FrameType.ELEMENTAL_BUS, seq, 1000 + seq, struct.pack('<bbbb', seq, 0, 0, 0))
+              for seq in range(4)]
+    corrupt = bytearray(frames[1])
+    corrupt[-3] ^= 0xFF
+    # A sync word inside the payload of the corrupt frame must not hide frame 2
+    stream = b"\x00\xaa\x13" + frames[0] + bytes(corrupt) + b"\xaa" + frames[2] + b"\xaa\x55\xff" + frames[3]
+
+    parser = LinkParser()
+    got = []
+    for i in range(0, len(stream), 5): # Frames split across reads
+        got += parser.feed(stream[i:i + 5])
+    assert [f.seq for f in got] == [0, 2]
+    assert got[1].ts == 1002
+    assert got[0].elemental()[0] == 0.0
+    assert parser.crc_errors == 1
+    assert parser.stats()["bytes_read"] == len(stream)
+
+    # The false sync before frame 3 declares an 800-byte payload; once that many
+    # bytes have arrived its CRC fails and frame 3 is recovered from the buffer
+    tail = b"".join(encode_frame(FrameType.ELEMENTAL_BUS, seq, 0, b"\x00" * 4) for seq in range(4, 70))
+    assert [f.seq for f in parser.feed(tail)] == list(range(3, 70))
+    assert parser.crc_errors == 2
+
+
+def test_parser_stream_and_early_stop():
+    data = b"".join(encode_frame(FrameType.ELEMENTAL_BUS, seq, seq, b"\x01\x02\x03\x04") for seq in range(10))
+    parser = LinkParser()
+    frames = parser.feed(data)
+    assert next(frames).seq == 0
+    frames.close() # Consumed bytes are dropped, the rest stays buffered
+    assert [f.seq for f in parser.feed(b"")] == list(range(1, 10))
+
+    result = link_bench.throughput(2000, 256)
+    assert result["frames"] > 1900
+
+
+def test_streaming_stats_quantiles():
+    import numpy as np
+    from anima_locus.fusion.stats import StreamingStats
+    samples = np.random.default_rng(0).exponential(5.0, 20000)
+    stats = StreamingStats(accuracy=0.01)
+    for x in samples:
+        stats.add(float(x))
+    assert abs(stats.mean - samples.mean()) < 1e-9
+    assert abs(stats.stddev - samples.std(ddof=1)) < 1e-9
+    for q in (0.5, 0.95, 0.99):
+        assert abs(stats.quantile(q) / np.quantile(samples, q) - 1.0) < 0.02
+
+
+def test_link_timing_separates_gaps_from_resets():
+    from anima_locus.fusion.stats import LinkTiming
+    timing = LinkTiming()
+    # A duplicate (3, 3), an MCU restart (4 -> 0), a real gap (1 -> 5) and a u16 wrap
+    for i, seq in enumerate([1, 2, 3, 3, 4, 0, 1, 5, 65534, 65535, 0]):
+        timing.add(i * 10.0, i * 10, seq)
+    assert timing.seq_gaps == 3
+    assert timing.seq_resets == 3 # 3 -> 3, 4 -> 0, 5 -> 65534
+    assert timing.summary()['seq_resets'] == 3
+
+
+def test_bench_replays_capture_file(tmp_path):
+    capture = tmp_path / 'capture.bin'
+    capture.write_bytes(link_bench.synthetic_stream(500))
+    with open(capture, 'rb') as f:
+        report = link_bench.run(LinkParser(f), quiet=True)
+    assert report['frames'] == report['parser']['frames']
+    assert report['seq_gaps'] == 500 - report['frames'] # Frames lost to corruption show as gaps
+    assert report['interarrival_ms']['count'] == report['frames'] - 1
+    assert set(report['transit_ms']) >= {'p50', 'p95', 'p99', 'max'}
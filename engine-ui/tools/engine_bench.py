@@ -0,0 +1,238 @@
+"""
+engine_bench.py — DSP benchmark for the audio engines
+
+Times each engine's `process_into`, `AudioPart.render`, the master limiter (on
+a mix running 12 dB hot) and the full four-part mix (`AudioStream._callback`) across block sizes, sample rates and parameter
+regimes, and compares every result against the real-time deadline
+`block_size / sample_rate`. Results are written as JSON so runs from two
+commits can be diffed.
+
+Usage (host):
+    python tools/engine_bench.py --output bench.json
+    python tools/engine_bench.py --quick --compare bench.json
+
+`--compare` exits non-zero when any case got slower than `--threshold`.
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from anima_locus.audio_io.limiter import LookaheadLimiter  # noqa: E402
+from anima_locus.audio_io.stream import AudioStream  # noqa: E402
+from anima_locus.engines.granular import GranularEngine  # noqa: E402
+from anima_locus.engines.manager import create_default_manager  # noqa: E402
+from anima_locus.engines.oscillator import OscillatorEngine  # noqa: E402
+from anima_locus.engines.part import AudioPart  # noqa: E402
+from anima_locus.engines.spectral import SpectralEngine  # noqa: E402
+
+BLOCK_SIZES = [64, 128, 256, 512, 1024, 2048, 4096]
+SAMPLE_RATES = [48000]
+
+
+def _poly(sr, voices, waveform="saw"):
+    eng = OscillatorEngine(sr, frequency=110.0, amplitude=0.5, waveform=waveform, max_voices=voices)
+    for i in range(voices - 1):
+        eng.note_on(110.0 * 2 ** (i / 12.0), 0.1)
+    return eng
+
+
+def _granular(sr, density_freq=None, grain_size=None, density=None):
+    eng = GranularEngine(sr)
+    if density_freq is not None:
+        eng.set_frequency(density_freq)
+    if density is not None:
+        eng.set_density(density)
+    if grain_size is not None:
+        eng.grain_size = grain_size
+    return eng
+
+
+# (target, regime) -> factory(sample_rate) returning an engine
+ENGINE_CASES = {
+    ("granular", "default"): lambda sr: _granular(sr),
+    ("granular", "density_5hz"): lambda sr: _granular(sr, density_freq=50.0),
+    ("granular", "density_55hz"): lambda sr: _granular(sr, density_freq=2050.0),
+    ("granular", "long_grains"): lambda sr: _granular(sr, density_freq=2050.0, grain_size=0.5),
+    ("granular", "cloud_200"): lambda sr: _granular(sr, density=1000.0, grain_size=0.2),
+    ("spectral", "default"): lambda sr: SpectralEngine(sr),
+    ("spectral", "fft_16384"): lambda sr: SpectralEngine(sr, fft_size=16384, hop_size=2048),
+    ("oscillator", "default"): lambda sr: OscillatorEngine(sr, frequency=440.0, amplitude=0.5),
+    ("oscillator", "poly_16_saw"): lambda sr: _poly(sr, 16),
+    ("oscillator", "poly_64_saw"): lambda sr: _poly(sr, 64),
+}
+
+
+def time_blocks(fn, frames, blocks, warmup):
+    for _ in range(warmup):
+        fn(frames)
+    times = np.empty(blocks, dtype=np.float64)
+    for i in range(blocks):
+        t0 = time.perf_counter()
+        fn(frames)
+        times[i] = time.perf_counter() - t0
+    return times
+
+
+def summarize(target, regime, sample_rate, block_size, times):
+    deadline = block_size / sample_rate
+    mean = float(times.mean())
+    p99 = float(np.percentile(times, 99))
+    return dict(
+        target=target,
+        regime=regime,
+        sample_rate=sample_rate,
+        block_size=block_size,
+        blocks=int(times.size),
+        mean_us=round(mean * 1e6, 2),
+        p50_us=round(float(np.median(times)) * 1e6, 2),
+        p99_us=round(p99 * 1e6, 2),
+        max_us=round(float(times.max()) * 1e6, 2),
+        deadline_us=round(deadline * 1e6, 2),
+        load=round(mean / deadline, 4),
+        p99_load=round(p99 / deadline, 4),
+    )
+
+
+def run_cases(targets, sample_rates, block_sizes, blocks, warmup):
+    results = []
+    for sr in sample_rates:
+        for (target, regime), factory in ENGINE_CASES.items():
+            if target not in targets:
+                continue
+            for bs in block_sizes:
+                eng = factory(sr)
+                shape = (bs,) if eng.channels == 1 else (bs, eng.channels)
+                out = np.zeros(shape, dtype=np.float32)
+                times = time_blocks(lambda n: eng.process_into(out), bs, blocks, warmup)
+                results.append(summarize(target, regime, sr, bs, times))
+
+        if "part" in targets:
+            for bs in block_sizes:
+                part = AudioPart("A", sr)
+                part.assign_engine(_granular(sr))
+                part.pan = -0.3
+                times = time_blocks(part.render, bs, blocks, warmup)
+                results.append(summarize("part", "granular_panned", sr, bs, times))
+
+        if "limiter" in targets:
+            for bs in block_sizes:
+                limiter = LookaheadLimiter(sr, max_block_size=bs)
+                rng = np.random.default_rng(0)
+                hot = rng.uniform(-4.0, 4.0, (bs, 2)).astype(np.float32)
+                buf = np.zeros((bs, 2), dtype=np.float32)
+
+                def limit(n):
+                    np.copyto(buf, hot)
+                    limiter.process_into(buf)
+                times = time_blocks(limit, bs, blocks, warmup)
+                results.append(summarize("limiter", "hot_12db", sr, bs, times))
+
+        if "mix" in targets:
+            for bs in block_sizes:
+                stream = AudioStream(create_default_manager(sr), sample_rate=sr, block_size=bs)
+                outdata = np.zeros((bs, 2), dtype=np.float32)
+                times = time_blocks(lambda n: stream._callback(outdata, n, None, None), bs, blocks, warmup)
+                results.append(summarize("mix", "default_parts", sr, bs, times))
+    return results
+
+
+def case_key(r):
+    return (r['target'], r['regime'], r['sample_rate'], r['block_size'])
+
+
+def compare(baseline, results, threshold):
+    """Print per-case mean-time ratios against a baseline; returns the regressed cases."""
+    old = {case_key(r): r for r in baseline['results']}
+    regressions = []
+    for r in results:
+        prev = old.get(case_key(r))
+        if prev is None or prev['mean_us'] <= 0:
+            continue
+        ratio = r['mean_us'] / prev['mean_us']
+        flag = ''
+        if ratio > threshold:
+            flag = '  REGRESSION'
+            regressions.append((r, ratio))
+        print('%-10s %-16s %6d %5d  %10.1fus -> %10.1fus  x%.2f%s' % (
+            r['target'], r['regime'], r['sample_rate'], r['block_size'],
+            prev['mean_us'], r['mean_us'], ratio, flag
+        ))
+    return regressions
+
+
+def git_revision():
+    try:
+        out = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, timeout=5)
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Engine DSP bench')
+    parser.add_argument('--targets', default='granular,spectral,oscillator,part,limiter,mix',
+                        help='Comma separated subset of granular,spectral,oscillator,part,limiter,mix')
+    parser.add_argument('--block-sizes', default=','.join(str(b) for b in BLOCK_SIZES))
+    parser.add_argument('--sample-rates', default=','.join(str(s) for s in SAMPLE_RATES))
+    parser.add_argument('--blocks', type=int, default=200, help='Timed blocks per case')
+    parser.add_argument('--warmup', type=int, default=20)
+    parser.add_argument('--quick', action='store_true', help='Few blocks, three block sizes')
+    parser.add_argument('--output', help='Write results JSON here')
+    parser.add_argument('--compare', help='Baseline results JSON to diff against')
+    parser.add_argument('--threshold', type=float, default=1.25, help='Mean-time ratio counted as a regression')
+    args = parser.parse_args()
+
+    targets = set(args.targets.split(','))
+    block_sizes = [int(b) for b in args.block_sizes.split(',')]
+    sample_rates = [int(s) for s in args.sample_rates.split(',')]
+    blocks, warmup = args.blocks, args.warmup
+    if args.quick:
+        block_sizes = [b for b in block_sizes if b in (64, 512, 4096)] or block_sizes[:3]
+        blocks, warmup = 30, 5
+
+    results = run_cases(targets, sample_rates, block_sizes, blocks, warmup)
+
+    for r in results:
+        over = '  OVER DEADLINE' if r['p99_load'] >= 1.0 else ''
+        print('%-10s %-16s %6d %5d  mean %9.1fus  p99 %9.1fus  load %5.1f%%%s' % (
+            r['target'], r['regime'], r['sample_rate'], r['block_size'],
+            r['mean_us'], r['p99_us'], r['load'] * 100.0, over
+        ))
+
+    report = dict(
+        meta=dict(
+            revision=git_revision(),
+            timestamp=time.strftime('%Y-%m-%dT%H:%M:%S'),
+            python=platform.python_version(),
+            numpy=np.__version__,
+            machine=platform.machine(),
+            platform=platform.platform(),
+        ),
+        results=results,
+    )
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print('Wrote', args.output)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print('\nComparison against', args.compare)
+        regressions = compare(baseline, results, args.threshold)
+        if regressions:
+            print('%d case(s) slower than x%.2f' % (len(regressions), args.threshold))
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,99 +1,147 @@
 """
 link_bench.py — simple bench for the Link Protocol
 
-This script opens a serial port (or stdin) and parses Link Protocol frames.
-It validates CRC and calculates arrival jitter for `ELEMENTAL_BUS` frames.
+This script opens a serial port, stdin or a recorded capture file and parses
+Link Protocol frames with `anima_locus.link.LinkParser`. It validates CRC and
+keeps constant-memory statistics for `ELEMENTAL_BUS` frames (transit delay
+percentiles, inter-arrival time, jitter, sequence gaps), printing a summary
+line per interval and an optional JSON report at exit.
+
+`--throughput` skips the port and measures parser throughput on a synthetic
+byte stream (valid frames mixed with line noise and corrupted frames), fed in
+chunks the size of a USB CDC burst.
 
 Usage (host):
-    python tools/link_bench.py --serial COM5 --rate 115200
+    python tools/link_bench.py --serial COM5 --baud 115200
+    python tools/link_bench.py --stdin < capture.bin
+    python tools/link_bench.py --file capture.bin --pace --report report.json
+    python tools/link_bench.py --throughput --frames 200000 --chunk 512
 
 For development you can pipe a `elemental_producer.py` script to this on a pseudo-tty.
 """
 
 import argparse
-import serial
+import json
+import os
+import random
 import struct
+import sys
 import time
-import zlib
-from collections import deque
-
-SYNC = b"\xaa\x55"
-
-# CRC16-CCITT (0x1021) - we'll use a small tableless implementation for portability
-
-def crc16_ccitt(data: bytes, crc: int = 0xFFFF) -> int:
-    for b in data:
-        crc ^= (b << 8)
-        for _ in range(8):
-            if crc & 0x8000:
-                crc = ((crc << 1) ^ 0x1021) & 0xFFFF
-            else:
-                crc = (crc << 1) & 0xFFFF
-    return crc
-
-
-def parse_frame(ser):
-    # find sync
-    while True:
-        b = ser.read(1)
-        if not b:
-            return None
-        if b == b"\xaa":
-            b2 = ser.read(1)
-            if b2 == b"\x55":
-                break
-    hdr = ser.read(1+2+2+4)
-    if len(hdr) < 9:
-        return None
-    typ = hdr[0]
-    seq = struct.unpack('<H', hdr[1:3])[0]
-    length = struct.unpack('<H', hdr[3:5])[0]
-    ts = struct.unpack('<I', hdr[5:9])[0]
-    payload = ser.read(length)
-    crc_raw = ser.read(2)
-    if len(crc_raw) < 2:
-        return None
-    crc = struct.unpack('<H', crc_raw)[0]
-    crc_calc = crc16_ccitt(bytes([typ]) + hdr[1:9] + payload)
-    if crc != crc_calc:
-        print("CRC error: got %04x expected %04x" % (crc, crc_calc))
-        return None
-    return dict(typ=typ, seq=seq, length=length, ts=ts, payload=payload)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from anima_locus.fusion.stats import LinkTiming  # noqa: E402
+from anima_locus.link import FrameType, LinkParser, crc16_ccitt, encode_frame  # noqa: E402,F401
+
+
+def synthetic_stream(frames: int, noise: float = 0.05, corrupt: float = 0.01, seed: int = 1) -> bytes:
+    """ELEMENTAL_BUS frames with random garbage between some frames and bit flips in others."""
+    rng = random.Random(seed)
+    out = bytearray()
+    for seq in range(frames):
+        payload = struct.pack('<bbbb', *(rng.randint(-127, 127) for _ in range(4)))
+        frame = bytearray(encode_frame(FrameType.ELEMENTAL_BUS, seq, seq * 10, payload))
+        if rng.random() < corrupt:
+            frame[rng.randrange(2, len(frame))] ^= 1 << rng.randrange(8)
+        if rng.random() < noise:
+            out += bytes(rng.randrange(256) for _ in range(rng.randrange(1, 32)))
+        out += frame
+    return bytes(out)
+
+
+def throughput(frames: int, chunk: int) -> dict:
+    data = synthetic_stream(frames)
+    parser = LinkParser()
+    view = memoryview(data)
+    parsed = 0
+    start = time.perf_counter()
+    for pos in range(0, len(data), chunk):
+        for _ in parser.feed(view[pos:pos + chunk]):
+            parsed += 1
+    elapsed = time.perf_counter() - start
+    result = parser.stats()
+    result.update({
+        "elapsed_s": round(elapsed, 3),
+        "mb_per_s": round(len(data) / elapsed / 1e6, 2),
+        "frames_per_s": round(parsed / elapsed),
+    })
+    return result
+
+
+def run(link: LinkParser, interval: float = 1.0, pace: bool = False, quiet: bool = False) -> dict:
+    """
+    Streams frames from `link` into constant-memory timing statistics, printing
+    one summary line every `interval` seconds. With `pace`, frames are released
+    at their recorded `ts` spacing (replaying a capture in real time).
+    """
+    timing = LinkTiming()
+    start = last_report = time.perf_counter()
+    first_ts = None
+    try:
+        for f in link.stream():
+            if f.type != FrameType.ELEMENTAL_BUS or len(f.payload) != 4:
+                continue
+            if pace:
+                first_ts = f.ts if first_ts is None else first_ts
+                delay = start + ((f.ts - first_ts) & 0xFFFFFFFF) / 1000.0 - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            now = time.perf_counter()
+            timing.add(now * 1000.0, f.ts, f.seq)
+            if not quiet and now - last_report >= interval:
+                last_report = now
+                transit = timing.transit
+                print('%s frames=%d gaps=%d resets=%d crc=%d transit p50=%.2f p99=%.2f max=%.2fms jitter=%.2fms' % (
+                    time.strftime('%H:%M:%S'), timing.frames, timing.seq_gaps, timing.seq_resets, link.crc_errors,
+                    transit.quantile(0.5), transit.quantile(0.99), transit.max, timing.jitter,
+                ))
+    except KeyboardInterrupt:
+        print('Quitting')
+    report = timing.summary()
+    report['elapsed_s'] = round(time.perf_counter() - start, 3)
+    report['parser'] = link.stats()
+    return report
 
 
 def main():
     parser = argparse.ArgumentParser(description='Link bench')
-    parser.add_argument('--serial', required=True, help='Serial port (e.g., COM5, /dev/ttyACM0)')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--serial', help='Serial port (e.g., COM5, /dev/ttyACM0)')
+    source.add_argument('--stdin', action='store_true', help='Read a raw byte stream from stdin')
+    source.add_argument('--file', help='Replay a recorded raw capture')
+    source.add_argument('--throughput', action='store_true', help='Benchmark the parser on a synthetic stream')
     parser.add_argument('--baud', type=int, default=115200)
+    parser.add_argument('--interval', type=float, default=1.0, help='Seconds between summary lines')
+    parser.add_argument('--pace', action='store_true', help='Replay --file/--stdin at the recorded frame rate')
+    parser.add_argument('--report', help='Write the final statistics as JSON to this path ("-" for stdout)')
+    parser.add_argument('--frames', type=int, default=100000, help='Synthetic frames (--throughput)')
+    parser.add_argument('--chunk', type=int, default=512, help='Bytes per feed (--throughput)')
     args = parser.parse_args()
 
-    ser = serial.Serial(args.serial, args.baud, timeout=1)
-
-    latencies = deque(maxlen=1000)
-
-    print('Listening on', args.serial)
-    try:
-        while True:
-            f = parse_frame(ser)
-            if f is None:
-                continue
-            now_ms = int(time.time() * 1000)
-            if f['typ'] == 0x20 and f['length'] == 4:
-                # elemental bus frame
-                earth, air, water, fire = struct.unpack('<bbbb', f['payload'])
-                # normalize
-                e = earth / 127.0
-                a = air / 127.0
-                w = water / 127.0
-                fi = fire / 127.0
-                latency = now_ms - f['ts']
-                latencies.append(latency)
-                avg = sum(latencies) / len(latencies)
-                print('%s seq=%d e=%.2f a=%.2f w=%.2f f=%.2f latency=%dms avg=%dms' % (
-                    time.strftime('%H:%M:%S'), f['seq'], e, a, w, fi, latency, avg
-                ))
-    except KeyboardInterrupt:
-        print('Quitting')
+    if args.throughput:
+        result = throughput(args.frames, args.chunk)
+        print('%(frames)d frames (%(crc_errors)d CRC errors, %(bytes_skipped)d bytes skipped) '
+              'in %(elapsed_s).3fs: %(mb_per_s).2f MB/s, %(frames_per_s)d frames/s' % result)
+        report = result
+    else:
+        if args.stdin:
+            link = LinkParser(sys.stdin.buffer)
+            print('Listening on stdin')
+        elif args.file:
+            link = LinkParser(open(args.file, 'rb'))
+            print('Replaying', args.file)
+        else:
+            link = LinkParser(args.serial, baud=args.baud)
+            print('Listening on', args.serial)
+        report = run(link, args.interval, args.pace)
+        print('Stats:', json.dumps(report))
+
+    if args.report == '-':
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    elif args.report:
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=2)
 
 
 if __name__ == '__main__':
@@ -6,7 +6,7 @@ import { useEngine } from './hooks/useEngine';
 
 function App() {
   const [activePart, setActivePart] = useState<'A' | 'B' | 'C' | 'D'>('A');
-  const { isConnected, sendParam } = useEngine();
+  const { isConnected, sendParams } = useEngine();
 
   const handleXYUpdate = useCallback((x: number, y: number) => {
     // Map X to Frequency (Exponential 50Hz - 2000Hz)
@@ -18,9 +18,9 @@ function App() {
     // Map Y to Amplitude (Linear 0.0 - 1.0)
     const amp = y;
 
-    sendParam(activePart, 'frequency', freq);
-    sendParam(activePart, 'amplitude', amp);
-  }, [activePart, sendParam]);
+    // Both axes go out in one frame
+    sendParams(activePart, [['frequency', freq], ['amplitude', amp]]);
+  }, [activePart, sendParams]);
 
   return (
     <div style={{ padding: '2rem', height: '100%', boxSizing: 'border-box' }}>
@@ -2,11 +2,40 @@ import { useEffect, useRef, useState } from 'react';
 
 const SOCKET_URL = 'ws://localhost:8000/ws';
 
+// Binary control protocol (anima_locus/api/binary.py, GET /api/v1/protocol)
+const BINARY_SUBPROTOCOL = 'anima.bin.v1';
+const PARTS = ['A', 'B', 'C', 'D'];
+const PARAM_CODES = [
+    'frequency', 'amplitude',
+    'volume', 'pan', 'mute',
+    'density', 'position', 'grain_size', 'spray', 'stereo_spread',
+    'center_freq', 'bandwidth', 'freeze', 'blur',
+];
+const FRAME_PARAMS = 1;
+const HEADER_SIZE = 4;
+const PARAM_RECORD_SIZE = 20;
+
 export type EnginePart = 'A' | 'B' | 'C' | 'D';
 
 interface UseEngineReturn {
     isConnected: boolean;
     sendParam: (partId: EnginePart, param: string, value: number) => void;
+    sendParams: (partId: EnginePart, updates: [string, number][]) => void;
+}
+
+// One frame for the whole batch: <BBH header, then <BBHfdf records (time/ramp unset)
+function encodeParams(partId: EnginePart, updates: [string, number][]): ArrayBuffer {
+    const buffer = new ArrayBuffer(HEADER_SIZE + updates.length * PARAM_RECORD_SIZE);
+    const view = new DataView(buffer);
+    view.setUint8(0, FRAME_PARAMS);
+    view.setUint16(2, updates.length, true);
+    updates.forEach(([param, value], i) => {
+        const offset = HEADER_SIZE + i * PARAM_RECORD_SIZE;
+        view.setUint8(offset, PARTS.indexOf(partId));
+        view.setUint8(offset + 1, PARAM_CODES.indexOf(param));
+        view.setFloat32(offset + 4, value, true);
+    });
+    return buffer;
 }
 
 export function useEngine(): UseEngineReturn {
@@ -14,7 +43,7 @@ export function useEngine(): UseEngineReturn {
     const wsRef = useRef<WebSocket | null>(null);
 
     useEffect(() => {
-        const ws = new WebSocket(SOCKET_URL);
+        const ws = new WebSocket(SOCKET_URL, [BINARY_SUBPROTOCOL]);
         wsRef.current = ws;
 
         ws.onopen = () => {
@@ -36,9 +65,18 @@ export function useEngine(): UseEngineReturn {
         };
     }, []);
 
-    const sendParam = (partId: EnginePart, param: string, value: number) => {
-        if (wsRef.current?.readyState === WebSocket.OPEN) {
-            wsRef.current.send(JSON.stringify({
+    const sendParams = (partId: EnginePart, updates: [string, number][]) => {
+        const ws = wsRef.current;
+        if (ws?.readyState !== WebSocket.OPEN) {
+            return;
+        }
+        if (ws.protocol === BINARY_SUBPROTOCOL && updates.every(([param]) => PARAM_CODES.includes(param))) {
+            ws.send(encodeParams(partId, updates));
+            return;
+        }
+        // JSON fallback (older server or unknown param)
+        for (const [param, value] of updates) {
+            ws.send(JSON.stringify({
                 type: 'set_param',
                 part_id: partId,
                 engine: 'oscillator', // Hardcoded for now, could be dynamic
@@ -48,5 +86,9 @@ export function useEngine(): UseEngineReturn {
         }
     };
 
-    return { isConnected, sendParam };
+    const sendParam = (partId: EnginePart, param: string, value: number) => {
+        sendParams(partId, [[param, value]]);
+    };
+
+    return { isConnected, sendParam, sendParams };
 }